@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+#Compares the fast XML reader with the openpyxl reader on existing order sheets:
+# - import time of tnvalidator alone and of openpyxl (each in a fresh interpreter)
+# - time to load and parse every sheet the checks use, best of --repeat runs
+# - that both readers return the same data
+#usage: python benchmarks/bench_readers.py [--repeat N] orders.xlsx [more.xlsx ...]
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import tnvalidator
+
+#seconds to import a module in a new interpreter, minus the interpreter's own startup
+def importTime(module, repeat):
+    def run(code):
+        best = None
+        for i in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(tnvalidator.__file__)))
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+    return run("import " + module) - run("pass")
+
+def bestOf(repeat, function):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the fast XLSX reader against openpyxl.")
+    parser.add_argument("paths", nargs="+", help="order sheets (.xlsx) to read")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement, the best is reported (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    print("import tnvalidator: %.3fs" % importTime("tnvalidator", args.repeat))
+    print("import openpyxl:    %.3fs" % importTime("openpyxl", args.repeat))
+    print()
+    print("%-40s %10s %10s %8s  %s" % ("file", "fast", "openpyxl", "speedup", "same data"))
+
+    mismatches = 0
+    for path in args.paths:
+        fastData = tnvalidator.processOrdersXLSX(path, fast=True)
+        slowData = tnvalidator.processOrdersXLSX(path, fast=False)
+        same = fastData == slowData
+        if not same:
+            mismatches += 1
+
+        #time the fast reader on its own, a fallback to openpyxl would hide in the fast column otherwise
+        reader = tnvalidator.FastOrdersReader(path)
+        try:
+            tnvalidator.readOrders(reader)
+            fallback = False
+        except tnvalidator.FastReaderUnsupported:
+            fallback = True
+        finally:
+            reader.close()
+
+        fastTime = bestOf(args.repeat, lambda: tnvalidator.processOrdersXLSX(path, fast=True))
+        slowTime = bestOf(args.repeat, lambda: tnvalidator.processOrdersXLSX(path, fast=False))
+        print("%-40s %9.3fs %9.3fs %7.1fx  %s%s" % (os.path.basename(path)[-40:], fastTime, slowTime, slowTime / fastTime, "yes" if same else "NO", " (fell back to openpyxl)" if fallback else ""))
+
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+#Times loading, parsing (also with a warm reference cache), the derived facts and every check on synthetic order
+#sheets at 1x, 10x and 100x a normal clan's size, for both sheet versions. Runs without a display. Each run is appended to a results file (one JSON
+#record per line) and compared with the previous record in it, so changes can be measured run to run.
+#usage: python benchmarks/bench_scaling.py [--scales 1 10 100] [--repeat N] [--results FILE] [--label TEXT]
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+benchDir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(benchDir, os.pardir))
+sys.path.insert(0, benchDir)
+import tnvalidator
+import synthetic
+
+def bestOf(repeat, function):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+#Open the workbook with openpyxl the way the openpyxl reader does
+def loadOpenpyxl(path):
+    reader = tnvalidator.OpenpyxlOrdersReader(path)
+    reader.close()
+
+def loadFast(path):
+    reader = tnvalidator.FastOrdersReader(path)
+    reader.close()
+
+#{timing name: best seconds} for one order sheet
+def measure(path, repeat):
+    timings = {}
+    timings["load.fast"] = bestOf(repeat, lambda: loadFast(path))
+    timings["load.openpyxl"] = bestOf(repeat, lambda: loadOpenpyxl(path))
+    timings["parse.fast"] = bestOf(repeat, lambda: tnvalidator.processOrdersXLSX(path, fast=True))
+    timings["parse.openpyxl"] = bestOf(repeat, lambda: tnvalidator.processOrdersXLSX(path, fast=False))
+
+    #parse.fast with the reference sheets taken from a warm cache (filled by a first parse), on disk and in memory.
+    #The reference sheets on their own (the part of the parse the cache replaces) are timed cold and warm too.
+    referenceSheets = set(tnvalidator.referenceSheets)
+    timings["parse.referenceSheets"] = bestOf(repeat, lambda: tnvalidator.processOrdersXLSX(path, fast=True, sheets=referenceSheets))
+    timings["parse.referenceSheetsOpenpyxl"] = bestOf(repeat, lambda: tnvalidator.processOrdersXLSX(path, fast=False, sheets=referenceSheets))
+    with tempfile.TemporaryDirectory() as cacheDir:
+        cache = tnvalidator.ReferenceCache(cacheDir, 32 * 1024 * 1024)
+        tnvalidator.processOrdersXLSX(path, fast=True, cache=cache)
+        timings["parse.cacheWarm"] = bestOf(repeat, lambda: tnvalidator.processOrdersXLSX(path, fast=True, cache=cache))
+        timings["parse.referenceSheetsCacheWarm"] = bestOf(repeat, lambda: tnvalidator.processOrdersXLSX(path, fast=True, cache=cache, sheets=referenceSheets))
+        timings["parse.referenceSheetsOpenpyxlCacheWarm"] = bestOf(repeat, lambda: tnvalidator.processOrdersXLSX(path, fast=False, cache=cache, sheets=referenceSheets))
+    cache = tnvalidator.MemoryReferenceCache()
+    tnvalidator.processOrdersXLSX(path, fast=True, cache=cache)
+    timings["parse.memoryCacheWarm"] = bestOf(repeat, lambda: tnvalidator.processOrdersXLSX(path, fast=True, cache=cache))
+
+    #the facts and checks as the Diagnostics of a fresh validation record them: a row rule's time in its table's scan
+    #is its check's, the scan fact only keeps the rest. prepare is all the facts, checks all the checks.
+    orderData = tnvalidator.processOrdersXLSX(path)
+    phases = {}
+    for i in range(repeat):
+        diagnostics = tnvalidator.Diagnostics()
+        tnvalidator.runChecks(tnvalidator.prepareTurn(orderData), diagnostics=diagnostics)
+        run = {"prepare": 0.0, "checks": 0.0}
+        for phase in diagnostics.phases:
+            run[phase.phase + "." + phase.name] = phase.seconds
+            run["prepare" if phase.phase == "fact" else "checks"] += phase.seconds
+        for name, seconds in run.items():
+            phases[name] = min(phases.get(name, seconds), seconds)
+    timings["prepare"] = phases.pop("prepare")
+    timings.update(phases)
+    return timings
+
+def gitCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=benchDir, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def lastRecord(resultsPath):
+    record = None
+    try:
+        with open(resultsPath) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+    except FileNotFoundError:
+        pass
+    return record
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark tnvalidator on synthetic order sheets of growing size.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help="multiples of a normal clan (default: %(default)s)")
+    parser.add_argument("--versions", nargs="+", choices=("1.13", "1.12"), default=["1.13", "1.12"], help="sheet versions (default: %(default)s)")
+    parser.add_argument("--errors", type=int, default=2, help="errors of each kind injected per sheet (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, the best is recorded (default: %(default)s)")
+    parser.add_argument("--results", default=os.path.join(benchDir, "results", "scaling.jsonl"), help="file the run is appended to (default: %(default)s)")
+    parser.add_argument("--label", default="", help="note stored with the run")
+    parser.add_argument("--data-dir", default=None, help="keep the generated order sheets here (default: a temporary folder)")
+    args = parser.parse_args(argv)
+
+    previous = lastRecord(args.results)
+    record = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": gitCommit(),
+        "label": args.label,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tempDir:
+        dataDir = args.data_dir or tempDir
+        os.makedirs(dataDir, exist_ok=True)
+        for version in args.versions:
+            for scale in args.scales:
+                key = version + "x" + str(scale)
+                path = os.path.join(dataDir, "synthetic-" + key + ".xlsx")
+                synthetic.writeOrders(path, version, scale, args.errors)
+                print("measuring " + key + " (" + str(os.path.getsize(path) // 1024) + " KB)", file=sys.stderr)
+                record["results"][key] = measure(path, args.repeat)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+    with open(args.results, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+    #table of this run, with the ratio to the previous run where both measured the same thing
+    before = previous["results"] if previous is not None else {}
+    names = list(next(iter(record["results"].values())))
+    for key, timings in record["results"].items():
+        print()
+        print(key + (" vs " + str(previous["commit"]) + " " + previous["time"] if key in before else ""))
+        for name in names:
+            line = "  %-40s %10.2f ms" % (name, timings[name] * 1000)
+            if key in before and before[key].get(name):
+                line += "  %6.2fx" % (timings[name] / before[key][name])
+            print(line)
+        print("  %-40s %10.2fx" % ("warm cache speedup", timings["parse.fast"] / timings["parse.cacheWarm"]))
+        print("  %-40s %10.2fx" % ("warm cache speedup, reference sheets", timings["parse.referenceSheets"] / timings["parse.referenceSheetsCacheWarm"]))
+        print("  %-40s %10.2fx" % ("  with openpyxl", timings["parse.referenceSheetsOpenpyxl"] / timings["parse.referenceSheetsOpenpyxlCacheWarm"]))
+    print()
+    print("recorded in " + args.results)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+
+#Writes synthetic TN3 (sheet version 1.13) and TN3.1 (1.12) auto order sheets for benchmarks and trying out checks.
+#Every sheet processOrdersXLSX reads is written in the column layout of its version. A clean sheet passes every
+#check; errors of each kind in errorKinds can be injected on purpose.
+#usage: python benchmarks/synthetic.py [--version 1.12] [--scale 10] [--errors 2] orders.xlsx
+
+import argparse
+import random
+import sys
+
+#A normal clan at scale 1, larger scales multiply the units and orders (the Valid Goods/Activity sheets stay the same)
+normalClan = {
+    "tribes": 5,
+    "unitsPerTribe": 4,
+    "activitiesPerUnit": 3,
+    "transfers": 40,
+    "skillAttempts": 3,
+}
+
+#Game rules only allow tribes 0xxx-9xxx and 9 units of a kind per tribe, larger scales add more units per tribe
+#numbered past 9 (the checks don't care).
+maxTribes = 10
+unitKinds = ("e", "c", "g", "f")
+
+gmClan = "263"
+
+goods = ["Warriors", "Actives", "Inactives", "Horses", "Cattle", "Goats", "Slaves", "Wagons", "Silver", "Food", "Iron",
+         "Wood", "Bark", "Bones", "Brass", "Bronze", "Clubs", "Coal", "Copper", "Flax", "Furs", "Gold", "Grain",
+         "Hides", "Honey", "Jerkin", "Leather", "Logs", "Ore", "Pelts", "Provisions", "Rope", "Salt", "Shields",
+         "Skins", "Slings", "Spears", "Stones", "Swords", "Traps", "Tin", "Wax"]
+
+activities = [("Hunting", None, None), ("Fishing", None, None), ("Herding", "Cattle", None), ("Herding", "Horses", None),
+              ("Herding", "Goats", None), ("Apiarism", "Honey", None), ("Apiarism", "Wax", None),
+              ("Mining", "Iron", "Ore"), ("Mining", "Coal", None), ("Mining", "Copper", "Ore"), ("Mining", "Tin", "Ore"),
+              ("Forestry", "Logs", None), ("Forestry", "Bark", None), ("Quarrying", "Stones", None),
+              ("Tanning", "Leather", None), ("Weaving", "Rope", None), ("Woodwork", "Clubs", None),
+              ("Weapons", "Spears", None), ("Weapons", "Slings", None), ("Armour", "Jerkin", "Leather"),
+              ("Armour", "Shields", "Wood"), ("Metalwork", "Swords", "Bronze"), ("Farming", "Grain", None),
+              ("Farming", "Flax", None), ("Salting", "Provisions", None)]
+
+skills = ["Archery", "Bonework", "Curing", "Dressing", "Fishing", "Forestry", "Herding", "Hunting", "Leatherwork",
+          "Mining", "Quarrying", "Tanning", "Weaving", "Woodwork", "Metalwork", "Armour", "Weapons", "Seeking"]
+
+clanHeader = ["Unit", "Hex", "Warriors", "Actives", "Inactives", "Horses", "Cattle", "Goats", "Slaves", "Wagons",
+              "Silver", "Food", "Iron", "Wood"]
+
+#Error kinds that can be injected, named after the check that should report them
+errorKinds = ("movementUnits", "scoutingUnits", "emptyUnitScouting", "insufficientWarriorsScouting", "skillUnits",
+              "excessSkillAttempts", "duplicateSkillAttempts", "duplicateSkillPriority", "researchUnits",
+              "activityInvalidUnits", "activityNewUnits", "activityItems", "activityDiscontinuity",
+              "activityNullWorkers", "activityWorkers", "emptyUnitActivity", "transferUnits", "transfersFromNonClan",
+              "transfersToNonClan", "transferGoods")
+
+#Rows of every sheet of a synthetic order sheet as {sheet name: [row values]}, header row first and data columns
+#starting where the version's layout expects them. Returns (sheets, injected) where injected counts the errors
+#written for each error kind.
+def synthesize(version="1.13", scale=1, errors=0, kinds=errorKinds, seed=1, clan="293", **counts):
+    random.seed(seed)
+    params = dict(normalClan)
+    params.update(counts)
+    tn3 = version == "1.13"
+    injected = dict((kind, 0) for kind in kinds)
+
+    #Units: tribes 0293, 1293, ... and their units 0293e1, 0293c1, ...
+    tribeCount = min(maxTribes, params["tribes"] * scale)
+    unitsPerTribe = params["unitsPerTribe"] * params["tribes"] * scale // tribeCount
+    tribes = [str(t) + clan for t in range(tribeCount)]
+    units = []
+    for tribe in tribes:
+        units.append(tribe)
+        for k in range(unitsPerTribe):
+            units.append(tribe + unitKinds[k % len(unitKinds)] + str(k // len(unitKinds) + 1))
+    gmUnits = ["0" + gmClan, "0" + gmClan + "e1"]
+
+    population = {}
+    clanRows = []
+    for unit in units:
+        warriors = random.randint(20, 200)
+        actives = random.randint(20, 200)
+        inactives = random.randint(20, 200)
+        population[unit] = [warriors, actives, inactives]
+        clanRows.append([unit, "AB 01" + str(random.randint(10, 99)), warriors, actives, inactives] + [random.randint(0, 100) for k in range(9)])
+
+    #Units created this turn (listed on Valid Units, not on the Clan sheet), and emptied units for the empty unit errors
+    newUnits = []
+    emptyUnits = []
+    def newUnit():
+        unit = tribes[0] + "e" + str(100 + len(newUnits))
+        newUnits.append(unit)
+        return unit
+    def emptyUnit():
+        unit = tribes[-1] + "g" + str(100 + len(emptyUnits))
+        emptyUnits.append(unit)
+        clanRows.append([unit, "AB 0101"] + [0] * 12)
+        population[unit] = [0, 0, 0]
+        return unit
+
+    def inject(kind):
+        if kind in injected:
+            injected[kind] += 1
+            return True
+        return False
+
+    def badUnit(k):
+        return str(k % 10) + "9" + str(k).zfill(2)[-2:]
+
+    #Activities, contiguous per unit with workers well inside the population
+    activityRows = []
+    for unit in units:
+        for k in range(params["activitiesPerUnit"]):
+            activity = random.choice(activities)
+            activityRows.append([unit, activity[0], activity[1], activity[2], random.randint(1, 5), None, None])
+    for k in range(errors):
+        if inject("activityInvalidUnits"):
+            activityRows.append([badUnit(k), "Hunting", None, None, 1, None, None])
+        if inject("activityNewUnits"):
+            activityRows.append([newUnit(), "Hunting", None, None, 1, None, None])
+        if inject("activityItems"):
+            activityRows.append([units[0], "Mining", "Bogus" + str(k), None, 1, None, None])
+        if inject("activityNullWorkers"):
+            activityRows.append([units[1], "Fishing", None, None, 0, None, None])
+        if inject("activityWorkers"):
+            unit = tribes[k % len(tribes)]
+            activityRows.append([unit, "Hunting", None, None, sum(population[unit]) + 1, None, None])
+        if inject("emptyUnitActivity"):
+            activityRows.append([emptyUnit(), "Hunting", None, None, 1, None, None])
+    for k in range(errors):
+        if inject("activityDiscontinuity"):
+            activityRows.append([units[k % len(units)], "Hunting", None, None, 1, None, None])
+
+    #Movement for every unit, scouting and research for every tribe, skill attempts with distinct priorities/topics
+    movementRows = [[unit] for unit in units]
+    scoutRows = [[tribe, random.randint(1, 5), "N", "NE"] for tribe in tribes]
+    researchRows = [[tribe] for tribe in tribes]
+    skillRows = []
+    for tribe in tribes:
+        for priority, topic in enumerate(random.sample(skills, min(3, params["skillAttempts"]))):
+            skillRows.append([tribe, priority + 1, topic])
+    for k in range(errors):
+        if inject("movementUnits"):
+            movementRows.append([badUnit(k)])
+        if inject("scoutingUnits"):
+            scoutRows.append([badUnit(k), 1, "N", None])
+        if inject("emptyUnitScouting"):
+            scoutRows.append([emptyUnit(), 1, "N", None])
+        if inject("insufficientWarriorsScouting"):
+            tribe = tribes[k % len(tribes)]
+            scoutRows.append([tribe, population[tribe][0] + 1, "S", None])
+        if inject("researchUnits"):
+            researchRows.append([badUnit(k)])
+        if inject("skillUnits"):
+            skillRows.append([badUnit(k), 1, "Mining"])
+    for k in range(errors):
+        tribe = tribes[k % len(tribes)]
+        if inject("excessSkillAttempts"):
+            skillRows.append([tribe, 9, "Seeking"])
+        if inject("duplicateSkillAttempts"):
+            attempt = [row for row in skillRows if row[0] == tribe][0]
+            skillRows.append([tribe, 8, attempt[2].upper()])
+        if inject("duplicateSkillPriority"):
+            skillRows.append([tribe, 1, "Priority" + str(k)])
+
+    #Transfers between clan units, small enough to never empty a unit
+    transferRows = []
+    for k in range(params["transfers"] * scale):
+        transferRows.append([random.choice(units), random.choice(units), random.choice(goods[3:]), random.randint(1, 5), None])
+    for k in range(errors):
+        if inject("transferUnits"):
+            transferRows.append([badUnit(k), badUnit(k + 1), "Silver", 1, None])
+        if inject("transfersFromNonClan"):
+            transferRows.append([badUnit(k), units[0], "Silver", 1, None])
+        if inject("transfersToNonClan"):
+            transferRows.append([units[0], badUnit(k), "Silver", 1, None])
+        if inject("transferGoods"):
+            transferRows.append([units[0], units[1], "Bogus" + str(k), 1, None])
+
+    #TN3 sheets have a clan column in front of the Clan and activity data and a blank first column on the movement sheets
+    def layout(rows, clanColumn):
+        if tn3:
+            return [[clanColumn] + row for row in rows]
+        return rows
+
+    sheets = {
+        "Instructions": [["Sheet Version", version]],
+        "Clan": [(["Clan"] if tn3 else []) + clanHeader] + layout(clanRows, "0" + clan),
+        "Tribes_Activities": [(["Clan"] if tn3 else []) + ["TRIBE", "ACTIVITY", "ITEM", "DISTINCTION", "PEOPLE", "SLAVES", "SPECIALISTS"]] + layout(activityRows, "0" + clan),
+        "Tribe_Movement": [([None] if tn3 else []) + ["TRIBE", "MOVEMENT"]] + layout(movementRows, None),
+        "Scout_Movement": [([None] if tn3 else []) + ["TRIBE", "SCOUTS", "MOVE 1", "MOVE 2"]] + layout(scoutRows, None),
+        "Skill_Attempts": [["TRIBE", "ORDER", "TOPIC"]] + skillRows,
+        "Research_Attempts": [["TRIBE", "TOPIC"]] + researchRows,
+        "Transfers": [["FROM", "TO", "ITEM", "QUANTITY", "NOTES"]] + transferRows,
+        "Valid Goods": [["Goods"]] + [[good] for good in goods],
+        "Valid Activity": [["Activity", "Item", "Distinction"]] + [list(activity) for activity in activities],
+        "Valid Units": [["Units"]] + [[unit] for unit in units + emptyUnits + newUnits + gmUnits],
+    }
+    return sheets, injected
+
+#Write sheets (as synthesize returns them, possibly edited) as an order sheet
+def writeSheets(path, sheets):
+    import openpyxl
+    workbook = openpyxl.Workbook(write_only=True)
+    for sheetName, rows in sheets.items():
+        sheet = workbook.create_sheet(sheetName)
+        for row in rows:
+            sheet.append(row)
+    workbook.save(path)
+
+#Write a synthetic order sheet, returns the injected error counts
+def writeOrders(path, version="1.13", scale=1, errors=0, kinds=errorKinds, seed=1, **counts):
+    sheets, injected = synthesize(version, scale, errors, kinds, seed, **counts)
+    writeSheets(path, sheets)
+    return injected
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic TN auto order sheet.")
+    parser.add_argument("path", help="workbook (.xlsx) to write")
+    parser.add_argument("--version", choices=("1.13", "1.12"), default="1.13", help="sheet version, 1.13 is TN3 and 1.12 TN3.1 (default: %(default)s)")
+    parser.add_argument("--scale", type=int, default=1, help="multiple of a normal clan's units and orders (default: %(default)s)")
+    parser.add_argument("--errors", type=int, default=0, help="errors to inject of each kind (default: %(default)s)")
+    parser.add_argument("--kinds", nargs="+", choices=errorKinds, default=errorKinds, metavar="KIND", help="error kinds to inject (default: all), one of: " + ", ".join(errorKinds))
+    parser.add_argument("--seed", type=int, default=1, help="random seed (default: %(default)s)")
+    for name, value in normalClan.items():
+        parser.add_argument("--" + name, type=int, default=value, help="at scale 1 (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    counts = dict((name, getattr(args, name)) for name in normalClan)
+    injected = writeOrders(args.path, args.version, args.scale, args.errors, args.kinds, args.seed, **counts)
+    for kind, count in injected.items():
+        if count:
+            print(kind + ": " + str(count))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,24 @@
+import os
+import sys
+
+testsDir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(testsDir, os.pardir))
+sys.path.insert(0, os.path.join(testsDir, os.pardir, "benchmarks"))
+
+import pytest
+import synthetic
+import tnvalidator
+
+#Synthetic 1.13 order sheet with two errors of every kind
+@pytest.fixture
+def orders(tmp_path):
+    path = tmp_path / "orders.xlsx"
+    synthetic.writeOrders(str(path), "1.13", 1, 2)
+    return path
+
+#Rule files loaded by a test are unloaded after it
+@pytest.fixture
+def ruleFiles(monkeypatch):
+    monkeypatch.setenv("TNVALIDATOR_RULES", "")
+    yield
+    tnvalidator.loadRuleFiles([])
@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import sys
+
+import synthetic
+import tnvalidator
+
+def readJson(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+#the .xlsx files directly in a folder, in name order, without Excel's ~$ lock files, next to files given by name.
+#Sheets of the same name get numbered reports.
+def test_find_order_files(tmp_path):
+    folder = tmp_path / "clans"
+    (folder / "sub").mkdir(parents=True)
+    for name in ("b.xlsx", "a.xlsx", "~$a.xlsx", "notes.txt", "sub/c.xlsx"):
+        (folder / name).write_bytes(b"")
+    (tmp_path / "a.xlsx").write_bytes(b"")
+    orderFiles = tnvalidator.findOrderFiles([folder, tmp_path / "a.xlsx"])
+    assert orderFiles == [folder / "a.xlsx", folder / "b.xlsx", tmp_path / "a.xlsx"]
+    usedNames = set()
+    assert [tnvalidator.reportName(f, usedNames) for f in orderFiles] == ["a.json", "b.json", "a-2.json"]
+
+#0 when no sheet has errors (warnings don't count), 1 when one has, 2 when one can't be read
+def test_exit_codes(tmp_path, capsys):
+    warnings = tmp_path / "warnings.xlsx"
+    synthetic.writeOrders(str(warnings), "1.13", 1, 1, kinds=("transfersToNonClan",))
+    errors = tmp_path / "errors.xlsx"
+    synthetic.writeOrders(str(errors), "1.13", 1, 1, kinds=("transferUnits",))
+    broken = tmp_path / "broken.xlsx"
+    broken.write_bytes(b"not a workbook")
+    out = str(tmp_path / "reports")
+    assert tnvalidator.main(["-o", out, "-j", "1", str(warnings)]) == 0
+    assert tnvalidator.main(["-o", out, "-j", "1", str(warnings), str(errors)]) == 1
+    assert tnvalidator.main(["-o", out, "-j", "1", str(errors), str(broken)]) == 2
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == str(warnings) + ": 0 errors, 1 warnings"
+    assert lines[-1].startswith(str(broken) + ": ")
+
+#one report per sheet and a summary of them all, without the findings
+def test_summary(tmp_path, orders):
+    broken = tmp_path / "broken.xlsx"
+    broken.write_bytes(b"not a workbook")
+    out = tmp_path / "reports"
+    assert tnvalidator.runBatch([tmp_path], out, jobs=1) == 2
+    report = readJson(out / "orders.json")
+    assert report["status"] == "error" and report["errors"] > 0 and report["gameVersion"] == "TN3"
+    assert len(report["findings"]) == report["errors"] + report["warnings"]
+    assert sum(entry["findings"] for entry in report["checks"]) == len(report["findings"])
+    summary = readJson(out / "summary.json")
+    assert [entry["reportFile"] for entry in summary["files"]] == ["broken.json", "orders.json"]
+    invalid, valid = summary["files"]
+    assert invalid["status"] == "invalid" and invalid["file"] == str(broken) and invalid["message"]
+    assert valid == {key: value for key, value in report.items() if key not in ("checks", "findings", "diagnostics")} | {"reportFile": "orders.json"}
+    assert valid["clanNumber"] == "293"
+
+#-j 2 validates the sheets in worker processes with tkinter missing and no display, as on a CI runner
+def test_parallel_without_tkinter(tmp_path):
+    for clan in ("293", "294", "295"):
+        synthetic.writeOrders(str(tmp_path / (clan + ".xlsx")), "1.13", 1, 1, kinds=("transferUnits",), clan=clan)
+    out = tmp_path / "reports"
+    script = ("import sys; sys.modules['tkinter'] = None; import tnvalidator; assert tnvalidator.tk is None; "
+              "sys.exit(tnvalidator.main(sys.argv[1:]))")
+    env = {key: value for key, value in os.environ.items() if key != "DISPLAY"}
+    env["PYTHONPATH"] = os.pathsep.join([os.path.dirname(tnvalidator.__file__), env.get("PYTHONPATH", "")])
+    process = subprocess.run([sys.executable, "-c", script, "-j", "2", "-o", str(out), str(tmp_path)], env=env, capture_output=True, text=True)
+    assert process.returncode == 1, process.stderr
+    assert "tkinter" not in process.stderr
+    summary = readJson(out / "summary.json")
+    assert [entry["reportFile"] for entry in summary["files"]] == ["293.json", "294.json", "295.json"]
+    assert all(entry["status"] == "error" for entry in summary["files"])
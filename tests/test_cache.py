@@ -0,0 +1,111 @@
+import os
+
+import pytest
+import synthetic
+import tnvalidator
+
+#Tables of a sheet read through the cache and the worksheets that came from it
+def cachedRead(path, cache, fast=True):
+    diagnostics = tnvalidator.Diagnostics()
+    tables = tnvalidator.processOrdersXLSX(str(path), cache=cache, fast=fast, diagnostics=diagnostics)
+    return tables, [phase.name[:-len(" (cached)")] for phase in diagnostics.phases if phase.name.endswith(" (cached)")]
+
+def entries(cache):
+    return sorted(cache.directory.glob("*.ref"))
+
+#a hit gives the tables a fresh parse does, with either reader
+@pytest.mark.parametrize("fast", [True, False])
+def test_hit(tmp_path, orders, fast):
+    cache = tnvalidator.ReferenceCache(tmp_path / "cache")
+    fresh = tnvalidator.processOrdersXLSX(str(orders), fast=fast)
+    first, cached = cachedRead(orders, cache, fast)
+    assert cached == [] and len(entries(cache)) == len(tnvalidator.referenceSheets)
+    second, cached = cachedRead(orders, cache, fast)
+    assert sorted(cached) == sorted(tnvalidator.referenceSheets)
+    assert first == second == fresh
+
+#editing a Valid sheet misses for that sheet only, the other reference sheets still hit
+def test_miss_after_edit(tmp_path):
+    cache = tnvalidator.ReferenceCache(tmp_path / "cache")
+    sheets, injected = synthetic.synthesize()
+    synthetic.writeSheets(tmp_path / "before.xlsx", sheets)
+    cachedRead(tmp_path / "before.xlsx", cache)
+    sheets["Valid Goods"].append(["Gizmo"])
+    synthetic.writeSheets(tmp_path / "after.xlsx", sheets)
+    tables, cached = cachedRead(tmp_path / "after.xlsx", cache)
+    assert sorted(cached) == ["Valid Activity", "Valid Units"]
+    assert tables == tnvalidator.processOrdersXLSX(str(tmp_path / "after.xlsx"))
+    assert "Gizmo" in tables["validGoods"].values("good")
+
+#the same Valid sheets in a sheet of the other game version aren't taken from the cache
+def test_miss_after_version_change(tmp_path):
+    cache = tnvalidator.ReferenceCache(tmp_path / "cache")
+    for version in ("1.13", "1.12"):
+        synthetic.writeOrders(str(tmp_path / (version + ".xlsx")), version, 1, 1)
+    cachedRead(tmp_path / "1.13.xlsx", cache)
+    tables, cached = cachedRead(tmp_path / "1.12.xlsx", cache)
+    assert cached == []
+    assert tables == tnvalidator.processOrdersXLSX(str(tmp_path / "1.12.xlsx"))
+    assert len(entries(cache)) == 2 * len(tnvalidator.referenceSheets)
+
+#corrupt and truncated entries are read as misses and written again
+def test_corrupt_entries(tmp_path, orders):
+    cache = tnvalidator.ReferenceCache(tmp_path / "cache")
+    fresh, cached = cachedRead(orders, cache)
+    corrupt, truncated, intact = entries(cache)
+    corrupt.write_bytes(b"not a cache entry")
+    truncated.write_bytes(truncated.read_bytes()[:10])
+    tables, cached = cachedRead(orders, cache)
+    assert tables == fresh
+    assert len(cached) == 1
+    tables, cached = cachedRead(orders, cache)
+    assert tables == fresh
+    assert sorted(cached) == sorted(tnvalidator.referenceSheets)
+    assert cache.get("missing", "TN3", ()) is None
+
+#past maxBytes the least recently used entries (by write or hit) are removed
+def test_eviction(tmp_path):
+    cache = tnvalidator.ReferenceCache(tmp_path / "cache")
+    data = dict((key, tuple(key + str(i) for i in range(2000))) for key in "abcd")
+    for key in "abc":
+        cache.put(key, "TN3", (), data[key])
+    for age, key in enumerate("abc"):
+        os.utime(cache.entryPath(key, "TN3", ()), (1000 + age, 1000 + age))
+    assert cache.get("a", "TN3", ()) == data["a"]
+    sizes = [path.stat().st_size for path in entries(cache)]
+    cache.maxBytes = int(max(sizes) * 2.5)
+    cache.put("d", "TN3", (), data["d"])
+    assert [key for key in "abcd" if cache.get(key, "TN3", ()) is not None] == ["a", "d"]
+
+#--cache-size limits the cache directory of a batch run
+def test_cache_size_option(tmp_path, orders):
+    directory = tmp_path / "cache"
+    assert tnvalidator.main(["--cache-dir", str(directory), "--cache-size", "100", "-o", str(tmp_path / "reports"), "-j", "1", str(orders)]) == 1
+    assert len(list(directory.glob("*.ref"))) == len(tnvalidator.referenceSheets)
+    sizes = sorted(path.stat().st_size for path in directory.glob("*.ref"))
+    limit = (sizes[-1] + sizes[-2]) / (1024 * 1024)
+    for path in directory.glob("*.ref"):
+        path.unlink()
+    tnvalidator.main(["--cache-dir", str(directory), "--cache-size", str(limit), "-o", str(tmp_path / "reports"), "-j", "1", str(orders)])
+    assert sum(path.stat().st_size for path in directory.glob("*.ref")) <= limit * 1024 * 1024
+    assert len(list(directory.glob("*.ref"))) < len(tnvalidator.referenceSheets)
+
+#the service's memory cache: hits give the same tables, least recently used entries go past maxEntries, misses are
+#looked up in and written to the backing cache
+def test_memory_cache(tmp_path, orders):
+    backing = tnvalidator.ReferenceCache(tmp_path / "cache")
+    cache = tnvalidator.MemoryReferenceCache(maxEntries=2, backing=backing)
+    fresh = tnvalidator.processOrdersXLSX(str(orders))
+    tables, cached = cachedRead(orders, cache)
+    assert tables == fresh and cached == []
+    assert len(cache.entries) == 2 and len(entries(backing)) == 3
+    tables, cached = cachedRead(orders, cache)
+    assert tables == fresh and sorted(cached) == sorted(tnvalidator.referenceSheets)
+
+    memory = tnvalidator.MemoryReferenceCache(maxEntries=2)
+    for key in "abc":
+        memory.put(key, "TN3", (), key.upper())
+    assert memory.get("a", "TN3", ()) is None
+    assert memory.get("b", "TN3", ()) == "B"
+    memory.put("d", "TN3", (), "D")
+    assert [memory.get(key, "TN3", ()) for key in "abcd"] == [None, "B", None, "D"]
@@ -0,0 +1,51 @@
+import tnvalidator
+
+#Findings of the movementUnits check for the units on a hand made Tribe_Movement sheet, with their row keys
+def movementResults(units):
+    table = tnvalidator.SheetTable
+    validUnits = ("0293", "0293e1", "0293c1")
+    turn = tnvalidator.prepareTurn({
+        "gameVersion": "TN3",
+        "validUnits": table((2, 3, 4), {"unit": validUnits}),
+        "clan": table((2, 3, 4), {"unit": validUnits}),
+        "movement": table(tuple(range(2, len(units) + 2)), {"unit": tuple(units)}),
+    })
+    results = tnvalidator.runChecks(turn, ["movementUnits"])
+    tnvalidator.keyFindings(turn, results)
+    return results
+
+def diff(before, after):
+    return tnvalidator.diffResults(movementResults(before), movementResults(after), ["movementUnits"])
+
+def summary(diff):
+    return {kind: [finding.unit if kind != "changed" else (finding[0].unit, finding[1].unit) for finding in findings] for kind, findings in diff.items()}
+
+#rows inserted above findings move them without making them new
+def test_inserted_rows():
+    assert summary(diff(["0293", "0999", "0293e1", "0998"], ["0293c1", "0293", "0999", "0293e1", "0997", "0998"])) == {"new": ["0997"], "resolved": [], "changed": []}
+
+def test_deleted_rows():
+    assert summary(diff(["0293", "0999", "0293e1", "0998"], ["0293e1", "0998"])) == {"new": [], "resolved": ["0999"], "changed": []}
+
+#identical rows share a content key and are told apart by order, one of them going is resolved, not changed
+def test_duplicate_keys():
+    assert summary(diff(["0999", "0293", "0999", "0999"], ["0293", "0999", "0999"])) == {"new": [], "resolved": ["0999"], "changed": []}
+    assert summary(diff(["0999"], ["0999", "0293", "0999"])) == {"new": ["0999"], "resolved": [], "changed": []}
+
+#findings without a row are matched by unit, and by text among the unit's findings
+def test_unit_findings():
+    def finding(severity, unit, message):
+        return tnvalidator.Finding(severity, None, unit, message)
+    before = {"check": [finding("warning", "0293", "A"), finding("warning", "0293", "B"), finding("error", "0293e1", "C")]}
+    after = {"check": [finding("warning", "0293", "B"), finding("warning", "0293E1", "D")]}
+    result = tnvalidator.diffResults(before, after, ["check"])
+    assert [f.message for f in result["resolved"]] == ["A"]
+    assert [(old.message, new.message) for old, new in result["changed"]] == [("C", "D")]
+    assert result["new"] == []
+
+#many findings of one unit are matched in linear time
+def test_many_unit_findings():
+    before = {"check": [tnvalidator.Finding("warning", None, None, "Message " + str(i)) for i in range(20000)]}
+    after = {"check": before["check"][1:] + [tnvalidator.Finding("warning", None, None, "Message new")]}
+    result = tnvalidator.diffResults(before, after, ["check"])
+    assert [(old.message, new.message) for old, new in result["changed"]] == [("Message 0", "Message new")]
@@ -0,0 +1,37 @@
+import json
+
+import tnvalidator
+
+def jsonLines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+#--stream: the findings go to the export only, the report counts them the same
+def test_stream_export(tmp_path, orders):
+    kept = tnvalidator.validateFile(orders, exports=[tnvalidator.JsonLinesExporter(tmp_path / "kept.jsonl")])
+    streamed = tnvalidator.validateFile(orders, exports=[tnvalidator.JsonLinesExporter(tmp_path / "streamed.jsonl")], keep=False)
+    assert "findings" not in streamed
+    assert streamed["checks"] == kept["checks"]
+    assert (streamed["status"], streamed["errors"], streamed["warnings"]) == (kept["status"], kept["errors"], kept["warnings"])
+    records = jsonLines(tmp_path / "streamed.jsonl")
+    assert records == jsonLines(tmp_path / "kept.jsonl")
+    findings = [record for record in records if record["type"] == "finding"]
+    assert len(findings) == kept["errors"] + kept["warnings"] > 0
+    assert records[-1]["type"] == "summary" and records[-1]["errors"] == kept["errors"]
+
+#exported row findings carry the row keys a --diff report has
+def test_export_row_keys(tmp_path, orders):
+    tnvalidator.validateFile(orders, exports=[tnvalidator.JsonLinesExporter(tmp_path / "orders.jsonl")])
+    report = tnvalidator.validateFile(orders, tnvalidator.IncrementalValidator())
+    exported = [record for record in jsonLines(tmp_path / "orders.jsonl") if record["type"] == "finding"]
+    assert [record["rowKey"] for record in exported] == [finding["rowKey"] for finding in report["findings"]]
+    assert all(record["rowKey"] is not None for record in exported if record["row"] is not None)
+
+#a check's findings are dropped once checkDone has them
+def test_run_checks_without_keep(orders):
+    turn = tnvalidator.prepareTurn(tnvalidator.processOrdersXLSX(str(orders)))
+    done = {}
+    results = tnvalidator.runChecks(turn, checkDone=lambda name, findings: done.setdefault(name, len(findings)), keep=False)
+    assert results == {}
+    assert sum(done.values()) > 0
+    assert all(not findings for findings in turn[tnvalidator.scanFactName("activities")].values())
@@ -0,0 +1,109 @@
+import datetime
+
+import openpyxl
+import pytest
+import synthetic
+import tnvalidator
+
+#FormulaEvaluator over a workbook of {sheet: {cell: value}}, openpyxl saves formulas without values
+@pytest.fixture
+def workbook(tmp_path):
+    readers = []
+    def make(sheets):
+        book = openpyxl.Workbook()
+        book.remove(book.active)
+        for name, cells in sheets.items():
+            sheet = book.create_sheet(name)
+            for ref, value in cells.items():
+                sheet[ref] = value
+        path = tmp_path / ("book%d.xlsx" % len(readers))
+        book.save(str(path))
+        reader = tnvalidator.FastOrdersReader(str(path))
+        readers.append(reader)
+        evaluator = tnvalidator.FormulaEvaluator(reader)
+        def value(ref, sheetName=None):
+            row, col = openpyxl.utils.cell.coordinate_to_tuple(ref)
+            return evaluator.cell(sheetName or next(iter(sheets)), row, col)
+        return value
+    yield make
+    for reader in readers:
+        reader.close()
+
+
+def test_operators(workbook):
+    value = workbook({"S": {"A1": 7, "A2": 2, "A3": "ab",
+        "B1": "=A1+A2*3", "B2": "=(A1-A2)/2", "B3": "=A2^3", "B4": "=-A1%", "B5": '=A3&"c"&A2',
+        "B6": "=A1>A2", "B7": '=A3<>"ab"', "B8": "=A1/0", "B9": "=A1+A3", "B10": "=A9+1"}})
+    assert [value("B%d" % i) for i in range(1, 11)] == [13, 2.5, 8, -0.07, "abc2", True, False, "#DIV/0!", "#VALUE!", 1]
+
+def test_ranges_and_sheets(workbook):
+    value = workbook({"S": {"A1": 1, "A2": 2, "A3": 3, "B1": 10, "C1": "=SUM(A1:B3)", "C2": "=SUM(A:A)", "C3": "=SUM(Other!A1:A2)", "C4": "='My Sheet'!A1*2"},
+        "Other": {"A1": 5, "A2": "=A1+1"}, "My Sheet": {"A1": 21}})
+    assert [value("C%d" % i) for i in range(1, 5)] == [16, 6, 11, 42]
+
+def test_functions(workbook):
+    value = workbook({"S": {"A1": "Horses", "A2": "Cattle", "A3": "Horses", "B1": 3, "B2": 4, "B3": 5,
+        "C1": '=IF(B1>2,"big","small")', "C2": '=VLOOKUP("cattle",A1:B3,2,FALSE)', "C3": '=COUNTIF(A1:A3,"Horses")',
+        "C4": '=SUMIF(A1:A3,"Horses",B1:B3)', "C5": '=IFERROR(VLOOKUP("Goats",A1:B3,2,FALSE),0)', "C6": "=MAX(B1:B3)-MIN(B1:B3)",
+        "C7": '=INDEX(B1:B3,MATCH("Cattle",A1:A3,0))', "C8": "=ROUND(AVERAGE(B1:B3)/3,2)", "C9": "=UPPER(LEFT(A2,3))", "C10": "=UNKNOWN(B1)"}})
+    assert [value("C%d" % i) for i in range(1, 11)] == ["big", 4, 2, 8, 0, 2, 4, 1.33, "CAT", None]
+
+def test_cycles(workbook):
+    value = workbook({"S": {"A1": "=B1+1", "B1": "=A1+1", "C1": "=C1+5"}})
+    assert value("A1") == 2
+    assert value("C1") == 5
+
+def test_deep_chain(workbook):
+    cells = {"A%d" % n: "=A%d+1" % (n + 1) for n in range(2, 2000)}
+    cells["A2000"] = 0
+    value = workbook({"S": cells})
+    assert value("A2") == 1998
+    assert value("A1000") == 1000
+
+def test_deep_cycle(workbook):
+    cells = {"A%d" % n: "=A%d+1" % (n + 1) for n in range(1, 1000)}
+    cells["A1000"] = "=A1+1"
+    value = workbook({"S": cells})
+    assert value("A1") == 1000
+
+def test_number_errors(workbook):
+    value = workbook({"S": {"A1": 0, "B1": "=0^-1", "B2": "=A1^-1", "B3": "=(-8)^0.5", "B4": "=10^300000000", "B5": "=2^3",
+        "B6": "=ROUND(1,-400)", "B7": "=ROUND(1.25,400)", "B8": "=ROUND(1234.5,-2)", "B9": "=B4+1", "B10": "=1E300*1E300"}})
+    assert [value("B%d" % i) for i in range(1, 11)] == ["#DIV/0!", "#DIV/0!", "#NUM!", "#NUM!", 8, 0, 1.25, 1200, "#NUM!", "#NUM!"]
+
+def test_text_counts(workbook):
+    value = workbook({"S": {"C1": '=LEFT("abc",-1)', "C2": '=RIGHT("abc",-1)', "C3": '=MID("abc",1,-1)', "C4": '=LEFT("abc",5)',
+        "C5": '=RIGHT("abc",2)', "C6": '=RIGHT("abc",0)', "C7": '=RIGHT("abc")', "C8": '=IFERROR(LEFT("abc",-1),"x")'}})
+    assert [value("C%d" % i) for i in range(1, 9)] == ["#VALUE!", "#VALUE!", "#VALUE!", "abc", "bc", "", "c", "x"]
+
+#formulas compute with the serial numbers of dates
+def test_date_serials(workbook):
+    value = workbook({"S": {"A1": datetime.datetime(2026, 4, 1), "A2": datetime.datetime(1900, 1, 1), "B1": "=A1+1", "B2": "=A2", "B3": "=A1-A2"}})
+    assert [value("B%d" % i) for i in range(1, 4)] == [46114, 1, 46112]
+
+#a date cell on a sheet read doesn't stop formulas saved without a value from being evaluated, with either reader
+@pytest.mark.parametrize("fast", [True, False])
+def test_dates_with_formulas(tmp_path, fast):
+    sheets, injected = synthetic.synthesize("1.13", 1, 0)
+    warriors = sheets["Clan"][1][3]
+    sheets["Clan"][1][3] = "=%d+0" % warriors
+    sheets["Clan"][2][2] = datetime.datetime(2026, 4, 1, 12)
+    book = openpyxl.Workbook(write_only=True)
+    for sheetName, rows in sheets.items():
+        sheet = book.create_sheet(sheetName)
+        for row in rows:
+            sheet.append(row)
+    path = tmp_path / "orders.xlsx"
+    book.save(str(path))
+    diagnostics = tnvalidator.Diagnostics()
+    orderData = tnvalidator.processOrdersXLSX(str(path), fast=fast, diagnostics=diagnostics)
+    assert orderData["clan"].column("warriors")[0] == warriors
+    loads = [phase.name for phase in diagnostics.phases if phase.phase == "load"]
+    assert loads == (["fast reader"] if fast else ["openpyxl"])
+    turn = tnvalidator.prepareTurn(orderData)
+    assert tnvalidator.findingCounts(tnvalidator.runChecks(turn)) == (0, 0)
+    reader = tnvalidator.FastOrdersReader(str(path))
+    try:
+        assert next(reader.rows("Clan", 3, minRow=3))[1][2] == datetime.datetime(2026, 4, 1, 12)
+    finally:
+        reader.close()
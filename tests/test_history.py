@@ -0,0 +1,29 @@
+import pytest
+
+import tnvalidator
+
+turnNames = ["900-2", "899-12", "900-10", "900-1"]
+
+#History with the synthetic sheet stored under every turn name, in that order
+@pytest.fixture
+def history(tmp_path, orders):
+    history = tnvalidator.TurnHistory(tmp_path / "history.db")
+    turn, results = tnvalidator.validateOrders(str(orders), None, None)
+    for name in turnNames:
+        history.store(turn, results, name, orders)
+    yield history
+    history.close()
+
+
+def test_turn_order(history):
+    assert [run["turn"] for run in history.query("runs")] == ["900-10", "900-2", "900-1", "899-12"]
+    assert [run["turn"] for run in history.query("runs", last=2)] == ["900-10", "900-2"]
+    assert tnvalidator.turnOrder("2026-04-11") > tnvalidator.turnOrder("2026-04-09") > tnvalidator.turnOrder("2025-12-31")
+
+def test_counts_keep_turns_without_rows(history):
+    counts = history.counts("findings", unit="NOSUCHUNIT")
+    assert [(row["turn"], row["rows"]) for row in counts] == [(name, 0) for name in ["900-10", "900-2", "900-1", "899-12"]]
+    counts = history.counts("findings", check="transferGoods", last=3)
+    assert [(row["turn"], row["rows"]) for row in counts] == [("900-10", 2), ("900-2", 2), ("900-1", 2)]
+    counts = history.counts("transfers", unit="2293", turn="899-12")
+    assert len(counts) == 1 and counts[0]["rows"] == len(history.query("transfers", unit="2293", turn="899-12")) > 0
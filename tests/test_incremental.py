@@ -0,0 +1,62 @@
+import synthetic
+import tnvalidator
+
+#Findings of check results as dicts, to compare runs
+def findingDicts(results):
+    return {name: [finding.asDict() for finding in findings] for name, findings in results.items()}
+
+def freshResults(path):
+    turn = tnvalidator.prepareTurn(tnvalidator.processOrdersXLSX(str(path)))
+    return findingDicts(tnvalidator.runChecks(turn))
+
+#Checks rerun when the named tables change
+def readingChecks(*tables):
+    return [name for name, chk in tnvalidator.checks.items() if chk.reads is None or set(tables).intersection(chk.reads)]
+
+#editing one worksheet parses only it again and reruns only the checks reading its table, with the findings of a
+#fresh run
+def test_edit_one_sheet(tmp_path):
+    path = tmp_path / "orders.xlsx"
+    sheets, injected = synthetic.synthesize(errors=2)
+    synthetic.writeSheets(path, sheets)
+    validator = tnvalidator.IncrementalValidator()
+    turn, results = validator.validate(path)
+    assert validator.parsedSheets == tnvalidator.layoutSheets("TN3")
+    assert validator.rerunChecks == list(tnvalidator.checks)
+    assert findingDicts(results) == freshResults(path)
+
+    turn, unchanged = validator.validate(path)
+    assert (validator.parsedSheets, validator.rerunChecks) == ([], readingChecks())
+    assert findingDicts(unchanged) == findingDicts(results)
+
+    #a transfer to a unit no one has
+    sheets["Transfers"][1][1] = "0293x9"
+    synthetic.writeSheets(path, sheets)
+    turn, results = validator.validate(path)
+    assert findingDicts(results) != findingDicts(unchanged)
+    assert validator.parsedSheets == ["Transfers"]
+    assert validator.rerunChecks == readingChecks("transfers")
+    assert 0 < len(validator.rerunChecks) < len(tnvalidator.checks)
+    assert findingDicts(results) == freshResults(path)
+
+#a changed Instructions sheet (e.g. another sheet version) starts over: every sheet parsed, every check run
+def test_instructions_change(tmp_path):
+    path = tmp_path / "orders.xlsx"
+    sheets, injected = synthetic.synthesize(errors=1)
+    synthetic.writeSheets(path, sheets)
+    validator = tnvalidator.IncrementalValidator()
+    validator.validate(path)
+
+    sheets["Instructions"].append(["Notes", "edited"])
+    synthetic.writeSheets(path, sheets)
+    turn, results = validator.validate(path)
+    assert validator.parsedSheets == tnvalidator.layoutSheets("TN3")
+    assert validator.rerunChecks == list(tnvalidator.checks)
+    assert findingDicts(results) == freshResults(path)
+
+    synthetic.writeOrders(str(path), "1.12", 1, 1)
+    turn, results = validator.validate(path)
+    assert turn["gameVersion"] == "TN3.1"
+    assert validator.parsedSheets == tnvalidator.layoutSheets("TN3.1")
+    assert validator.rerunChecks == list(tnvalidator.checks)
+    assert findingDicts(results) == freshResults(path)
@@ -0,0 +1,50 @@
+import synthetic
+import tnvalidator
+
+
+def test_ledger_seeds_clan_goods(orders):
+    turn, results = tnvalidator.validateOrders(str(orders), None, None)
+    sheets, injected = synthetic.synthesize("1.13", 1, 2, synthetic.errorKinds, 1)
+    header = sheets["Clan"][0]
+    for values in sheets["Clan"][1:]:
+        stock = dict(zip(header, values))
+        unit = stock["Unit"]
+        for good in ("Horses", "Cattle", "Wood"):
+            transferred = sum(quantity * ((toUnit == unit) - (fromUnit == unit)) for fromUnit, toUnit, item, quantity, notes in sheets["Transfers"][1:] if item == good and isinstance(quantity, int))
+            assert tnvalidator.ledgerCount(turn["ledger"], unit, good) == stock[good] + transferred, (unit, good)
+
+def test_new_units_reported_once(orders):
+    turn, results = tnvalidator.validateOrders(str(orders), None, None)
+    newUnits = {finding.unit for finding in results["activityNewUnits"]}
+    assert newUnits
+    assert not newUnits & {finding.unit for finding in results["emptyUnitActivity"]}
+    assert len(results["emptyUnitActivity"]) == synthetic.synthesize("1.13", 1, 2, synthetic.errorKinds, 1)[1]["emptyUnitActivity"]
+
+#Turn of hand made tables: Clan and Valid Units list units with their warriors/actives, no transfers
+def handTurn(units, scouting=(), activities=()):
+    table = tnvalidator.SheetTable
+    def rows(values):
+        return tuple(range(2, len(values) + 2))
+    clanColumns = {"unit": tuple(units), "warriors": tuple(units.values()), "actives": tuple(units.values()), "inactives": (0,) * len(units)}
+    clanColumns.update({column: (None,) * len(units) for column in tnvalidator.clanStockGoods.values()})
+    return tnvalidator.prepareTurn({
+        "gameVersion": "TN3",
+        "validUnits": table(rows(units), {"unit": tuple(units)}),
+        "clan": table(rows(units), clanColumns),
+        "transfers": table((), {"fromUnit": (), "toUnit": (), "item": (), "quantity": ()}),
+        "validGoods": table((), {"good": ()}),
+        "validActivities": table((2,), {"activity": ("HUNTING",), "item": (None,), "distinction": (None,)}),
+        "scouting": table(rows(scouting), {"unit": tuple(u for u, n in scouting), "scouts": tuple(n for u, n in scouting), "mission": ("N",) * len(scouting), "missionMore": (None,) * len(scouting)}),
+        "activities": table(rows(activities), {"unit": tuple(u for u, n in activities), "activity": ("Hunting",) * len(activities), "item": (None,) * len(activities),
+            "distinction": (None,) * len(activities), "people": tuple(n for u, n in activities), "slaves": (None,) * len(activities), "specialists": (None,) * len(activities)}),
+    })
+
+#rows of a unit spelled in different cases add up, the finding names the first spelling and the row the total went over
+def test_totals_ignore_case():
+    turn = handTurn({"0293e1": 10, "0293c1": 10}, scouting=[("0293e1", 6), ("0293c1", 4), ("0293E1", 6)],
+                    activities=[("0293c1", 12), ("0293e1", 5), ("0293C1", 9)])
+    results = tnvalidator.runChecks(turn, ["insufficientWarriorsScouting", "activityWorkers"])
+    assert [(f.row, f.unit) for f in results["insufficientWarriorsScouting"]] == [(4, "0293e1")]
+    assert "12 scouts" in results["insufficientWarriorsScouting"][0].message
+    assert [(f.row, f.unit) for f in results["activityWorkers"]] == [(4, "0293c1")]
+    assert "21 workers" in results["activityWorkers"][0].message
@@ -0,0 +1,73 @@
+import pytest
+import synthetic
+import tnvalidator
+
+#Synthetic sheet whose only findings are Transfer To Non-Clan warnings
+@pytest.fixture
+def warnings(tmp_path):
+    path = tmp_path / "warnings.xlsx"
+    synthetic.writeOrders(str(path), "1.13", 1, 2, kinds=("transfersToNonClan",))
+    return path
+
+#Record the checks quickValidate runs and the tables it reads
+@pytest.fixture
+def spy(monkeypatch):
+    spy = {"checks": [], "tables": []}
+    def recorded(name, function):
+        def run(turn):
+            spy["checks"].append(name)
+            return function(turn)
+        return run
+    for name, chk in tnvalidator.checks.items():
+        monkeypatch.setattr(chk, "function", recorded(name, chk.function))
+    processOrdersXLSX = tnvalidator.processOrdersXLSX
+    def process(path, **kwargs):
+        spy["tables"].append(kwargs.get("tables"))
+        return processOrdersXLSX(path, **kwargs)
+    monkeypatch.setattr(tnvalidator, "processOrdersXLSX", process)
+    return spy
+
+#the checks run in report order and stop at the first failing finding, which is the first error of its check
+def test_stops_at_first_error(orders, spy):
+    turn, results = tnvalidator.validateOrders(str(orders))
+    spy["checks"].clear()
+    result = tnvalidator.quickValidate(orders)
+    ordered = sorted(tnvalidator.checks, key=lambda name: tnvalidator.categoryOrder.index(tnvalidator.checks[name].category))
+    failing = next(name for name in ordered if any(finding.severity == "error" for finding in results[name]))
+    assert result["status"] == "fail"
+    assert spy["checks"] == ordered[:ordered.index(failing) + 1]
+    assert result["finding"] == next(finding for finding in results[failing] if finding.severity == "error").asDict()
+    assert result["message"].startswith(tnvalidator.checks[failing].title + ": ")
+
+#only the tables of the selected categories' checks are read, other sheets' errors don't fail
+def test_categories_select_tables(tmp_path, spy):
+    path = tmp_path / "transfers.xlsx"
+    synthetic.writeOrders(str(path), "1.13", 1, 2, kinds=("transferUnits", "transferGoods"))
+    skills = {"Skill and Research Orders"}
+    assert tnvalidator.quickValidate(path, skills)["status"] == "pass"
+    expected = set(table for chk in tnvalidator.checks.values() if chk.category in skills for table in chk.reads)
+    assert spy["tables"] == [expected]
+    assert "transfers" not in expected and "activities" not in expected
+    assert set(tnvalidator.checks[name].category for name in spy["checks"]) == skills
+    assert tnvalidator.quickValidate(path, {"Transfer Orders"})["status"] == "fail"
+    assert "transfers" in spy["tables"][-1]
+
+def test_severity(warnings):
+    assert tnvalidator.quickValidate(warnings)["status"] == "pass"
+    result = tnvalidator.quickValidate(warnings, severity="warning")
+    assert result["status"] == "fail" and result["finding"]["check"] == "transfersToNonClan"
+
+#0 when every sheet passes, 1 at the first failing sheet (later ones aren't validated), 2 when one can't be read
+def test_exit_codes(tmp_path, orders, warnings, capsys):
+    broken = tmp_path / "broken.xlsx"
+    broken.write_bytes(b"not a workbook")
+    assert tnvalidator.main(["--quick", str(warnings)]) == 0
+    assert capsys.readouterr().out == "PASS " + str(warnings) + "\n"
+    assert tnvalidator.main(["--quick", "--severity", "warning", str(warnings), str(orders)]) == 1
+    assert capsys.readouterr().out.splitlines()[0].startswith("FAIL " + str(warnings) + ": ")
+    assert tnvalidator.main(["--quick", str(orders), str(broken)]) == 1
+    assert len(capsys.readouterr().out.splitlines()) == 1
+    assert tnvalidator.main(["--quick", str(warnings), str(broken)]) == 2
+    out = capsys.readouterr().out.splitlines()
+    assert out[0].startswith("PASS ") and out[1].startswith("FAIL " + str(broken) + ": ")
+    assert tnvalidator.quickValidate(broken)["status"] == "invalid"
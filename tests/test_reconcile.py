@@ -0,0 +1,48 @@
+import json
+
+import synthetic
+import tnvalidator
+
+#Result of validateFile(..., reconcile=True) for a clan's sheet without findings of its own
+def clanResult(clanNumber, units, transfers=()):
+    return {"file": clanNumber + ".xlsx", "status": "pass", "errors": 0, "warnings": 0, "clanNumber": clanNumber,
+            "clanUnits": list(units), "outsideTransfers": [list(transfer) for transfer in transfers], "checks": [], "findings": []}
+
+#a loaded clan without the unit is an error, a clan that isn't loaded a warning unless the sender declared the unit
+def test_reconcile_clans():
+    results = [
+        clanResult("293", ["0293", "0293e1"], [
+            (2, "0293", "0294e1", False),
+            (3, "0293", "0294E9", False),
+            (4, "0293e1", "0295e1", False),
+            (5, "0293e1", "0295e2", True),
+            (6, "0293", "0296C1", False),
+        ]),
+        clanResult("294", ["0294", "0294e1"], [(2, "0294e1", "0293E1", False), (3, "0294", "0293c9", True)]),
+        clanResult("296", ["0296", "0296c1"]),
+        {"file": "broken.xlsx", "status": "invalid", "message": "not an order sheet"},
+    ]
+    tnvalidator.reconcileTransfers(results)
+    sent, received, quiet, broken = results
+    assert [(f["severity"], f["row"], f["unit"]) for f in sent["findings"]] == [("error", 3, "0294E9"), ("warning", 4, "0295e1")]
+    assert (sent["status"], sent["errors"], sent["warnings"]) == ("error", 1, 1)
+    assert sent["checks"] == [{"name": "transferReconciliation", "category": "Transfer Orders", "title": tnvalidator.reconcileCheck.title, "status": "error", "findings": 2}]
+    assert [(f["severity"], f["unit"]) for f in received["findings"]] == [("error", "0293c9")]
+    assert (quiet["status"], quiet["findings"], quiet["checks"][0]["status"]) == ("pass", [], "pass")
+    assert "clanUnits" not in sent and "outsideTransfers" not in sent
+    assert broken == {"file": "broken.xlsx", "status": "invalid", "message": "not an order sheet"}
+
+#whole batch: the findings are in the JSON reports and summary, not in the exported files
+def test_reconcile_batch(tmp_path):
+    for clan in ("293", "294"):
+        synthetic.writeOrders(str(tmp_path / (clan + ".xlsx")), "1.13", 1, 1, clan=clan)
+    out = tmp_path / "reports"
+    tnvalidator.runBatch([tmp_path], out, jobs=1, reconcile=True, formats=["jsonl"])
+    for clan in ("293", "294"):
+        with open(out / (clan + ".json"), encoding="utf-8") as f:
+            report = json.load(f)
+        reconciled = [finding for finding in report["findings"] if finding["check"] == "transferReconciliation"]
+        assert reconciled and report["checks"][-1]["name"] == "transferReconciliation"
+        assert all(finding["severity"] == "warning" for finding in reconciled)
+        with open(out / (clan + ".jsonl"), encoding="utf-8") as f:
+            assert all(json.loads(line).get("check") != "transferReconciliation" for line in f)
@@ -0,0 +1,159 @@
+import json
+import threading
+
+import tnvalidator
+
+silverToGM = {"name": "silverToGM", "title": "Silver Transferred to GM Units", "table": "transfers",
+              "where": [{"column": "item", "equals": "Silver"}, {"column": "toUnit", "in": "gmUnits"}],
+              "message": "Silver transferred from {fromUnit} to GM unit {toUnit} on Row {row}"}
+
+def writeRules(path, *rules):
+    path.write_text(json.dumps({"rules": list(rules)}))
+    return path
+
+#the transfers scan also runs transferGoods, so a custom transfer rule reads Valid Goods as well
+def test_row_rule_reads_cover_scan(tmp_path, ruleFiles):
+    tnvalidator.loadRuleFiles([writeRules(tmp_path / "rules.json", silverToGM)])
+    reads = tnvalidator.checks["silverToGM"].reads
+    assert "validGoods" in reads
+    assert reads == tnvalidator.checks["transferGoods"].reads
+
+def test_quick_with_custom_transfer_rule(tmp_path, orders, ruleFiles, capsys):
+    rules = writeRules(tmp_path / "rules.json", silverToGM)
+    code = tnvalidator.main(["--rules", str(rules), "--quick", "--categories", "custom", str(orders)])
+    assert code == 0
+    assert capsys.readouterr().out.startswith("PASS ")
+
+def test_quick_reports_failed_validation(orders, monkeypatch):
+    def broken(turn):
+        raise ValueError("broken check")
+    for chk in tnvalidator.checks.values():
+        monkeypatch.setattr(chk, "function", broken)
+    result = tnvalidator.quickValidate(orders, {"Transfer Orders"})
+    assert result["status"] == "failed"
+    assert "broken check" in result["message"]
+
+def test_removed_rule_restores_reads(tmp_path, ruleFiles):
+    before = tnvalidator.checks["transferGoods"].reads
+    tnvalidator.loadRuleFiles([writeRules(tmp_path / "rules.json", dict(silverToGM, where=[{"column": "toUnit", "in": "emptyUnits"}]))])
+    tnvalidator.loadRuleFiles([])
+    assert "silverToGM" not in tnvalidator.checks
+    assert tnvalidator.checks["transferGoods"].reads == before
+
+def test_count_and_unique_rules_match_builtin_checks(tmp_path, orders, ruleFiles):
+    tnvalidator.loadRuleFiles([writeRules(tmp_path / "rules.json",
+        {"name": "skillLimit", "title": "Excess Skill Attempts", "table": "skills", "count": {"by": "unit", "max": 3},
+         "message": "Tribe {unit} assigned {count} skill attempts"},
+        {"name": "skillPriority", "title": "Duplicate Skill Priority", "table": "skills", "unique": ["unit", "order"],
+         "message": "Tribe {unit} attempting multiple skills at priority {order}"})])
+    turn, results = tnvalidator.validateOrders(orders)
+    for builtin, rule in (("excessSkillAttempts", "skillLimit"), ("duplicateSkillPriority", "skillPriority")):
+        assert results[builtin]
+        assert [(f.row, f.message) for f in results[rule]] == [(f.row, f.message) for f in results[builtin]]
+
+def test_bad_rule_file(tmp_path, ruleFiles):
+    path = writeRules(tmp_path / "rules.json", dict(silverToGM, table="nope"))
+    try:
+        tnvalidator.loadRuleFiles([path])
+    except tnvalidator.RuleFileError as e:
+        assert "unknown table" in str(e)
+    else:
+        assert False, "bad rule file loaded"
+
+#--check is looked up after the rule files are loaded, so a custom rule can be queried
+def test_query_custom_rule(tmp_path, orders, ruleFiles, capsys):
+    rules = writeRules(tmp_path / "rules.json", dict(silverToGM, where=[{"column": "toUnit", "in": "emptyUnits", "not": True}]))
+    history = tmp_path / "history.db"
+    assert tnvalidator.main(["--rules", str(rules), "--history", str(history), "--turn", "900-01", "-o", str(tmp_path / "out"), str(orders)]) == 1
+    capsys.readouterr()
+    tnvalidator.loadRuleFiles([])
+    assert tnvalidator.main(["--rules", str(rules), "--history", str(history), "--query", "findings", "--check", "silverToGM", "--count"]) == 0
+    assert "900-01" in capsys.readouterr().out
+    try:
+        tnvalidator.main(["--history", str(history), "--query", "findings", "--check", "nope"])
+    except SystemExit as e:
+        assert e.code == 2
+    else:
+        assert False, "unknown check accepted"
+
+#--quick after a rule file is edited and after it is dropped runs the checks registered at the time
+def test_quick_after_reload_and_removal(tmp_path, orders, ruleFiles, capsys):
+    rules = writeRules(tmp_path / "rules.json", dict(silverToGM, where=[{"column": "item", "blank": False}]))
+    assert tnvalidator.main(["--rules", str(rules), "--quick", "--categories", "custom", str(orders)]) == 1
+    assert "Silver Transferred to GM Units" in capsys.readouterr().out
+    writeRules(rules, dict(silverToGM, name="silverAgain", where=[{"column": "item", "blank": True}]))
+    assert tnvalidator.main(["--rules", str(rules), "--quick", "--categories", "custom", str(orders)]) == 0
+    assert "silverToGM" not in tnvalidator.checks and "silverAgain" in tnvalidator.checks
+    tnvalidator.loadRuleFiles([])
+    assert tnvalidator.quickValidate(orders, {tnvalidator.customCategory})["status"] == "pass"
+    assert tnvalidator.quickValidate(orders, {"Transfer Orders"})["status"] == "fail"
+    assert tnvalidator.customCategory not in tnvalidator.categoryOrder
+
+#GUI validation job that stops at its first check until resume is set, checking is set once it is there
+def pausedJob(orders):
+    job = tnvalidator.ValidationJob(tnvalidator.IncrementalValidator(), str(orders))
+    job.checking = threading.Event()
+    job.resume = threading.Event()
+    progress = job.progress
+    def pausedProgress(stage, name):
+        if stage == "check" and not job.checking.is_set():
+            job.checking.set()
+            job.resume.wait(10)
+        progress(stage, name)
+    job.progress = pausedProgress
+    return job
+
+def jobMessages(job):
+    messages = []
+    while not job.messages.empty():
+        messages.append(job.messages.get_nowait())
+    return messages
+
+#Reloading rule files while a cancelled GUI validation is still running waits for it to stop
+def test_reload_waits_for_gui_worker(tmp_path, orders, ruleFiles, monkeypatch):
+    monkeypatch.setenv("TNVALIDATOR_RULES", str(writeRules(tmp_path / "a.json", silverToGM)))
+    job = pausedJob(orders)
+    job.start()
+    assert job.checking.wait(10)
+    assert "silverToGM" in tnvalidator.checks
+    job.cancel()
+    loader = threading.Thread(target=tnvalidator.loadRuleFiles, args=([writeRules(tmp_path / "b.json", dict(silverToGM, name="silverB"))],))
+    loader.start()
+    loader.join(0.2)
+    assert loader.is_alive()
+    assert "silverToGM" in tnvalidator.checks
+    job.resume.set()
+    loader.join(10)
+    job.thread.join(10)
+    assert jobMessages(job)[-1] == ("cancelled",)
+    assert "silverB" in tnvalidator.checks and "silverToGM" not in tnvalidator.checks
+    assert [rule.name for rule in tnvalidator.rowRules["transfers"]][-1] == "silverB"
+
+#the next sheet's job reloads the edited rule files on its own thread once the cancelled job has stopped, starting it
+#doesn't wait (the Tk thread keeps running), a broken rule file ends it with a ruleError
+def test_next_job_reloads_rules(tmp_path, orders, ruleFiles, monkeypatch):
+    monkeypatch.setenv("TNVALIDATOR_RULES", str(writeRules(tmp_path / "a.json", silverToGM)))
+    old = pausedJob(orders)
+    old.start()
+    assert old.checking.wait(10)
+    old.cancel()
+    monkeypatch.setenv("TNVALIDATOR_RULES", str(writeRules(tmp_path / "b.json", dict(silverToGM, name="silverB"))))
+    job = tnvalidator.ValidationJob(tnvalidator.IncrementalValidator(), str(orders))
+    job.start()
+    job.thread.join(0.2)
+    assert job.thread.is_alive() and job.messages.empty()
+    assert "silverToGM" in tnvalidator.checks
+    old.resume.set()
+    old.thread.join(10)
+    job.thread.join(10)
+    assert jobMessages(old)[-1] == ("cancelled",)
+    message = jobMessages(job)[-1]
+    assert message[0] == "done" and "silverB" in message[2] and "silverToGM" not in message[2]
+
+    monkeypatch.setenv("TNVALIDATOR_RULES", str(writeRules(tmp_path / "c.json", dict(silverToGM, table="nope"))))
+    job = tnvalidator.ValidationJob(tnvalidator.IncrementalValidator(), str(orders))
+    job.start()
+    job.thread.join(10)
+    message, = jobMessages(job)
+    assert message[0] == "ruleError" and "unknown table" in message[1]
+    assert "silverB" in tnvalidator.checks
@@ -0,0 +1,21 @@
+import tnvalidator
+
+
+#a row rule's time in its table's scan is reported as its check's, not as the scan fact's
+def test_rule_time_charged_to_check(orders):
+    diagnostics = tnvalidator.Diagnostics()
+    turn, results = tnvalidator.validateOrders(str(orders), diagnostics=diagnostics)
+    phases = {(phase.phase, phase.name): phase.seconds for phase in diagnostics.phases}
+    for table, rules in tnvalidator.rowRules.items():
+        assert ("fact", tnvalidator.scanFactName(table)) in phases
+        for rule in rules:
+            assert turn.ruleSeconds[rule.name] > 0
+            assert phases[("check", rule.name)] >= turn.ruleSeconds[rule.name]
+
+#rules step through the rows a chunk at a time, findings stay in row order across chunks
+def test_scan_chunks(orders, monkeypatch):
+    turn, results = tnvalidator.validateOrders(str(orders))
+    monkeypatch.setattr(tnvalidator, "scanChunk", 3)
+    chunked = tnvalidator.scanTable(tnvalidator.prepareTurn(turn), "activities")
+    for name, findings in chunked.items():
+        assert [(f.row, f.message) for f in findings] == [(f.row, f.message) for f in results[name]]
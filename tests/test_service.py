@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+import pytest
+
+import tnvalidator
+
+#(status, JSON body) of one HTTP request to the service
+async def request(port, head, body=b""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(head.encode("latin-1") + b"\r\n\r\n" + body)
+    writer.write_eof()
+    response = await reader.read()
+    writer.close()
+    status, sep, rest = response.partition(b"\r\n")
+    return int(status.split()[1]), json.loads(rest.partition(b"\r\n\r\n")[2])
+
+#ValidationService with one worker on an ephemeral port
+@pytest.fixture
+def service():
+    service = tnvalidator.ValidationService(jobs=1)
+    yield service
+    service.pool.shutdown(cancel_futures=True)
+
+def serve(service, requests):
+    async def run():
+        server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return [await request(port, *args) for args in requests]
+    return asyncio.run(run())
+
+
+def test_service(service, orders):
+    data = orders.read_bytes()
+    health, result, malformed, short = serve(service, [
+        ("GET /health HTTP/1.1",),
+        ("POST /validate?name=orders.xlsx HTTP/1.1\r\nContent-Length: " + str(len(data)), data),
+        ("POST /validate HTTP/1.1\r\nContent-Length: lots", b"PK"),
+        ("POST /validate HTTP/1.1\r\nContent-Length: 100", b"PK"),
+    ])
+    assert health == (200, {"status": "ok", "workers": 1, "pending": 0})
+    status, body = result
+    assert status == 200
+    assert body["file"] == "orders.xlsx"
+    assert body["status"] == "error"
+    assert body["errors"] == sum(finding["severity"] == "error" for finding in body["findings"]) > 0
+    assert {finding["check"] for finding in body["findings"]} >= {"transferGoods", "transferUnits"}
+    assert malformed == (400, {"error": "malformed request"})
+    assert short == (400, {"error": "malformed request"})
+
+#uploads whose body is still being received hold their slot, further uploads are refused until they finish
+def test_uploads_being_received_are_pending():
+    service = tnvalidator.ValidationService(jobs=1, maxPending=2)
+    async def run():
+        server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            slow = []
+            for i in range(2):
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(b"POST /validate HTTP/1.1\r\nContent-Length: 100\r\n\r\nPK")
+                await writer.drain()
+                slow.append((reader, writer))
+            for i in range(500):
+                if service.pending == 2:
+                    break
+                await asyncio.sleep(0.01)
+            busy = await request(port, "POST /validate HTTP/1.1\r\nContent-Length: 2", b"PK")
+            health = await request(port, "GET /health HTTP/1.1")
+            for reader, writer in slow:
+                writer.write_eof()
+                await reader.read()
+                writer.close()
+            return busy, health
+    try:
+        busy, health = asyncio.run(run())
+    finally:
+        service.pool.shutdown(cancel_futures=True)
+    assert busy == (503, {"error": "busy, try again later"})
+    assert health[1]["pending"] == 2
+    assert service.pending == 0
+
+#--serve refuses the options it would ignore, $TNVALIDATOR_HISTORY set for batch runs doesn't stop it
+@pytest.mark.parametrize("option", [["--history", "turns.db"], ["--quick"], ["--export", "csv"], ["--export", "csv", "--stream"]])
+def test_serve_rejects_options(option, monkeypatch, capsys):
+    monkeypatch.setattr(tnvalidator, "runServe", lambda *args: 0)
+    with pytest.raises(SystemExit) as e:
+        tnvalidator.main(["--serve", "8765"] + option)
+    assert e.value.code == 2
+    assert "--serve takes no" in capsys.readouterr().err
+
+def test_serve_ignores_history_variable(tmp_path, monkeypatch):
+    served = []
+    monkeypatch.setattr(tnvalidator, "runServe", lambda *args: served.append(args) or 0)
+    monkeypatch.setenv("TNVALIDATOR_HISTORY", str(tmp_path / "turns.db"))
+    assert tnvalidator.main(["--serve", "8765"]) == 0
+    assert len(served) == 1
@@ -0,0 +1,34 @@
+import random
+
+import tnvalidator
+
+#Levenshtein distance without any cut-off
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j-1] + 1, previous[j-1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def test_repeated_bigrams():
+    assert tnvalidator.suggestValues("Banan", frozenset(["BANANA", "APPLE"]), {}) == ["BANANA"]
+    assert sorted(tnvalidator.SimilarityIndex(["SABBB"]).search("NABBB", 1)) == [(1, "SABBB")]
+
+def test_search_matches_brute_force():
+    rng = random.Random(23)
+    for alphabet in ("AB", "ABN", "ABCDEFGHIJ"):
+        keys = frozenset("".join(rng.choice(alphabet) for i in range(rng.randint(1, 8))) for j in range(200))
+        index = tnvalidator.SimilarityIndex(keys)
+        for j in range(200):
+            key = "".join(rng.choice(alphabet) for i in range(rng.randint(1, 9)))
+            distances = sorted((levenshtein(key, other), other) for other in keys)
+            for maxDistance in (1, 2, 3):
+                expected = [(distance, other) for distance, other in distances if distance <= maxDistance]
+                assert sorted(index.search(key, maxDistance)) == expected, (key, maxDistance)
+
+def test_edit_distance_cut_off():
+    assert tnvalidator.editDistance("HORSES", "HORSE", 1) == 1
+    assert tnvalidator.editDistance("HORSES", "CATTLE", 2) == 3
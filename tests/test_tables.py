@@ -0,0 +1,79 @@
+import re
+import zipfile
+
+import pytest
+import synthetic
+import tnvalidator
+
+#a header name finds the column (first matching header name, first matching cell), otherwise the default is used
+def test_table_columns():
+    columns = {"unit": (2, ("TRIBE", "UNIT")), "people": (6, ("PEOPLE", "WORKERS")), "slaves": (7, ("SLAVES",)), "horses": (None, ("HORSES",))}
+    header = ["Clan", "Unit", " workers ", "TRIBE", "tribe", None]
+    assert tnvalidator.tableColumns(header, columns) == {"unit": 4, "people": 3, "slaves": 7, "horses": None}
+    assert tnvalidator.tableColumns([], columns) == {"unit": 2, "people": 6, "slaves": 7, "horses": None}
+
+#rows blank in the table's columns are skipped even with values elsewhere, short rows and columns without a number
+#read as blank
+def test_build_table_skips_blank_rows():
+    colNumbers = {"unit": 2, "people": 4, "horses": None}
+    rows = [(2, ("0293", "0293e1", "note", 5)), (3, ("0293", None, "note", None)), (4, ("0293", "0293c1")), (5, ())]
+    table = tnvalidator.buildTable(rows, colNumbers)
+    assert table == tnvalidator.SheetTable((2, 4), {"unit": ("0293e1", "0293c1"), "people": (5, None), "horses": (None, None)})
+    assert table.values("people") == [5]
+    assert table.cells("unit") == [(2, "0293e1"), (4, "0293c1")]
+    assert list(table.project("unit", "people")) == [(2, "0293e1", 5), (4, "0293c1", None)]
+
+#TN3.1 upper-cases Valid Activity, blank cells stay None rather than becoming "NONE"
+@pytest.mark.parametrize("gameVersion, upper", [("TN3", False), ("TN3.1", True)])
+def test_valid_activities_case(gameVersion, upper):
+    sheetName, columns, tableUpper = tnvalidator.sheetLayouts[gameVersion]["validActivities"]
+    assert tableUpper is upper
+    colNumbers = tnvalidator.tableColumns(["Activity", "Item", "Distinction"], columns)
+    rows = [(2, ("Mining", "Iron", None)), (3, (None, None, None)), (4, ("hunting",))]
+    table = tnvalidator.buildTable(rows, colNumbers, tableUpper)
+    assert table.rows == (2, 4)
+    if upper:
+        assert table.columns == {"activity": ("MINING", "HUNTING"), "item": ("IRON", None), "distinction": (None, None)}
+    else:
+        assert table.columns == {"activity": ("Mining", "hunting"), "item": ("Iron", None), "distinction": (None, None)}
+    index = tnvalidator.buildReferenceIndex({"validGoods": tnvalidator.SheetTable((), {"good": ()}), "validActivities": table})
+    assert ("HUNTING", "NONE", "NONE") in index["activities"]
+
+#the same orders in a TN3 (1.13) and a TN3.1 (1.12) sheet read into the same tables with either reader, the TN3
+#clan column in front of the data and the TN3.1 upper-cased Valid Activity aside
+@pytest.mark.parametrize("fast", [True, False])
+def test_layouts_read_alike(tmp_path, fast):
+    tables = {}
+    for version in ("1.13", "1.12"):
+        path = tmp_path / (version + ".xlsx")
+        synthetic.writeOrders(str(path), version, 1, 1)
+        tables[version] = tnvalidator.processOrdersXLSX(str(path), fast=fast)
+    tn3, tn31 = tables["1.13"], tables["1.12"]
+    assert (tn3["gameVersion"], tn31["gameVersion"]) == ("TN3", "TN3.1")
+    for name, (sheetName, columns, upper) in tnvalidator.sheetLayouts["TN3.1"].items():
+        if upper:
+            assert tn31[name].rows == tn3[name].rows
+            assert tn31[name].columns == {column: tuple(None if value is None else value.upper() for value in values) for column, values in tn3[name].columns.items()}
+            assert tn31[name].columns != tn3[name].columns
+        else:
+            assert tn31[name] == tn3[name], name
+    assert len(tn3["activities"]) > 0 and len(tn3["clan"]) > 0
+
+#a worksheet the fast reader can't handle (an ISO date cell) is read with openpyxl, the other worksheets still fast
+def test_fallback_per_sheet(tmp_path, orders):
+    path = tmp_path / "isodate.xlsx"
+    with zipfile.ZipFile(orders) as source, zipfile.ZipFile(path, "w") as target:
+        clan = tnvalidator.worksheetMembers(source)["Clan"]
+        for item in source.infolist():
+            data = source.read(item)
+            if item.filename == clan:
+                data, n = re.subn(rb'<c r="C3"[^>]*>.*?</c>', b'<c r="C3" t="d"><v>2026-04-01T00:00:00</v></c>', data, count=1)
+                assert n == 1
+            target.writestr(item, data)
+    diagnostics = tnvalidator.Diagnostics()
+    fast = tnvalidator.processOrdersXLSX(str(path), fast=True, diagnostics=diagnostics)
+    assert fast == tnvalidator.processOrdersXLSX(str(path), fast=False)
+    sheets = [phase.name for phase in diagnostics.phases if phase.phase == "sheet"]
+    assert "Clan (openpyxl)" in sheets and "Transfers" in sheets
+    assert [name for name in sheets if name.endswith("(openpyxl)")] == ["Clan (openpyxl)"]
+    assert [phase.name for phase in diagnostics.phases if phase.phase == "load"] == ["fast reader"]
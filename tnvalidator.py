@@ -2,6 +2,57 @@
 
 #Changelog
 
+#Unreleased
+# - Order sheets are opened read-only and each needed worksheet is streamed once for all of its columns
+#   (stops at the last stored row instead of formatting-inflated sheet dimensions)
+# - Added batch mode: validate order sheets/folders from the command line in parallel, without tkinter or a display,
+#   writing JSON reports and a summary. Nonzero exit code when errors are found.
+# - Checks are now a registry of named checks returning Finding records, rendered by the GUI and batch mode
+# - Units, goods and activities are looked up in a case-folded index built once per order sheet. Valid Activity
+#   matching is now case insensitive for TN3 sheets too.
+# - Added post-transfer ledger of every unit's people and goods. Empty unit checks now use post-transfer population,
+#   the insufficient warriors scouting check is finished and activities assigned more workers than a unit's
+#   population are reported.
+# - Added watch mode (GUI checkbox and --watch): re-validates when the order sheet is saved and closed, refreshing the
+#   report in place. A sheet that is still open or in use is retried instead of showing an error.
+# - Watch mode only re-reads worksheets whose contents changed and reruns the checks that use them
+# - Added opt-in on-disk cache of the Valid Goods/Activity/Units sheets (--cache-dir or TNVALIDATOR_CACHE_DIR)
+# - Order sheets are read straight from the xlsx XML, openpyxl is only imported for sheets the fast reader can't
+#   handle (--reader openpyxl or TNVALIDATOR_READER=openpyxl to always use it)
+# - The window validates in the background and stays responsive: a progress bar shows the sheet or check being
+#   worked on, validation can be cancelled and report categories appear as soon as their checks finish
+# - Report tree nodes are filled in when first expanded and long lists are shown 200 rows at a time ("Show next"),
+#   so large reports open and scroll quickly
+# - Added a synthetic order sheet generator and scaling benchmarks (benchmarks/)
+# - Every validation records the time, rows scanned and findings of each phase and check: shown in an optional
+#   Diagnostics branch of the report and included in batch JSON reports. --profile FILE writes a cProfile of the run.
+# - Worksheets are read into column tables found by their header text instead of fixed column positions. Reported
+#   row numbers are now the sheet's own (correct when rows are left blank) and notes-only transfer rows are ignored.
+# - Added --diff: compares order sheets with an earlier batch report folder, report or workbook copy and lists only
+#   the findings that are new, resolved or changed. Findings are matched by row contents, not row numbers, and checks
+#   of unchanged sheets are not rerun. Reports written with --diff or in watch mode include sheet content keys and
+#   row keys for this.
+# - Added --serve: a local HTTP validation service (port or Unix socket) for bots. Uploaded sheets are validated by
+#   a fixed pool of worker processes that keep openpyxl loaded and the reference sheets parsed between requests.
+# - Added --reconcile for alliance batches: transfers to units outside the clan are looked up in the units of every
+#   loaded clan. Transfers to a unit a loaded clan doesn't have are errors, to unknown clans warnings.
+# - Data shared by checks (unit lists, indexes, ledger, populations, empty units, activity groups) is derived once
+#   per validation, when a check first needs it. The activity discontinuity check no longer slows down quadratically.
+# - Added --quick for pre-save hooks: a pass/fail answer that reads only the worksheets the selected checks need
+#   (--categories) and stops at the first finding at or above --severity
+# - Formula cells are read as their value instead of the formula text. Formulas saved without a value (sheets written
+#   by other tools, or with calculation turned off) are evaluated, each cell once, for the common Excel functions.
+# - Added "Save Report" and --export: reports can be written as HTML (looking like the report tree), CSV, JSON Lines
+#   or SARIF, findings are written out as each check finishes
+# - Added --history: validated turns (Clan, activity and transfer rows and findings) are stored in a SQLite database
+#   by clan, game version and turn (--turn), and --query looks them up by unit, check, category, clan or turn
+# - Invalid unit, good and activity findings suggest the closest valid entries ("did you mean Horses?"), looked up
+#   in a bigram index built once per Valid Units/Goods/Activity list
+# - The activity and transfer checks run as row rules of one fused scan per sheet: each Tribes_Activities and
+#   Transfers row is read once for all of them and the units, goods and activities in it are case-folded once
+# - Added --rules (or TNVALIDATOR_RULES): JSON rule files with row conditions, unit/good list membership, group
+#   counts and uniqueness, compiled once per file contents and run in the same scan of each sheet as the built-in checks
+
 #Release R3.1 - April 22, 2026
 # - Fix bug in parsing scouting reports for TN3.1 spreadsheets
 
@@ -43,698 +94,4627 @@
 # - Fixed error when no report is selected
 # - Fixed column parsing stopping on blank lines
 
-import tkinter as tk
-from tkinter import filedialog as fd
-#from tkinter import simpledialog as sd
-from tkinter.messagebox import showerror
-from tkinter import ttk
-import openpyxl
+#tkinter is only needed for the GUI, batch mode runs without it (or without a display)
+try:
+    import tkinter as tk
+    from tkinter import filedialog as fd
+    #from tkinter import simpledialog as sd
+    from tkinter.messagebox import showerror
+    from tkinter import ttk
+except ImportError:
+    tk = None
+#openpyxl is imported by OpenpyxlOrdersReader when an order sheet needs it
 #import xlrd
 import pathlib
+import argparse
+import json
+import os
+import sys
+import time
+import re
+import marshal
+import zlib
+import hashlib
+import string
+import sqlite3
+import csv
+import html
+import functools
+import itertools
+import operator
+import math
+import datetime
+import zipfile
+import posixpath
+import threading
+import queue
+import traceback
+import asyncio
+import multiprocessing
+import io
+import urllib.parse
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
 
 ## Data parsing functions.
-# Parse arbitrary number of columns.
+# Each worksheet the checks use is read into a SheetTable: the needed columns only, stored column by column.
+# Columns are found by their header in row 1 (see Sheet layouts), rows with no value in any of the table's columns
+# are skipped and every kept row remembers its sheet row number for the report.
 
-def parseCols(activeSheet, startCol, numCols):
-    sheetData=[]
-    for i in range(2, activeSheet.max_row + 1):
-        if numCols == 1:
-            if activeSheet.cell(i,startCol).value is None:
-                pass
-            else:
-                sheetData.append(activeSheet.cell(i,startCol).value)
-        else:
-            colData = []
-            rowBlank = True
-            for j in range(numCols):
-                if activeSheet.cell(i,startCol+j).value is not None:
-                    rowBlank = False
-                colData.append(activeSheet.cell(i,startCol+j).value)
-            if rowBlank is False:
-                sheetData.append(colData)
-    return sheetData
-
-def parseColsUpper(activeSheet, startCol, numCols):
-    sheetData=[]
-    for i in range(2, activeSheet.max_row + 1):
-        if numCols == 1:
-            if activeSheet.cell(i,startCol).value is None:
-                pass
-            else:
-                sheetData.append(str(activeSheet.cell(i,startCol).value).upper())
-        else:
-            colData = []
-            rowBlank = True
-            for j in range(numCols):
-                if activeSheet.cell(i,startCol+j).value is not None:
-                    rowBlank = False
-                colData.append(str(activeSheet.cell(i,startCol+j).value).upper())
-            if rowBlank is False:
-                sheetData.append(colData)
-    return sheetData
-
-## Compares two lists/columns, case insensitive
-def checkValidList(testList, validList):
+class SheetTable:
+    __slots__ = ("rows", "columns")
+
+    #rows: sheet row numbers, columns: {column name: tuple of cell values, one per row}
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __eq__(self, other):
+        return isinstance(other, SheetTable) and self.rows == other.rows and self.columns == other.columns
+
+    def __repr__(self):
+        return "SheetTable(" + repr(self.rows) + ", " + repr(self.columns) + ")"
+
+    #Every value of a column (None for blank cells), in row order
+    def column(self, name):
+        return self.columns[name]
+
+    #Non-blank values of a column
+    def values(self, name):
+        return [value for value in self.columns[name] if value is not None]
+
+    #(row, value) pairs of the non-blank cells of a column
+    def cells(self, name):
+        return [(row, value) for row, value in zip(self.rows, self.columns[name]) if value is not None]
+
+    #(row, value, value, ...) tuples of the named columns for every row
+    def project(self, *names):
+        return zip(self.rows, *[self.columns[name] for name in names])
+
+    #Plain tuples/dicts for the reference cache
+    def asData(self):
+        return (self.rows, self.columns)
+
+    @classmethod
+    def fromData(cls, data):
+        return cls(data[0], data[1])
+
+    #{row: key} with a key for every row that depends only on the row's values, not on where it is in the sheet.
+    #Identical rows are told apart by the order they appear in ("#2", "#3", ...).
+    def rowKeys(self):
+        keys = {}
+        seen = {}
+        for row, *values in self.project(*self.columns):
+            key = hashlib.blake2b(repr(values).encode("utf-8"), digest_size=8).hexdigest()
+            seen[key] = seen.get(key, 0) + 1
+            if seen[key] > 1:
+                key += "#" + str(seen[key])
+            keys[row] = key
+        return keys
+
+#Column number of every table column: the first cell of the header row matching one of the column's header names
+#(case and surrounding spaces ignored), otherwise the column's default number. columns is {name: (default, headers)}.
+def tableColumns(header, columns):
+    headerCols = {}
+    for col, value in enumerate(header, 1):
+        if value is not None:
+            headerCols.setdefault(foldCase(value).strip(), col)
+    colNumbers = {}
+    for name, (default, headers) in columns.items():
+        colNumbers[name] = default
+        for headerName in headers:
+            if headerName in headerCols:
+                colNumbers[name] = headerCols[headerName]
+                break
+    return colNumbers
+
+#Highest column number of a table's columns
+def lastColumn(colNumbers):
+    return max(col for col in colNumbers.values() if col is not None)
+
+#Build a SheetTable from (row number, cell values) pairs in one pass. upper upper-cases every value.
+#Columns without a number are read from a blank cell padded after the last one.
+def buildTable(numberedRows, colNumbers, upper=False):
+    names = list(colNumbers)
+    width = lastColumn(colNumbers)
+    positions = [width if colNumbers[name] is None else colNumbers[name] - 1 for name in names]
+    width = max(positions) + 1
+    rows = []
+    columns = [[] for name in names]
+    for rowNumber, values in numberedRows:
+        if len(values) < width:
+            values = tuple(values) + (None,) * (width - len(values))
+        cells = [values[p] for p in positions]
+        if any(x is not None for x in cells):
+            rows.append(rowNumber)
+            for column, value in zip(columns, cells):
+                if upper and value is not None:
+                    value = str(value).upper()
+                column.append(value)
+    return SheetTable(tuple(rows), {name: tuple(column) for name, column in zip(names, columns)})
+
+#Pass rows through, counting them in reader.rowsScanned (for Diagnostics)
+def countRows(reader, rows):
+    for row in rows:
+        reader.rowsScanned += 1
+        yield row
+
+## Case insensitive lookups.
+#Key used for every case insensitive comparison of units, goods and activities
+def foldCase(value):
+    return str(value).upper()
+
+#Case-folded set of a list/column, lists that are already sets of folded keys are used as they are
+def foldedSet(validList):
+    if isinstance(validList, frozenset):
+        return validList
+    return frozenset(foldCase(vi) for vi in validList)
+
+## Compares a column's (row, value) cells (SheetTable.cells) to a list/set of valid values, case insensitive.
+## Returns the (row, value) cells that are not valid.
+def checkValidList(testCells, validList):
+    validKeys = foldedSet(validList)
     listErrors = []
-    for i in range(len(testList)):
-        match = None
-        for vi in validList:
-            if str(testList[i]).upper() == str(vi).upper():
-                match = testList[i]
-               
-        if match is None:
-            #Add 2 to correct human-readable row number for zero indexing and omitting header row 
-            errorData = (i+2,testList[i])
-            listErrors.append(errorData)
+    for row, value in testCells:
+        if foldCase(value) not in validKeys:
+            listErrors.append((row, value))
 
     return listErrors
 
+#Per-workbook index of the unit lists, built once so every check can test membership in O(1).
+#Sets hold folded keys, the *Names dicts map a folded key back to the spelling used on the sheet.
+def buildIndex(turn):
+    validUnits = turn["validUnits"].values("unit")
+    index = {
+        "validUnits": foldedSet(validUnits),
+        "clanUnits": foldedSet(turn["validClanUnits"]),
+        "gmUnits": foldedSet(turn["validGMUnits"]),
+        "tribes": foldedSet(turn["validClanTribes"]),
+        "turnStartUnits": foldedSet(turn["clan"].values("unit")),
+    }
+    index["unitNames"] = {foldCase(unit): unit for unit in reversed(validUnits)}
+    return index
+
+#Index of the Valid Goods and Valid Activity sheets, like buildIndex
+def buildReferenceIndex(turn):
+    validGoods = turn["validGoods"].values("good")
+    validActivities = [activity[1:] for activity in turn["validActivities"].project("activity", "item", "distinction")]
+    index = {
+        "goods": foldedSet(validGoods),
+        "activities": frozenset(tuple(foldCase(x) for x in activity) for activity in validActivities),
+    }
+    index["goodNames"] = {foldCase(good): good for good in reversed(validGoods)}
+    index["activityNames"] = {tuple(foldCase(x) for x in activity): activity for activity in reversed(validActivities)}
+    return index
+
+## Suggestions.
+# Invalid unit, good and activity findings carry the closest valid values ("did you mean"). Every list of valid keys
+# gets a bigram index built once and kept for later sheets with the same list (similarIndex is cached by the folded
+# keys). A key within d edits of another shares all but 2*d of its bigrams (counting repeated bigrams as often as
+# they occur), so a lookup only measures the edit distance to the few keys of a close length sharing enough bigrams,
+# however long the list and however many rows are invalid.
+
+#Bigrams of a key, with its start and end marked, as (bigram, occurrence) pairs so that repeats are counted: the
+#bigrams two keys share are the pairs they share
+def keyBigrams(key):
+    key = "\0" + key + "\1"
+    seen = {}
+    grams = set()
+    for i in range(len(key) - 1):
+        gram = key[i:i+2]
+        seen[gram] = seen.get(gram, 0) + 1
+        grams.add((gram, seen[gram]))
+    return grams
+
+#Levenshtein distance of two strings, maxDistance + 1 once it is known to be larger than maxDistance
+def editDistance(a, b, maxDistance):
+    if abs(len(a) - len(b)) > maxDistance:
+        return maxDistance + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j-1] + 1, previous[j-1] + (ca != cb)))
+        if min(current) > maxDistance:
+            return maxDistance + 1
+        previous = current
+    return previous[-1]
+
+class SimilarityIndex:
+    __slots__ = ("keys", "lengths", "postings")
+
+    def __init__(self, keys):
+        self.keys = sorted(keys)
+        #length: [key number], bigram: [key number]
+        self.lengths = {}
+        self.postings = {}
+        for i, key in enumerate(self.keys):
+            self.lengths.setdefault(len(key), []).append(i)
+            for gram in keyBigrams(key):
+                self.postings.setdefault(gram, []).append(i)
+
+    #(distance, key) of the keys within maxDistance edits of key
+    def search(self, key, maxDistance):
+        shared = {}
+        for gram in keyBigrams(key):
+            for i in self.postings.get(gram, ()):
+                shared[i] = shared.get(i, 0) + 1
+        found = []
+        for length in range(max(0, len(key) - maxDistance), len(key) + maxDistance + 1):
+            needed = max(len(key), length) + 1 - 2 * maxDistance
+            for i in self.lengths.get(length, ()):
+                if shared.get(i, 0) >= needed:
+                    distance = editDistance(key, self.keys[i], maxDistance)
+                    if distance <= maxDistance:
+                        found.append((distance, self.keys[i]))
+        return found
+
+#SimilarityIndex of a frozenset of folded keys
+@functools.lru_cache(maxsize=1024)
+def similarIndex(keys):
+    return SimilarityIndex(keys)
+
+#Edit distance a suggestion may be from a folded key: 1 for short keys, up to 3 for long ones
+def suggestionDistance(key):
+    return max(1, min(3, len(key) // 3))
+
+#(key, distance) of the valid folded keys close to a folded key, the key itself if it is valid
+def closeKeys(key, keys):
+    if key in keys:
+        return [(key, 0)]
+    return [(match, distance) for distance, match in similarIndex(keys).search(key, suggestionDistance(key))]
+
+#Up to limit valid values closest to value, nearest first. keys is the folded set of valid values, names maps a
+#folded key to its spelling on the sheet. None if there is nothing close.
+def suggestValues(value, keys, names, limit=3):
+    if value is None:
+        return None
+    found = sorted((distance, key) for key, distance in closeKeys(foldCase(value), keys))
+    return [str(names.get(key, key)) for distance, key in found[:limit]] or None
+
+#Valid Activity keys by level: (activities, {activity: items}, {(activity, item): distinctions}) of folded keys
+@functools.lru_cache(maxsize=64)
+def activityLevels(activities):
+    items = {}
+    distinctions = {}
+    for activity, item, distinction in activities:
+        items.setdefault(activity, set()).add(item)
+        distinctions.setdefault((activity, item), set()).add(distinction)
+    return (frozenset(items),
+            {activity: frozenset(keys) for activity, keys in items.items()},
+            {pair: frozenset(keys) for pair, keys in distinctions.items()})
+
+#Up to limit valid activity/item/distinction rows closest to an invalid one ("Activity: item / distinction"):
+#close activities, then close items of each and close distinctions of those, by total distance
+def suggestActivities(activity, item, distinction, referenceIndex, limit=3):
+    levels = activityLevels(referenceIndex["activities"])
+    found = []
+    for activityKey, activityDistance in closeKeys(foldCase(activity), levels[0]):
+        for itemKey, itemDistance in closeKeys(foldCase(item), levels[1][activityKey]):
+            for distinctionKey, distinctionDistance in closeKeys(foldCase(distinction), levels[2][(activityKey, itemKey)]):
+                found.append((activityDistance + itemDistance + distinctionDistance, (activityKey, itemKey, distinctionKey)))
+    found.sort()
+    names = referenceIndex["activityNames"]
+    return [str(a) + ": " + str(i) + " / " + str(d) for a, i, d in (names[key] for distance, key in found[:limit])] or None
+
+## Sheet layouts.
+# One layout descriptor per game version: table name: (worksheet, columns, upper). columns is
+# {column name: (default column number, header names)}, a column is found by its header in row 1 and the default
+# number is used when no header matches (a column without a default is blank when its header is missing). upper upper-cases the table's values. A new sheet version only needs a
+# descriptor here (and its Instructions!B1 version in sheetVersions).
+
+#Goods counted on the Clan sheet besides the population: header: column of the clan table. Their columns are only
+#read when the sheet has the header.
+clanStockGoods = {"HORSES": "horses", "CATTLE": "cattle", "GOATS": "goats", "SLAVES": "slaves", "WAGONS": "wagons",
+                  "SILVER": "silver", "FOOD": "food", "IRON": "iron", "WOOD": "wood"}
+
+#TN3 sheets have a clan column in front of the unit on the Clan, activity and movement sheets
+def orderSheetLayout(unitCol, upperActivities):
+    return {
+        "clan": ("Clan", {
+            "unit": (unitCol, ("UNIT", "TRIBE")),
+            "warriors": (unitCol + 2, ("WARRIORS",)),
+            "actives": (unitCol + 3, ("ACTIVES",)),
+            "inactives": (unitCol + 4, ("INACTIVES",)),
+            **{column: (None, (good,)) for good, column in clanStockGoods.items()},
+        }, False),
+        "activities": ("Tribes_Activities", {
+            "unit": (unitCol, ("TRIBE", "UNIT")),
+            "activity": (unitCol + 1, ("ACTIVITY",)),
+            "item": (unitCol + 2, ("ITEM",)),
+            "distinction": (unitCol + 3, ("DISTINCTION",)),
+            "people": (unitCol + 4, ("PEOPLE", "WORKERS")),
+            "slaves": (unitCol + 5, ("SLAVES",)),
+            "specialists": (unitCol + 6, ("SPECIALISTS",)),
+        }, False),
+        "movement": ("Tribe_Movement", {
+            "unit": (unitCol, ("TRIBE", "UNIT")),
+        }, False),
+        "scouting": ("Scout_Movement", {
+            "unit": (unitCol, ("TRIBE", "UNIT")),
+            "scouts": (unitCol + 1, ("SCOUTS",)),
+            "mission": (unitCol + 2, ()),
+            "missionMore": (unitCol + 3, ()),
+        }, False),
+        "skills": ("Skill_Attempts", {
+            "unit": (1, ("TRIBE", "UNIT")),
+            "order": (2, ("ORDER", "PRIORITY")),
+            "topic": (3, ("TOPIC", "SKILL")),
+        }, False),
+        "research": ("Research_Attempts", {
+            "unit": (1, ("TRIBE", "UNIT")),
+        }, False),
+        "transfers": ("Transfers", {
+            "fromUnit": (1, ("FROM",)),
+            "toUnit": (2, ("TO",)),
+            "item": (3, ("ITEM", "GOODS")),
+            "quantity": (4, ("QUANTITY", "AMOUNT")),
+        }, False),
+        "validUnits": ("Valid Units", {
+            "unit": (1, ("UNIT", "UNITS")),
+        }, False),
+        "validActivities": ("Valid Activity", {
+            "activity": (1, ("ACTIVITY",)),
+            "item": (2, ("ITEM",)),
+            "distinction": (3, ("DISTINCTION",)),
+        }, upperActivities),
+        "validGoods": ("Valid Goods", {
+            "good": (1, ("GOODS", "GOOD", "ITEM")),
+        }, False),
+    }
+
+sheetLayouts = {
+    "TN3": orderSheetLayout(2, False),
+    "TN3.1": orderSheetLayout(1, True),
+}
+
+#Order sheet versions (Instructions!B1) and the game they belong to
+sheetVersions = {"1.12": "TN3.1", "1.13": "TN3"}
+
+#Worksheets read for a game version
+def layoutSheets(gameVersion):
+    return [sheetName for sheetName, columns, upper in sheetLayouts[gameVersion].values()]
+
+#Raised when an order sheet cannot be opened or is not a supported TN order sheet
+class OrdersFileError(Exception):
+    pass
+
+#Raised from a progress callback to stop a validation part way through
+class ValidationCancelled(Exception):
+    pass
+
 ## File access function.
-#read xlsx file and pull sheets we want read into global variables, close file
-def processOrdersXLSX(path):
-    
+#read xlsx file, read the tables for its game version into a dict, close file. Raises OrdersFileError.
+#The fast reader parses the sheet XML directly and reads the worksheets it can't handle with openpyxl, a workbook it
+#can't open at all is read with openpyxl throughout (fast=False, or TNVALIDATOR_READER=openpyxl when fast isn't
+#given, always uses openpyxl). With openpyxl readOnly streams each
+#sheet once (default), otherwise the workbook is fully loaded first.
+#sheets limits parsing to the named worksheets, tables to the named tables (the result then only has those tables).
+#With a ReferenceCache the reference sheets are loaded from it when their content key is cached. The keys are taken
+#from sheetKeys when given, otherwise only the reference sheets' keys are computed (by the reader).
+#progress is called as progress("sheet", sheetName) before each worksheet is read. Load and sheet timings are
+#recorded in diagnostics (a Diagnostics) when given.
+def processOrdersXLSX(path, readOnly=True, sheets=None, cache=None, sheetKeys=None, fast=None, progress=None, diagnostics=None, tables=None):
+
+    if fast is None:
+        fast = os.environ.get("TNVALIDATOR_READER", "fast") != "openpyxl"
+
+    if fast:
+        start = time.perf_counter()
+        try:
+            reader = FastOrdersReader(path)
+            if diagnostics is not None:
+                diagnostics.add("load", "fast reader", time.perf_counter() - start)
+            try:
+                return readOrders(reader, sheets, cache, sheetKeys, progress, diagnostics, tables)
+            finally:
+                reader.close()
+        except FastReaderUnsupported:
+            if diagnostics is not None:
+                diagnostics.add("load", "fast reader unsupported, reading with openpyxl", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    reader = OpenpyxlOrdersReader(path, readOnly)
+    if diagnostics is not None:
+        diagnostics.add("load", "openpyxl", time.perf_counter() - start)
     try:
-        orders = openpyxl.load_workbook(path)
-    except:
-        showerror("File Input Error", "Could not open file, may be open or in use.")
-        return None
+        return readOrders(reader, sheets, cache, sheetKeys, progress, diagnostics, tables)
+    finally:
+        reader.close()
+
+#Read the tables of the sheet's game version through a reader (FastOrdersReader or OpenpyxlOrdersReader) into
+#{"gameVersion": game version, table name: SheetTable}
+def readOrders(reader, sheets=None, cache=None, sheetKeys=None, progress=None, diagnostics=None, tables=None):
+    try:
+        sheetVersion = reader.sheetVersion()
+    except KeyError:
+        raise OrdersFileError("Selected file is not a valid TN Order sheet.")
+
+    if sheetVersion not in sheetVersions:
+        raise OrdersFileError("Unsupported Game Version")
+    gameVersion = sheetVersions[sheetVersion]
 
-    global clanSheet
-    global activitySheet
-    global moveSheet
-    global scoutSheet
-    global skillSheet
-    global researchSheet
-    global transferSheet
-    global vgSheet
-    global vuSheet
-    global vaSheet
-    
     #pull all sheets we are interested in
+    orderData = {"gameVersion": gameVersion}
     try:
-        clanSheet = orders["Clan"]
-        activitySheet = orders["Tribes_Activities"]
-        moveSheet = orders["Tribe_Movement"]
-        scoutSheet = orders["Scout_Movement"]
-        skillSheet = orders["Skill_Attempts"]
-        researchSheet = orders["Research_Attempts"]
-        transferSheet = orders["Transfers"]
-        vgSheet = orders["Valid Goods"]
-        vuSheet = orders["Valid Units"]
-        vaSheet = orders["Valid Activity"]
-        sheetVersion = str(orders["Instructions"].cell(1,2).value) 
-    except:
-        showerror("File Input Error", "Selected file is not a valid TN Order sheet.")
-        return None
+        for tableName, (sheetName, columns, upper) in sheetLayouts[gameVersion].items():
+            if sheets is not None and sheetName not in sheets:
+                continue
+            if tables is not None and tableName not in tables:
+                continue
+            if progress is not None:
+                progress("sheet", sheetName)
+            start = time.perf_counter()
+            cacheable = cache is not None and sheetName in referenceSheets
+            if cacheable:
+                key = sheetKeys[sheetName] if sheetKeys is not None and sheetName in sheetKeys else reader.contentKey(sheetName)
+                cached = cache.get(key, gameVersion, (columns, upper))
+                if cached is not None:
+                    orderData[tableName] = SheetTable.fromData(cached)
+                    if diagnostics is not None:
+                        diagnostics.add("sheet", sheetName + " (cached)", time.perf_counter() - start, 0)
+                    continue
+            orderData[tableName] = reader.readTable(sheetName, columns, upper)
+            if diagnostics is not None:
+                #worksheets the fast reader handed to openpyxl are marked
+                if sheetName in getattr(reader, "openpyxlSheets", ()):
+                    diagnostics.add("sheet", sheetName + " (openpyxl)", time.perf_counter() - start, reader.rowsScanned)
+                else:
+                    diagnostics.add("sheet", sheetName, time.perf_counter() - start, reader.rowsScanned)
+            if cacheable:
+                cache.put(key, gameVersion, (columns, upper), orderData[tableName].asData())
+    except KeyError:
+        raise OrdersFileError("Selected file is not a valid TN Order sheet.")
 
-    if sheetVersion == "1.12":
-        gameVersion = "TN3.1"
-    elif sheetVersion == "1.13":
-        gameVersion = "TN3"
-    else:
-        showerror("File Input Error", "Unsupported Game Version")
-        gameVersion = None
+    return orderData
 
+#Reads order sheets with openpyxl (imported on first use, it is slow to import). openpyxl only gives the values saved
+#with formulas, sheets with formulas saved without one are also read with their formulas (a second, formula
+#workbook), which are evaluated like the fast reader's (see Formula evaluation).
+class OpenpyxlOrdersReader:
 
-    orders.close()
- 
-    return gameVersion
+    def __init__(self, path, readOnly=True):
+        self.path = path
+        self.readOnly = readOnly
+        #sheet name: content key
+        self.sheetKeys = {}
+        #the workbook with formulas, its worksheets with formulas saved without a value and the FormulaEvaluator,
+        #set up when a sheet with such a formula is read
+        self.formulaBook = None
+        self.pendingSheets = None
+        self.formulas = None
+        try:
+            import openpyxl
+        except ImportError:
+            raise OrdersFileError("This order sheet needs openpyxl to be read, please install it.")
+        try:
+            self.orders = openpyxl.load_workbook(path, read_only=readOnly, data_only=True)
+        except:
+            raise OrdersFileError("Could not open file, may be open or in use.")
+        self.members = self.orders.sheetnames
+        self.date1904 = self.orders.epoch == excelEpoch1904
 
-#main loop called when an order sheet is selected
-def select_file():
+    def close(self):
+        self.orders.close()
+        if self.formulaBook is not None:
+            self.formulaBook.close()
 
-    filetypes = [('TN3 XLSX Turnsheet', '*.xlsx')]
-    
-    #For when XLS support is added
-    #filetypes = (
-    #   ('TN3 XLSX Turnsheet', '*.xlsx'),
-    #    ('TN3 XLS Turnsheet', '*.xls')
-    #)
+    #True if a worksheet has formula cells saved without a value
+    def hasPendingFormulas(self, sheetName):
+        if self.pendingSheets is None:
+            try:
+                self.pendingSheets = pendingFormulaSheets(self.path)
+            except OrdersFileError:
+                self.pendingSheets = set()
+        return sheetName in self.pendingSheets
 
-    ordersPath = fd.askopenfilename(
-        title='Select TN3 Order File',
-        filetypes=filetypes)
-    
-    #If no file is selected, bug out
-    if ordersPath == "":
-        return None
-    
-    path = pathlib.Path(ordersPath)
+    #(row number, values) of the rows of the sheet from minRow on like FastOrdersReader.rows, formulas saved without
+    #a value are PendingFormulas
+    def rows(self, sheetName, maxCol, minRow=2, maxRow=None, dates=True):
+        activeSheet = self.orders[sheetName]
+        #Dimensions recorded in the file are often inflated by formatting, read to the last row actually stored instead
+        if hasattr(activeSheet, "reset_dimensions"):
+            activeSheet.reset_dimensions()
+        rows = activeSheet.iter_rows(min_row=minRow, max_row=maxRow, max_col=maxCol, values_only=True)
+        if not self.hasPendingFormulas(sheetName):
+            for rowNumber, values in enumerate(rows, minRow):
+                yield rowNumber, list(values) if dates else [excelSerial(value, self.date1904) for value in values]
+            return
+        if self.formulaBook is None:
+            import openpyxl
+            self.formulaBook = openpyxl.load_workbook(self.path, read_only=True, data_only=False)
+        formulaSheet = self.formulaBook[sheetName]
+        if hasattr(formulaSheet, "reset_dimensions"):
+            formulaSheet.reset_dimensions()
+        formulaRows = formulaSheet.iter_rows(min_row=minRow, max_row=maxRow, max_col=maxCol, values_only=True)
+        for rowNumber, (values, formulas) in enumerate(itertools.zip_longest(rows, formulaRows, fillvalue=()), minRow):
+            values = list(values) if dates else [excelSerial(value, self.date1904) for value in values]
+            for col, formula in enumerate(formulas):
+                if isinstance(formula, str) and formula.startswith("=") and (col >= len(values) or values[col] is None):
+                    values.extend([None] * (col + 1 - len(values)))
+                    values[col] = PendingFormula(formula[1:])
+            yield rowNumber, values
 
-    #destroy any existing frame if this is a second run
-    for widget in root.winfo_children():
-        if isinstance(widget, tk.Frame):
-            widget.destroy()
-            root.geometry('600x200')
-            root.update()
-    
-    #process file, load data into globals, return game version
-    if path.suffix == ".xlsx":
-        gameVersion = processOrdersXLSX(path)
+    #rows with the formulas saved without a value evaluated
+    def resolvedRows(self, sheetName, rows):
+        for rowNumber, values in rows:
+            for col, value in enumerate(values, 1):
+                if isinstance(value, PendingFormula):
+                    if self.formulas is None:
+                        self.formulas = FormulaEvaluator(self)
+                    values[col-1] = self.formulas.cell(sheetName, rowNumber, col)
+            yield rowNumber, values
 
-    #processOrdersXLSX will return None if the file cannot be opened or was invalid. Bail out.
-    if gameVersion == None:
-        return None
+    #Instructions!B1, raises KeyError if there is no Instructions sheet
+    def sheetVersion(self):
+        for rowNumber, values in self.resolvedRows("Instructions", self.rows("Instructions", 2, minRow=1, maxRow=1)):
+            return str(values[1] if len(values) > 1 else None)
+        return str(None)
 
-    #build results window
+    #Content key of a worksheet (see sheetContentKey), raises KeyError if the sheet is missing. The keys of all the
+    #reference sheets are worked out together on first use, opening the file and its shared strings once.
+    def contentKey(self, sheetName):
+        if sheetName not in self.sheetKeys:
+            self.sheetKeys.update(orderSheetKeys(self.path, set(referenceSheets) | {sheetName}))
+        return self.sheetKeys[sheetName]
 
-    results = tk.Frame(root)
-    results.pack(fill = "both", expand = True)
+    #SheetTable of a worksheet (see sheetLayouts for columns and upper), raises KeyError if the sheet is missing
+    def readTable(self, sheetName, columns, upper=False):
+        header = ()
+        for rowNumber, values in self.resolvedRows(sheetName, self.rows(sheetName, None, minRow=1, maxRow=1)):
+            header = values
+        colNumbers = tableColumns(header, columns)
+        self.rowsScanned = 0
+        rows = self.resolvedRows(sheetName, self.rows(sheetName, lastColumn(colNumbers)))
+        return buildTable(countRows(self, rows), colNumbers, upper)
 
-    style = ttk.Style()
-    style.configure("Treeview", font=("Arial", fontsize), rowheight=int(fontsize*2.2))
-    
-    treeview = ttk.Treeview(results, show="tree")
-    treeview.column("#0", width=550, stretch=True)
-    treescroll=ttk.Scrollbar(results, orient="vertical", command=treeview.yview)
-    treeview.configure(yscrollcommand=treescroll.set)
-    treeview.tag_configure("error", foreground="red")
-    treeview.tag_configure("warning", foreground="orange")
-    treeview.tag_configure("pass", foreground="blue")
-    treeview.tag_configure("old", font=("Arial", 12))
-    root.geometry('600x750')
-    titleMessage= "Validating File: " + path.name
-    tk.Label(results, text=titleMessage, font=("Arial", 12, "bold")).pack()
+## Workbook structure.
+# An xlsx file is a zip with one XML member per worksheet. These helpers find the members without openpyxl so a
+# changed sheet can be detected by hashing its member.
 
-    #Create lists based on game
-    
-    if gameVersion == "TN3":
-        clanUnitList = parseCols(clanSheet,2,1)
-        activityUnitList = parseCols(activitySheet,2,1)
-        movementUnitList = parseCols(moveSheet,2,1)
-        scoutUnitList = parseCols(scoutSheet,2,1)
-        skillUnitList = parseCols(skillSheet,1,1)
-        researchUnitList = parseCols(researchSheet,1,1)
-        validUnits = parseCols(vuSheet,1,1)
-        skillAttemptsFull = parseCols(skillSheet,1,3)
-        clanActivities = parseCols(activitySheet,2,7)
-        validActivities = parseCols(vaSheet,1,3)
-        clanTransfers = parseCols(transferSheet,1,5)
-        validGoods = parseCols(vgSheet,1,1)
-        clanUnits = parseCols(clanSheet,2,14)
-        clanScouting = parseCols(scoutSheet,2,4)
-
-    if gameVersion == "TN3.1":
-        clanUnitList = parseCols(clanSheet,1,1)
-        activityUnitList = parseCols(activitySheet,1,1)
-        movementUnitList = parseCols(moveSheet,1,1)
-        scoutUnitList = parseCols(scoutSheet,1,1)
-        skillUnitList = parseCols(skillSheet,1,1)
-        researchUnitList = parseCols(researchSheet,1,1)
-        validUnits = parseCols(vuSheet,1,1)
-        skillAttemptsFull = parseCols(skillSheet,1,3)
-        clanActivities = parseCols(activitySheet,1,7)
-        validActivities = parseColsUpper(vaSheet,1,3)
-        clanTransfers = parseCols(transferSheet,1,5)
-        validGoods = parseCols(vgSheet,1,1)
-        clanUnits = parseCols(clanSheet,1,14)
-        clanScouting = parseCols(scoutSheet,1,4)
-        
-    #Separate GM and Clan units from Valid Units
-    clanNumber = str(clanUnitList[0][1:4])
-    validClanUnits = []
-    validGMUnits = []
-    for i in range(len(validUnits)):
-        if validUnits[i][1:4] == clanNumber:
-            validClanUnits.append(validUnits[i])
-        else:
-            validGMUnits.append(validUnits[i])
-        
-    tk.Label(results, text=gameVersion + " Orders for Clan " + clanNumber, font=("Arial", 12, "bold")).pack()
+mainNS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+relNS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+packageRelNS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
 
-    treeview.pack(side="left", fill="both", expand=True)
-    treescroll.pack(side="left",fill="y")
+#Resolve a relationship target relative to the member that owns the relationship
+def relTarget(owner, target):
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(owner), target))
 
-    #Select Tribe units from Valid Clan Units
-    validClanTribes = []
-    for i in range(len(validClanUnits)):
-        if len(validClanUnits[i]) == 4:
-            validClanTribes.append(validClanUnits[i])
-    
-    #Display Valid Units
-    vuRoot = treeview.insert("",0,text="Valid Units")
-    cuRoot = treeview.insert(vuRoot,tk.END,text="Valid Clan Units")
-    for i in range(len(validClanUnits)):
-        treeview.insert(cuRoot,tk.END,text=str(validClanUnits[i]))
-    vtRoot = treeview.insert(vuRoot,tk.END,text="Valid Clan Tribes" )
-    for i in range(len(validClanTribes)):
-        treeview.insert(vtRoot,tk.END,text=str(validClanTribes[i]))
-    guRoot = treeview.insert(vuRoot,tk.END,text="Valid GM Units")
-    for i in range(len(validGMUnits)):
-        treeview.insert(guRoot,tk.END,text=str(validGMUnits[i]))
-
-    #create organizational root
-    actRoot = treeview.insert("",tk.END,text="Activity Orders")
-    xfrRoot = treeview.insert("",tk.END,text="Transfer Orders")
-    movRoot = treeview.insert("",tk.END,text="Movement and Scouting Orders")
-    lrnRoot = treeview.insert("",tk.END,text="Skill and Research Orders")
-    
-    ### Movement and Scouting Tests
-    
-    #Check for Invalid Units Assigned Movement Orders 
-    errRoot = treeview.insert(movRoot,tk.END,text="Movement Unit Errors", open=True)
-    vErrors = checkValidList(movementUnitList, validClanUnits)
+#Relationship id: zip member, from the .rels part of a member
+def readRels(archive, owner):
+    relsName = posixpath.join(posixpath.dirname(owner), "_rels", posixpath.basename(owner) + ".rels")
+    rels = {}
+    try:
+        root = ET.fromstring(archive.read(relsName))
+    except KeyError:
+        return rels
+    for rel in root.iter(packageRelNS + "Relationship"):
+        rels[rel.get("Id")] = (rel.get("Type"), relTarget(owner, rel.get("Target")))
+    return rels
 
-    if len(vErrors) == 0:
-        treeview.insert(errRoot,tk.END,text="No Invalid Units Assigned Movement Orders", tags="pass")
-    else:
-        treeview.item(movRoot, tags="error")
-        treeview.item(errRoot, tags="error")
-        for i in range(len(vErrors)):
-            errorText = "Invalid Unit " + str(vErrors[i][1]) + " assigned movement order on Row " + str(vErrors[i][0])
-            treeview.insert(errRoot,tk.END,text=errorText)
-
-    #Check for Invalid Units Assigned Scouting Orders
-    errRoot = treeview.insert(movRoot,tk.END,text="Scouting Unit Errors", open=True)
-    vErrors = checkValidList(scoutUnitList, validClanUnits)
-    if len(vErrors) == 0:
-        treeview.insert(errRoot, tk.END, text="No Invalid Units Assigned Scouting Orders", tags="pass")
-    else:
-        treeview.item(movRoot, tags="error")
-        treeview.item(errRoot, tags="error")
-        for i in range(len(vErrors)):
-            errorText = "Invalid Unit " + str(vErrors[i][1]) + " assigned scouting order on Row " + str(vErrors[i][0])
-            treeview.insert(errRoot, tk.END, text=errorText)
-
-    #Check for scouting missions assigned to unit that was empty at turn start (likely absorbed or disbanded)
-    errRoot = treeview.insert(movRoot, tk.END, text="Empty Unit Scouting Errors", open=True)
-    vErrors = []
-    emptyUnits = []
-    for i in range(len(clanUnits)):
-        if clanUnits[i][0] is not None:
-            unitPopulation = int(clanUnits[i][2]) + int(clanUnits[i][3]) + int(clanUnits[i][3])
-            if unitPopulation == 0:
-                emptyUnits.append(str(clanUnits[i][0]).upper())
-    assignedScouts = []
-    for i in range(len(clanScouting)):
-        if any(x is not None for x in clanScouting[i][1:4]):
-            assignedScouts.append(str(clanScouting[i][0]).upper())  
-    
-    for i in range(len(assignedScouts)):
-        if assignedScouts[i] in emptyUnits:
-            errorData = (i+2, clanScouting[i][0])
-            vErrors.append(errorData)
-    
-    if len(vErrors) == 0:
-        treeview.insert(errRoot, tk.END, text="No Scouting Missions Assigned to Empty Units", tags="pass")
+#Zip member of the workbook part
+def workbookMember(archive):
+    for relType, target in readRels(archive, "").values():
+        if relType.endswith("/officeDocument"):
+            return target
+    return "xl/workbook.xml"
 
-    else:
-        treeview.item(movRoot, tags="error")
-        treeview.item(errRoot, tags="error")
-        for i in range(len(vErrors)):
-            errorText = "Likely Error: Unit " + str(vErrors[i][1]) + " was empty at turn start and is assigned a scouting mission on row " + str(vErrors[i][0])
-            treeview.insert(errRoot, tk.END, text=errorText)
-
-   # Check for Scouting Missions that exceed available warriors post-transfer
-    ## This needs to be finished
-    errRoot = treeview.insert(movRoot, tk.END, text="Inufficient Warriors Scouting Errors", open=True)
-    vErrors = {}
+#Worksheet name: zip member, in workbook order
+def worksheetMembers(archive):
+    workbook = workbookMember(archive)
+    rels = readRels(archive, workbook)
+    members = {}
+    for sheet in ET.fromstring(archive.read(workbook)).iter(mainNS + "sheet"):
+        rel = rels.get(sheet.get(relNS + "id"))
+        if rel is not None:
+            members[sheet.get("name")] = rel[1]
+    return members
 
-    #create dict of how many warriors are in each clan unit post transfer
-    unitWarriors = {}
-    for i in range(len(clanUnits)):
-        if clanUnits[i][0] is not None:
-            currentUnit = str(clanUnits[i][0])
-            unitWarriorsCount = int(clanUnits[i][2])
-            for j in range(len(clanTransfers)):
-                if str(clanTransfers[j][0]).upper() == currentUnit.upper() and str(clanTransfers[j][2]).upper() == "WARRIORS":
-                    unitWarriorsCount -= int(clanTransfers[j][3])
-                elif str(clanTransfers[j][1]).upper() == currentUnit.upper() and str(clanTransfers[j][2]).upper() == "WARRIORS":
-                    unitWarriorsCount += int(clanTransfers[j][3])
-            unitWarriors[currentUnit] = unitWarriorsCount
+#Shared string table, or None if the workbook has none
+def readSharedStrings(archive):
+    workbook = workbookMember(archive)
+    for relType, target in readRels(archive, workbook).values():
+        if relType.endswith("/sharedStrings"):
+            strings = []
+            with archive.open(target) as source:
+                for event, elem in ET.iterparse(source):
+                    if elem.tag == mainNS + "si":
+                        strings.append("".join(t.text or "" for t in elem.iter(mainNS + "t")))
+                        elem.clear()
+            return strings
+    return None
 
-    ## How do we do newly created units?
-    # for i in validUnits, if not in unitWarriors, set Count to 0 and run transfer check? Should I do this to build unitWarriors then loop
-    # through it and only eval transfers once? Or do I care?
+cellPattern = re.compile(rb'<c\s([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+cellAttrPattern = re.compile(rb'\b(r|t)="([^"]*)"')
+cellValuePattern = re.compile(rb'<v>(.*?)</v>', re.S)
 
+#Content key of a worksheet's XML: hash of every cell's reference, type and contents with shared string indices
+#resolved, so the key doesn't depend on styles or on where the strings landed in this workbook's string table.
+def sheetContentKey(data, sharedStrings):
+    digest = hashlib.blake2b(digest_size=16)
+    cells = 0
+    for match in cellPattern.finditer(data):
+        contents = match.group(2)
+        if not contents:
+            continue
+        cells += 1
+        attrs = dict(cellAttrPattern.findall(match.group(1)))
+        if attrs.get(b"t") == b"s" and sharedStrings is not None:
+            value = cellValuePattern.search(contents)
+            contents = sharedStrings[int(value.group(1))].encode("utf-8")
+        digest.update(attrs.get(b"r", b"") + b"\t" + attrs.get(b"t", b"") + b"\t" + contents + b"\n")
 
-    scoutingUnits = {}
-    for i in range(len(clanScouting)):
-        if clanScouting[i][1] is not None:
-            currentUnit = clanScouting[i][0]    
-            if currentUnit in scoutingUnits:
-                scoutingUnits[currentUnit] += clanScouting[i][1]
-            else:
-                scoutingUnits[currentUnit] = clanScouting[i][1]
-        
-    for key, value in scoutingUnits.items():
-        if key in unitWarriors:
-            if value > unitWarriors[key]:
-                vErrors[key] = value
-        
+    #cells written in a form the pattern doesn't know (e.g. prefixed tags), fall back to the raw XML
+    if cells == 0:
+        digest.update(data)
+        if sharedStrings is not None:
+            digest.update("\0".join(sharedStrings).encode("utf-8"))
+    return digest.hexdigest()
 
-    ### Skill and Research Tests
+#Worksheets of an order sheet with formula cells saved without a value. Raises OrdersFileError.
+def pendingFormulaSheets(path):
+    try:
+        with zipfile.ZipFile(path) as archive:
+            sheets = set()
+            for sheetName, member in worksheetMembers(archive).items():
+                for match in cellPattern.finditer(archive.read(member)):
+                    contents = match.group(2)
+                    if contents and b"<f" in contents:
+                        value = cellValuePattern.search(contents)
+                        if value is None or not value.group(1):
+                            sheets.add(sheetName)
+                            break
+            return sheets
+    except (OSError, zipfile.BadZipFile, KeyError, ValueError, ET.ParseError):
+        raise OrdersFileError("Could not open file, may be open or in use.")
 
-    #Check for Invalid Units Assigned Skill Attempts
-    errRoot = treeview.insert(lrnRoot,tk.END,text="Skill Attempt Unit Errors", open=True)
-    vErrors = checkValidList(skillUnitList, validClanTribes)
-    if len(vErrors) == 0:
-        treeview.insert(errRoot, tk.END, text="No Invalid Units Assigned Skill Attempts", tags="pass")
-    else:
-        treeview.item(lrnRoot, tags="error")
-        treeview.item(errRoot, tags="error")
-        for i in range(len(vErrors)):
-            errorText = "Invalid Unit " + str(vErrors[i][1]) + " assigned skill attempt on Row " + str(vErrors[i][0])
-            treeview.insert(errRoot, tk.END, text=errorText)
-
-    #check for Tribes assigned more than three skill attempts
-    errRoot = treeview.insert(lrnRoot,tk.END,text="Tribes Assigned Excess Skill Attempts Errors", open=True)
-    skillAttemptTrack = {}
-    vErrors = {}
-    for i in skillUnitList:
-        if i in skillAttemptTrack:
-            skillAttemptTrack[i] += 1
-        else:
-            skillAttemptTrack[i] = 1
+#Content keys of the worksheets of an order sheet (all of them, or those in sheetNames it has): name: key.
+#Raises OrdersFileError.
+def orderSheetKeys(path, sheetNames=None):
+    try:
+        with zipfile.ZipFile(path) as archive:
+            sharedStrings = readSharedStrings(archive)
+            keys = {}
+            for sheetName, member in worksheetMembers(archive).items():
+                if sheetNames is None or sheetName in sheetNames:
+                    keys[sheetName] = sheetContentKey(archive.read(member), sharedStrings)
+            return keys
+    except (OSError, zipfile.BadZipFile, KeyError, IndexError, ValueError, AttributeError, ET.ParseError):
+        raise OrdersFileError("Could not open file, may be open or in use.")
 
-    for key, value in skillAttemptTrack.items():
-        if value > 3:
-            vErrors[key] = value
+## Fast XLSX reader.
+# Reads cell values straight from the worksheet XML: sheet names are resolved through workbook.xml and its rels, the
+# shared strings are loaded once and each needed sheet is iterparsed once, keeping only the requested columns.
+# Values come out the way openpyxl (read-only, data only) gives them: date formatted numbers as dates, formula cells
+# as the value saved with them, and formulas saved without one are evaluated (see Formula evaluation). A worksheet
+# with anything this reader doesn't handle (unusual cell types, a formula it can't place) raises
+# FastReaderUnsupported while it is read and that worksheet is read with openpyxl instead, the others still with this
+# reader. Only a workbook whose packaging it can't follow is read with openpyxl throughout (see processOrdersXLSX).
 
-    if len(vErrors) == 0:
-        treeview.insert(errRoot, tk.END, text="No Tribe Assigned More Than Three Skill Attempts", tags="pass")
-    else:
-        treeview.item(lrnRoot, tags="error")
-        treeview.item(errRoot, tags="error")
-        for key, value in vErrors.items():
-            errorText = "Tribe " + str(key) + " assigned " + str(value) + " skill attempts"
-            treeview.insert(errRoot, tk.END, text=errorText)
-    
-    #check for duplicate Tribe/Skill attempts
-    errRoot = treeview.insert(lrnRoot,tk.END,text="Duplicate Tribe/Skill Attempts Errors", open=True)
-    skillAttemptTrack = []
-    vErrors = []
-    for i in range(len(skillAttemptsFull)):
-        checkAttempt = [skillAttemptsFull[i][0], str(skillAttemptsFull[i][2]).upper()]
-        if checkAttempt in skillAttemptTrack:
-            vErrors.append(checkAttempt)
-        else:
-            skillAttemptTrack.append(checkAttempt)
-    if len(vErrors) == 0:
-        treeview.insert(errRoot, tk.END, text="No Tribe Attempting Duplicate Skills", tags="pass")
-    else:
-        treeview.item(lrnRoot, tags="error")
-        treeview.item(errRoot, tags="error")
-        for i in range(len(vErrors)):
-            errorText = "Tribe " + str(vErrors[i][0]) + " duplicate attempts for skill " + str(vErrors[i][1]) 
-            treeview.insert(errRoot, tk.END, text=errorText)
-
-    #check for skill attempts with same priority for Tribe
-    errRoot = treeview.insert(lrnRoot,tk.END,text="Duplicate Skill Attempt Priority Errors", open=True)
-    skillAttemptTrack = []
-    vErrors = []
-    for i in range(len(skillAttemptsFull)):
-        checkAttempt = [skillAttemptsFull[i][0], skillAttemptsFull[i][1]]
-        if checkAttempt in skillAttemptTrack:
-            vErrors.append(checkAttempt)
-        else:
-            skillAttemptTrack.append(checkAttempt)
-    if len(vErrors) == 0:
-        treeview.insert(errRoot, tk.END, text="No Tribe Attempting Skills At Same Priority", tags="pass")
-    else:
-        treeview.item(lrnRoot, tags="error")
-        treeview.item(errRoot, tags="error")
-        for i in range(len(vErrors)):
-            errorText = "Tribe " + str(vErrors[i][0]) + " attempting multiple skills at priority " + str(vErrors[i][1]) 
-            treeview.insert(errRoot, tk.END, text=errorText)
-        
-    #Check for Invalid Units Assigned Research Attempts
-    errRoot = treeview.insert(lrnRoot,tk.END,text="Research Attempt Unit Errors", open=True)
-    vErrors = checkValidList(researchUnitList, validClanTribes)
+class FastReaderUnsupported(Exception):
+    pass
 
-    if len(vErrors) == 0:
-        treeview.insert(errRoot, tk.END, text="No Invalid Units Assigned Research Attempts", tags="pass")
-    else:
-        treeview.item(lrnRoot, tags="error")
-        treeview.item(errRoot, tags="error")
-        for i in range(len(vErrors)):
-            errorText = "Invalid Unit " + str(vErrors[i][1]) + " assigned research attempt on Row " + str(vErrors[i][0])
-            treeview.insert(errRoot, tk.END, text=errorText)
-
-    ### Activity Tests
-    #Check for Invalid Units Assigned Activities
-    actUnitRoot = treeview.insert(actRoot,tk.END,text="Activity Orders Unit Issue", open=True)
-    
-    #Check clan tab first because new units ordinariliy should not perform activities. If unit is on valid list, give warning (converted unit, scouting orders). If not on valid list, give error.
-    errRoot = treeview.insert(actUnitRoot,tk.END,text="Invalid Unit Assigned Activity [Error]", open=True)
-    warnRoot = treeview.insert(actUnitRoot,tk.END,text="New Unit Assigned Activity [Warning/Informational]", open=True)
-    vErrors = checkValidList(activityUnitList, clanUnitList)
-    errCount = 0
-    warnCount = 0
-
-    if len(vErrors) != 0:
-        for i in range(len(vErrors)):
-            if vErrors[i][1] in validClanUnits:
-                warnCount += 1
-                errorText = "New Unit " + str(vErrors[i][1]) + " assigned activity order on Row " + str(vErrors[i][0])
-                treeview.insert(warnRoot, tk.END, text=errorText)
-            else:
-                errCount += 1
-                errorText = "Invalid Unit " + str(vErrors[i][1]) + " assigned activity order on Row " + str(vErrors[i][0])
-                treeview.insert(errRoot, tk.END, text=errorText)
-    if errCount == 0:
-        treeview.insert(errRoot, tk.END, text="No Invalid Units Assigned Activity Orders", tags="pass")
-    else:
-        treeview.item(actRoot, tags="error")
-        treeview.item(errRoot, tags="error")
-    if warnCount == 0:
-        treeview.insert(warnRoot, tk.END, text="No New Units Assigned Activity Orders", tags="pass")
-    else:
-        if treeview.item(actRoot, option="tags") != ("error",):
-            treeview.item(actRoot, tags="warning")
-        treeview.item(warnRoot, tags="warning")
-   
-    #Check for invalid Activities
-    errRoot = treeview.insert(actRoot,tk.END, text="Activity Orders Item/Distinction Errors", open=True)
-    vErrors = []
+formulaTag = mainNS + "f"
 
-    for i in range(len(clanActivities)):
-        casedActivity = [str(clanActivities[i][1]).upper(), str(clanActivities[i][2]).upper(), str(clanActivities[i][3]).upper()]
-        
-        if casedActivity not in validActivities:     
-            errorData = [i+2, clanActivities[i][1], clanActivities[i][2], clanActivities[i][3]]
-            vErrors.append(errorData)
+#Built in number formats that are dates/times: number format id: elapsed time ([h]:mm:ss)
+dateFormatIds = {**{i: False for i in range(14, 23)}, 45: False, 46: True, 47: False}
+dateFormatPattern = re.compile(r"(?<![_\\])[dmyhs]", re.I)
+elapsedFormatPattern = re.compile(r"\[hh?\](:mm(:ss(\.0*)?)?)?|\[mm?\](:ss(\.0*)?)?|\[ss?\](\.0*)?", re.I)
 
-    if len(vErrors) == 0:
-        treeview.insert(errRoot, tk.END, text="No Activity Item/Distinction Errors Found", tags="pass")
-    else:
-        treeview.item(actRoot, tags="error")
-        treeview.item(errRoot, tags="error")
-        for i in range(len(vErrors)):
-            errorText = "Invalid Item/Distinction on Row " + str(vErrors[i][0]) + ", Activity " + str(vErrors[i][1]) + ": " + str(vErrors[i][2]) + " / " + str(vErrors[i][3])
-            treeview.insert(errRoot, tk.END, text=errorText)
+#Cell formats (cellXfs) that display numbers as dates: {format index: elapsed time}. A format code is a date when
+#its first section has a date/time code outside quoted text and [colors/conditions], as openpyxl decides.
+def readDateStyles(archive):
+    workbook = workbookMember(archive)
+    for relType, target in readRels(archive, workbook).values():
+        if relType.endswith("/styles"):
+            root = ET.fromstring(archive.read(target))
+            dateFormats = dict(dateFormatIds)
+            numFmts = root.find(mainNS + "numFmts")
+            if numFmts is not None:
+                for numFmt in numFmts.iter(mainNS + "numFmt"):
+                    code = numFmt.get("formatCode", "").split(";")[0]
+                    if dateFormatPattern.search(re.sub(r'"[^"]*"|\[(?!hh?\]|mm?\]|ss?\])[^\]]*\]', "", code)):
+                        dateFormats[int(numFmt.get("numFmtId"))] = elapsedFormatPattern.search(code) is not None
+            dateStyles = {}
+            cellXfs = root.find(mainNS + "cellXfs")
+            if cellXfs is not None:
+                for i, xf in enumerate(cellXfs.iter(mainNS + "xf")):
+                    numFmtId = int(xf.get("numFmtId", 0))
+                    if numFmtId in dateFormats:
+                        dateStyles[i] = dateFormats[numFmtId]
+            return dateStyles
+    return {}
 
-    #check for Activity Discontinuity
-    errRoot = treeview.insert(actRoot,tk.END,text="Activity Order Discontinuity Errors", open=True)
+#True if the workbook counts dates from 1904 (old Mac Excel) rather than 1900
+def workbookDate1904(archive):
+    properties = ET.fromstring(archive.read(workbookMember(archive))).find(mainNS + "workbookPr")
+    return properties is not None and properties.get("date1904", "0").lower() in ("1", "true")
 
-    actAssignedUnits = []
-    vErrors = []
-    prevActUnit = None
+#Day 0 of the 1900 and 1904 date systems (1900 is counted with Excel's 29 February 1900)
+excelEpoch = datetime.datetime(1899, 12, 30)
+excelEpoch1904 = datetime.datetime(1904, 1, 1)
 
-    for i in range(len(activityUnitList)):
-        curUnit = activityUnitList[i]
-        if curUnit not in actAssignedUnits:
-            prevActUnit=curUnit
-            actAssignedUnits.append(curUnit)
-        
+#Value of a date formatted number as openpyxl gives it: a timedelta for elapsed time formats, a time for serials
+#under one day, otherwise a datetime. Raises OverflowError or ValueError for serials outside the dates Python has.
+def excelDate(serial, date1904=False, elapsed=False):
+    if elapsed:
+        days = datetime.timedelta(days=serial)
+        return datetime.timedelta(seconds=days.total_seconds() // 1, microseconds=round(days.microseconds, -3))
+    day, fraction = divmod(serial, 1)
+    time = datetime.timedelta(milliseconds=round(fraction * 86400000))
+    if 0 <= serial < 1 and time.days == 0:
+        return (datetime.datetime.min + time).time()
+    if date1904:
+        return excelEpoch1904 + datetime.timedelta(days=day) + time
+    #serials before the 1900 leap day Excel has but the calendar doesn't
+    if 0 < serial < 60:
+        day += 1
+    return excelEpoch + datetime.timedelta(days=day) + time
+
+#Serial number of a date/time value (as formulas compute with it), other values as they are
+def excelSerial(value, date1904=False):
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds() / 86400
+    if isinstance(value, datetime.time):
+        return (value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1e6) / 86400
+    if isinstance(value, datetime.date):
+        if not isinstance(value, datetime.datetime):
+            value = datetime.datetime.combine(value, datetime.time())
+        serial = (value - (excelEpoch1904 if date1904 else excelEpoch)).total_seconds() / 86400
+        if not date1904 and 0 < serial < 61:
+            serial -= 1
+        return int(serial) if serial.is_integer() else serial
+    return value
+
+#Column number of a cell reference such as "AB12"
+def columnIndex(ref):
+    col = 0
+    for ch in ref:
+        if "A" <= ch <= "Z":
+            col = col * 26 + ord(ch) - 64
         else:
-            if curUnit == prevActUnit:
-                actAssignedUnits.append(curUnit)
-            else:
-                prevActUnit=curUnit
-                actAssignedUnits.append(curUnit)
-                errorData = (i+2, curUnit)
-                vErrors.append(errorData)
-    
-    if len(vErrors) == 0:
-        treeview.insert(errRoot, tk.END, text="No Activity Order Discontinuity Detected", tags="pass")
-    else:
-        treeview.item(actRoot, tags="error")
-        treeview.item(errRoot, tags="error")
-        for i in range(len(vErrors)):
-            errorText = "Unit " + str(vErrors[i][1]) + " assigned non-contiguous activity order on Row " + str(vErrors[i][0])
-            treeview.insert(errRoot, tk.END, text=errorText)
-
-    #check for Activities assigned no workers
-    errRoot = treeview.insert(actRoot, tk.END, text="Activity Null Worker Errors", open=True)
-    vErrors = []
-    for i in range(len(clanActivities)):
+            break
+    return col
+
+#Number cell text as openpyxl casts it
+def castNumber(text):
+    if "." in text or "E" in text or "e" in text:
+        return float(text)
+    return int(text)
+
+class FastOrdersReader:
+
+    def __init__(self, path):
+        self.path = path
         try:
-            peopleCount = int(clanActivities[i][4])
-        except:
-            peopleCount = 0
+            self.archive = zipfile.ZipFile(path)
+        except (OSError, zipfile.BadZipFile):
+            raise OrdersFileError("Could not open file, may be open or in use.")
         try:
-            peopleCount += int(clanActivities[i][5])
-        except:
-            peopleCount += 0
+            self.members = worksheetMembers(self.archive)
+            self.sharedStrings = readSharedStrings(self.archive) or []
+            self.dateStyles = readDateStyles(self.archive)
+            self.date1904 = workbookDate1904(self.archive)
+            #FormulaEvaluator, made when a formula without a saved value is read
+            self.formulas = None
+        except (KeyError, ValueError, ET.ParseError):
+            self.archive.close()
+            raise FastReaderUnsupported()
+        #OpenpyxlOrdersReader for the worksheets this reader can't handle, opened for the first of them
+        self.fallback = None
+        #worksheets read with it
+        self.openpyxlSheets = []
+
+    def close(self):
+        self.archive.close()
+        if self.fallback is not None:
+            self.fallback.close()
+
+    #OpenpyxlOrdersReader to read a worksheet this reader couldn't with
+    def fallbackReader(self, sheetName):
+        if self.fallback is None:
+            self.fallback = OpenpyxlOrdersReader(self.path)
+        self.openpyxlSheets.append(sheetName)
+        return self.fallback
+
+    #Content key of a worksheet (see sheetContentKey), raises KeyError if the sheet is missing
+    def contentKey(self, sheetName):
+        return sheetContentKey(self.archive.read(self.members[sheetName]), self.sharedStrings or None)
+
+    #(row number, values) of the rows of the sheet from minRow on, values lists the first maxCol cells (every cell
+    #of the row if maxCol is None). Only rows stored in the file are returned, so formatting-inflated dimensions
+    #don't matter. Date formatted numbers are dates (see excelDate), or their serial numbers without dates.
+    #Raises KeyError if the sheet is missing.
+    def rows(self, sheetName, maxCol, minRow=2, maxRow=None, dates=True):
+        member = self.members[sheetName]
+        rowTag = mainNS + "row"
+        cellTag = mainNS + "c"
+        #shared formula id: (formula text, row, col) of the cell holding the text
+        shared = {}
         try:
-            peopleCount += int(clanActivities[i][6])
-        except:
-            peopleCount += 0
-    
-        if peopleCount <= 0:
-            errorData = (i+2, clanActivities[i][0], clanActivities[i][1])
-            vErrors.append(errorData)
-    
-    if len(vErrors) == 0:
-        treeview.insert(errRoot, tk.END, text = "No Activities With Fewer than 1 Worker Assigned", tags="pass")
-    else:
-        treeview.item(actRoot, tags="error")
-        treeview.item(errRoot, tags="error")
-        for i in range(len(vErrors)):
-            errorText = "Fewer than 1 Worker Assigned to Unit " + str(vErrors[i][1]).lower() + " Activity " + str(vErrors[i][2]) + " on Row " + str(vErrors[i][0])
-            treeview.insert(errRoot, tk.END, text=errorText)
-
-    #check for Activities assigned to Unit that was Empty at start of turn (likely absorbed our disbanded but persisting)
-    errRoot = treeview.insert(actRoot, tk.END, text="Empty Unit Activity Errors", open=True)
-    vErrors = []
-    emptyUnits = []
-    for i in range(len(clanUnits)):
-        if clanUnits[i][0] is not None:
-            unitPopulation = int(clanUnits[i][2]) + int(clanUnits[i][3]) + int(clanUnits[i][3])
-            if unitPopulation == 0:
-                emptyUnits.append(str(clanUnits[i][0]).upper())
-
-    for i in range(len(clanActivities)):
-        if str(clanActivities[i][0]).upper() in emptyUnits:
-            errorData = (i+2, clanActivities[i][0], clanActivities[i][1])
-            vErrors.append(errorData)
-    
-    if len(vErrors) == 0:
-        treeview.insert(errRoot, tk.END, text="No Activities Assigned to Empty Units", tags="pass")
+            with self.archive.open(member) as source:
+                rowNumber = 0
+                for event, elem in ET.iterparse(source):
+                    if elem.tag != rowTag:
+                        continue
+                    r = elem.get("r")
+                    rowNumber = int(r) if r else rowNumber + 1
+                    if maxRow is not None and rowNumber > maxRow:
+                        break
+                    if rowNumber >= minRow:
+                        values = [None] * (maxCol or 0)
+                        col = 0
+                        for cell in elem.iter(cellTag):
+                            ref = cell.get("r")
+                            col = columnIndex(ref) if ref else col + 1
+                            if maxCol is None:
+                                values.extend([None] * (col - len(values)))
+                            elif col > maxCol:
+                                continue
+                            values[col-1] = self.cellValue(cell, rowNumber, col, shared, dates)
+                        yield rowNumber, values
+                    else:
+                        #skipped rows can hold the formulas shared with the rows read
+                        for cell in elem.iter(cellTag):
+                            if cell.find(formulaTag) is not None:
+                                ref = cell.get("r")
+                                self.cellValue(cell, rowNumber, columnIndex(ref) if ref else 0, shared, dates)
+                    elem.clear()
+        except (KeyError, ValueError, IndexError, ET.ParseError, zipfile.BadZipFile):
+            raise FastReaderUnsupported()
 
-    else:
-        treeview.item(actRoot, tags="error")
-        treeview.item(errRoot, tags="error")
-        for i in range(len(vErrors)):
-            errorText = "Likely Error: Unit " + str(vErrors[i][1]) + " was empty at turn start and is assigned activity " + str(vErrors[i][2]) + " on row " + str(vErrors[i][0])
-            treeview.insert(errRoot, tk.END, text=errorText)
-           
-    #check for at least one Clan unit in each transfer
-    errRoot = treeview.insert(xfrRoot,tk.END,text="Invalid Transfer Unit Errors", open=True)
-    vErrors = []
-    for i in range (len(clanTransfers)):
-        match = None
-        for vi in validClanUnits:
-            if str(clanTransfers[i][0]).upper() == vi.upper():
-                match = clanTransfers[i][0]
-            if str(clanTransfers[i][1]).upper() == vi.upper():
-                match = clanTransfers[i][1]
-        
-        if match is None:
-            #add 2 for omitted title row and zero index conversion
-            vErrors.append(i+2)
-             
-    if len(vErrors) == 0:
-        treeview.insert(errRoot, tk.END, text="No Transfer Orders Without Clan Unit", tags="pass")
-    else:
-        treeview.item(xfrRoot, tags="error")
-        treeview.item(errRoot, tags="error")
-        for i in range(len(vErrors)):
-            errorText = "Transfer order on Row " + str(vErrors[i]) + " has no valid Clan unit"
-            treeview.insert(errRoot, tk.END, text=errorText)
-
-    #check for transfers from non-Clan/GM Units (not a valid transfer order, error)
-    errRoot = treeview.insert(xfrRoot,tk.END,text="Transfers From Non-Clan/GM Units [Error]", open=True)
-    vErrors = []
-    for i in range (len(clanTransfers)):
-        match = None
-        for vi in validUnits:
-            if str(clanTransfers[i][0]).upper() == vi.upper():
-                match = clanTransfers[i][0]
+    #Value of a cell element, a PendingFormula for a formula saved without its value
+    def cellValue(self, cell, rowNumber, col, shared, dates=True):
+        cellType = cell.get("t", "n")
+        formula = cell.find(formulaTag)
+        if formula is not None:
+            text = formula.text
+            if formula.get("t") == "shared":
+                if text is not None:
+                    shared[formula.get("si")] = (text, rowNumber, col)
+                elif formula.get("si") in shared:
+                    master, masterRow, masterCol = shared[formula.get("si")]
+                    text = shiftFormula(master, rowNumber - masterRow, col - masterCol)
+            value = cell.find(mainNS + "v")
+            if value is None or value.text is None:
+                if text is None:
+                    raise FastReaderUnsupported()
+                return PendingFormula(text)
+        if cellType == "inlineStr":
+            inline = cell.find(mainNS + "is")
+            if inline is None:
+                return None
+            return "".join(t.text or "" for t in inline.iter(mainNS + "t"))
+        value = cell.find(mainNS + "v")
+        if value is None or value.text is None:
+            return None
+        text = value.text
+        if cellType == "s":
+            return self.sharedStrings[int(text)]
+        if cellType == "n":
+            style = int(cell.get("s", 0))
+            if dates and style in self.dateStyles:
+                #serials outside the dates Python has are read as an error value, as openpyxl does
+                try:
+                    return excelDate(castNumber(text), self.date1904, self.dateStyles[style])
+                except (OverflowError, ValueError):
+                    return "#VALUE!"
+            return castNumber(text)
+        if cellType == "b":
+            return bool(int(text))
+        if cellType in ("str", "e"):
+            return text
+        raise FastReaderUnsupported()
 
-        if match is None:
-            errorData = (i+2, clanTransfers[i][0], clanTransfers[i][1])
-            vErrors.append(errorData)
+    #rows with the formulas saved without a value evaluated
+    def resolvedRows(self, sheetName, rows):
+        for rowNumber, values in rows:
+            for col, value in enumerate(values, 1):
+                if isinstance(value, PendingFormula):
+                    if self.formulas is None:
+                        self.formulas = FormulaEvaluator(self)
+                    values[col-1] = self.formulas.cell(sheetName, rowNumber, col)
+            yield rowNumber, values
 
-    if len(vErrors) == 0:
-        treeview.insert(errRoot, tk.END, text="No Transfers From Non-Clan/GM Units", tags="pass")
-    else:
-        treeview.item(xfrRoot, tags="error")
-        treeview.item(errRoot, tags="error")
-        for i in range(len(vErrors)):
-            errorText = "Transfer From Non-Clan/GM Unit " + str(vErrors[i][1]) + " to Unit " + str(vErrors[i][2]) + " on Row " + str(vErrors[i][0])
-            treeview.insert(errRoot, tk.END, text=errorText)
-
-    #check for transfers to non-Clan Units (valid but worth reviewing for mistakes, warning)
-    errRoot = treeview.insert(xfrRoot,tk.END,text="Transfers to Non-Clan/GM Units [Warning/Informational]", open=True)
-    vErrors = []
-    for i in range (len(clanTransfers)):
-        match = None
-        for vi in validUnits:
-            if str(clanTransfers[i][1]).upper() == vi.upper():
-                match = clanTransfers[i][1]
+    def sheetVersion(self):
+        try:
+            for rowNumber, values in self.resolvedRows("Instructions", self.rows("Instructions", 2, minRow=1, maxRow=1)):
+                return str(values[1])
+            return str(None)
+        except FastReaderUnsupported:
+            return self.fallbackReader("Instructions").sheetVersion()
 
-        if match is None:
-            errorData = (i+2, clanTransfers[i][0], clanTransfers[i][1])
-            vErrors.append(errorData)
+    #SheetTable of a worksheet like OpenpyxlOrdersReader.readTable, read with openpyxl if this reader can't
+    def readTable(self, sheetName, columns, upper=False):
+        try:
+            return self.readFastTable(sheetName, columns, upper)
+        except FastReaderUnsupported:
+            fallback = self.fallbackReader(sheetName)
+            table = fallback.readTable(sheetName, columns, upper)
+            self.rowsScanned = fallback.rowsScanned
+            return table
 
-    if len(vErrors) == 0:
-        treeview.insert(errRoot, tk.END, text="No Transfers To Non-Clan/GM Units", tags="pass")
-    else:
-        if treeview.item(xfrRoot, option="tags") != ("error",):
-            treeview.item(xfrRoot, tags="warning")
-        treeview.item(errRoot, tags="warning")
-        for i in range(len(vErrors)):
-            errorText = "Transfer To Non-Clan/GM Unit " + str(vErrors[i][2]) + " from Unit " + str(vErrors[i][1]) + " on Row " + str(vErrors[i][0])
-            treeview.insert(errRoot, tk.END, text=errorText)
-
-    #check for invalid goods in transfers
-    errRoot = treeview.insert(xfrRoot,tk.END,text="Invalid Transfer Goods Errors", open=True)
-    vErrors = []
-    for i in range (len(clanTransfers)):
-        match = None
-        for vi in validGoods:
-            if str(clanTransfers[i][2]).upper() == vi.upper():
-                match = clanTransfers[i][2]
+    def readFastTable(self, sheetName, columns, upper=False):
+        header = []
+        for rowNumber, values in self.resolvedRows(sheetName, self.rows(sheetName, None, minRow=1, maxRow=1)):
+            if rowNumber == 1:
+                header = values
+        colNumbers = tableColumns(header, columns)
+        self.rowsScanned = 0
+        rows = self.resolvedRows(sheetName, self.rows(sheetName, lastColumn(colNumbers)))
+        return buildTable(countRows(self, rows), colNumbers, upper)
+
+## Formula evaluation.
+# Formula cells are read as the value Excel saved with them. Workbooks written by tools that don't save values (or
+# by Excel with calculation turned off) have formulas without one, the fast reader evaluates those here: arithmetic,
+# comparisons, text and the lookup functions order sheets use (see formulaFunctions). Each formula text is compiled
+# once into nested closures, each cell is computed at most once (the cells it refers to first, on demand) and other
+# worksheets are only loaded when a formula refers to them. Formulas using anything else evaluate to None (blank).
+
+#Formula of a cell stored without a value, text is without the leading "="
+class PendingFormula:
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return "PendingFormula(" + repr(self.text) + ")"
+
+#Excel error value ("#DIV/0!", "#N/A", ...) raised while evaluating, the cell's value is then the error text
+class FormulaError(Exception):
+    pass
+
+#Formula using something the evaluator doesn't handle
+class FormulaUnsupported(Exception):
+    pass
+
+#Formula cell reached too deep in a chain of references, evaluated first from the evaluator's stack
+class FormulaDeferred(Exception):
 
+    def __init__(self, key):
+        Exception.__init__(self, key)
+        self.key = key
+
+#Formula cells evaluated inside one another before the deepest is deferred
+formulaDepth = 40
+
+#Rectangle of cells on a worksheet, as passed to functions
+class CellRange:
+    __slots__ = ("sheet", "top", "left", "bottom", "right")
+
+    def __init__(self, sheet, top, left, bottom, right):
+        self.sheet = sheet
+        self.top = top
+        self.left = left
+        self.bottom = bottom
+        self.right = right
+
+    def key(self):
+        return (self.sheet, self.top, self.left, self.bottom, self.right)
+
+    #rows of cell values
+    def rows(self, ev):
+        return [[ev.cell(self.sheet, row, col) for col in range(self.left, self.right + 1)] for row in range(self.top, self.bottom + 1)]
+
+    def values(self, ev):
+        return [value for row in self.rows(ev) for value in row]
+
+formulaTokenPattern = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<string>"(?:[^"]|"")*")
+  | (?P<error>\#(?:NULL!|DIV/0!|VALUE!|REF!|NAME\?|NUM!|N/A))
+  | (?P<ref>(?:(?:'(?:[^']|'')+'|[A-Za-z_][\w.]*)!)?(?:\$?[A-Za-z]{1,3}\$?\d+(?::\$?[A-Za-z]{1,3}\$?\d+)?|\$?[A-Za-z]{1,3}:\$?[A-Za-z]{1,3})(?![\w(]))
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<function>[A-Za-z_][\w.]*(?=\())
+  | (?P<name>[A-Za-z_][\w.]*)
+  | (?P<op><>|<=|>=|[-+*/^&=<>(),%])
+""", re.X)
+
+cellRefPattern = re.compile(r"\$?([A-Za-z]{1,3})\$?(\d+)?")
+
+#[(kind, text)] tokens of a formula, raises FormulaUnsupported
+def formulaTokens(text):
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = formulaTokenPattern.match(text, pos)
         if match is None:
-            errorData = (i+2, clanTransfers[i][2])
-            vErrors.append(errorData)
+            raise FormulaUnsupported(text)
+        if match.lastgroup != "space":
+            tokens.append((match.lastgroup, match.group()))
+        pos = match.end()
+    return tokens
 
-    if len(vErrors) == 0:
-        treeview.insert(errRoot, tk.END, text="No Invalid Goods in Transfer Orders", tags="pass")
-    else:
-        treeview.item(xfrRoot, tags="error")
-        treeview.item(errRoot, tags="error")
-        for i in range(len(vErrors)):
-            errorText = "Invalid Good " + str(vErrors[i][1]) + " on Row " + str(vErrors[i][0])
-            treeview.insert(errRoot, tk.END, text=errorText)
+#Column letters of a column number
+def columnLetters(col):
+    letters = ""
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
 
-fontsize = 10
+formulaQuotedPattern = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+formulaShiftPattern = re.compile(r"(?<![A-Za-z0-9_.])(\$?)([A-Za-z]{1,3})(\$?)(\d+)(?![\w(])")
 
-#fontchange
-def font_resize():
-    global fontsize
-    fontsize = checkVar.get()
+#Formula of a shared formula's other cells: relative references moved by rows and cols, strings left alone
+def shiftFormula(text, rows, cols):
+    def shift(match):
+        colAbs, letters, rowAbs, row = match.groups()
+        col = columnIndex(letters.upper())
+        row = int(row)
+        if not colAbs:
+            col += cols
+        if not rowAbs:
+            row += rows
+        if col < 1 or row < 1:
+            raise FastReaderUnsupported()
+        return colAbs + columnLetters(col) + rowAbs + str(row)
+    parts = formulaQuotedPattern.split(text)
+    return "".join(part if i % 2 else formulaShiftPattern.sub(shift, part) for i, part in enumerate(parts))
 
-#create main window
+#Value of an expression as a single value (a one cell range is its cell)
+def scalarValue(ev, value):
+    if isinstance(value, CellRange):
+        if value.top == value.bottom and value.left == value.right:
+            return ev.cell(value.sheet, value.top, value.left)
+        raise FormulaError("#VALUE!")
+    return value
+
+def numberValue(value):
+    if isinstance(value, FormulaError):
+        raise value
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str) and value.startswith("#") and value in formulaErrors:
+        raise FormulaError(value)
+    try:
+        return castNumber(str(value).strip())
+    except ValueError:
+        raise FormulaError("#VALUE!")
+
+def textValue(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float):
+        return format(value, ".15g")
+    return str(value)
+
+def boolValue(value):
+    if isinstance(value, str):
+        if value.upper() in ("TRUE", "FALSE"):
+            return value.upper() == "TRUE"
+        raise FormulaError("#VALUE!")
+    return bool(numberValue(value))
+
+formulaErrors = frozenset(("#NULL!", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!", "#N/A"))
+
+#Excel ordering of two values: numbers before text before booleans, text case insensitive, blank as 0 or ""
+def compareValues(a, b):
+    if a is None:
+        a = "" if isinstance(b, str) else 0
+    if b is None:
+        b = "" if isinstance(a, str) else 0
+    def rank(value):
+        if isinstance(value, bool):
+            return (2, value)
+        if isinstance(value, (int, float)):
+            return (0, value)
+        return (1, foldCase(value))
+    a = rank(a)
+    b = rank(b)
+    return (a > b) - (a < b)
+
+comparisonOps = {
+    "=": lambda c: c == 0, "<>": lambda c: c != 0, "<": lambda c: c < 0,
+    ">": lambda c: c > 0, "<=": lambda c: c <= 0, ">=": lambda c: c >= 0,
+}
+
+def divide(a, b):
+    if b == 0:
+        raise FormulaError("#DIV/0!")
+    return a / b
+
+#Products and powers are worked out in floating point as Excel does, so chains of them can't grow huge integers
+def power(a, b):
+    if a == 0 and b < 0:
+        raise FormulaError("#DIV/0!")
+    try:
+        return math.pow(a, b)
+    except (ValueError, OverflowError):
+        raise FormulaError("#NUM!")
+
+arithmeticOps = {"+": lambda a, b: a + b, "-": lambda a, b: a - b, "*": lambda a, b: float(a) * b, "/": divide, "^": power}
+
+#Recursive descent parser turning formula tokens into closures node(ev, sheet) -> value (a CellRange for ranges)
+class FormulaParser:
+
+    def __init__(self, text):
+        self.tokens = formulaTokens(text)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, text=None):
+        token = self.peek()
+        if token[0] is None or (text is not None and token[1] != text):
+            raise FormulaUnsupported()
+        self.pos += 1
+        return token
+
+    def parse(self):
+        node = self.comparison()
+        if self.pos != len(self.tokens):
+            raise FormulaUnsupported()
+        return node
 
-root = tk.Tk()
-root.title('TNValidator')
-root.resizable(True, True)
-root.geometry('600x200')
+    def comparison(self):
+        node = self.concatenation()
+        while self.peek()[1] in comparisonOps:
+            test = comparisonOps[self.take()[1]]
+            node = (lambda left, right, test: lambda ev, sheet: test(compareValues(scalarValue(ev, left(ev, sheet)), scalarValue(ev, right(ev, sheet)))))(node, self.concatenation(), test)
+        return node
 
-tk.Label(text="TN Order Validator by Clan 293", font=("Arial", 12, "bold")).pack()
-tk.Label(text="Release R3.1, 2026-04-22", font=("Arial", 10, "bold")).pack()
+    def concatenation(self):
+        node = self.additive()
+        while self.peek()[1] == "&":
+            self.take()
+            node = (lambda left, right: lambda ev, sheet: textValue(scalarValue(ev, left(ev, sheet))) + textValue(scalarValue(ev, right(ev, sheet))))(node, self.additive())
+        return node
 
-#Font doodling
-checkVar = tk.IntVar()
-fontcheck = tk.Checkbutton(root, text="Check for Larger Font", variable = checkVar, onvalue = 12, offvalue = 10, command=font_resize)
+    def arithmetic(self, operand, ops):
+        node = operand()
+        while self.peek()[0] == "op" and self.peek()[1] in ops:
+            op = arithmeticOps[self.take()[1]]
+            node = (lambda left, right, op: lambda ev, sheet: op(numberValue(scalarValue(ev, left(ev, sheet))), numberValue(scalarValue(ev, right(ev, sheet)))))(node, operand(), op)
+        return node
 
-tk.Label(text="Please select your TN Auto Order Sheet to Validate").pack()
+    def additive(self):
+        return self.arithmetic(self.multiplicative, ("+", "-"))
 
-# open button
-open_button = tk.Button(
-    root,
-    text='Select File',
-    command=select_file
-)
+    def multiplicative(self):
+        return self.arithmetic(self.power, ("*", "/"))
 
-open_button.pack()
+    def power(self):
+        return self.arithmetic(self.unary, ("^",))
 
-tk.Label(text="Add New Units to Column A of Valid Units Sheet to Reduce False Positives").pack()
-fontcheck.pack()
-fontcheck.deselect()
+    def unary(self):
+        if self.peek()[1] in ("-", "+"):
+            sign = -1 if self.take()[1] == "-" else 1
+            operand = self.unary()
+            return lambda ev, sheet: sign * numberValue(scalarValue(ev, operand(ev, sheet)))
+        node = self.primary()
+        while self.peek()[1] == "%":
+            self.take()
+            node = (lambda operand: lambda ev, sheet: numberValue(scalarValue(ev, operand(ev, sheet))) / 100)(node)
+        return node
+
+    def primary(self):
+        kind, text = self.take()
+        if kind == "number":
+            value = castNumber(text)
+            return lambda ev, sheet: value
+        if kind == "string":
+            value = text[1:-1].replace('""', '"')
+            return lambda ev, sheet: value
+        if kind == "error":
+            def error(ev, sheet):
+                raise FormulaError(text)
+            return error
+        if kind == "name" and text.upper() in ("TRUE", "FALSE"):
+            value = text.upper() == "TRUE"
+            return lambda ev, sheet: value
+        if kind == "ref":
+            return self.reference(text)
+        if kind == "function":
+            function = formulaFunctions.get(text.upper())
+            if function is None:
+                raise FormulaUnsupported(text)
+            self.take("(")
+            args = []
+            if self.peek()[1] != ")":
+                args.append(self.comparison())
+                while self.peek()[1] == ",":
+                    self.take()
+                    args.append(self.comparison())
+            self.take(")")
+            return lambda ev, sheet: function(ev, sheet, args)
+        if text == "(":
+            node = self.comparison()
+            self.take(")")
+            return node
+        raise FormulaUnsupported(text)
+
+    def reference(self, text):
+        sheetName = None
+        if "!" in text:
+            sheetName, text = text.rsplit("!", 1)
+            if sheetName.startswith("'"):
+                sheetName = sheetName[1:-1].replace("''", "'")
+        corners = [cellRefPattern.fullmatch(part).groups() for part in text.split(":")]
+        (leftCol, top), (rightCol, bottom) = corners[0], corners[-1]
+        left = columnIndex(leftCol.upper())
+        right = columnIndex(rightCol.upper())
+        top = int(top) if top else None
+        bottom = int(bottom) if bottom else None
+        def ref(ev, sheet):
+            name = ev.sheetName(sheetName or sheet)
+            if top is None:
+                return CellRange(name, 1, min(left, right), ev.lastRow(name), max(left, right))
+            if len(corners) == 1:
+                return ev.cell(name, top, left)
+            return CellRange(name, min(top, bottom), min(left, right), max(top, bottom), max(left, right))
+        return ref
+
+#Compiled closure of a formula text, raises FormulaUnsupported
+@functools.lru_cache(maxsize=4096)
+def compileFormula(text):
+    return FormulaParser(text).parse()
+
+#Cell values of every argument (ranges contribute all their cells)
+def argumentValues(ev, sheet, args):
+    values = []
+    for arg in args:
+        value = arg(ev, sheet)
+        if isinstance(value, CellRange):
+            values.extend(value.values(ev))
+        else:
+            values.append(value)
+    return values
+
+#Numbers of the arguments as SUM counts them: numbers in ranges, anything number-like given directly
+def argumentNumbers(ev, sheet, args):
+    numbers = []
+    for arg in args:
+        value = arg(ev, sheet)
+        if isinstance(value, CellRange):
+            for cell in value.values(ev):
+                if isinstance(cell, str) and cell in formulaErrors:
+                    raise FormulaError(cell)
+                if isinstance(cell, (int, float)) and not isinstance(cell, bool):
+                    numbers.append(cell)
+        else:
+            numbers.append(numberValue(value))
+    return numbers
+
+def argument(ev, sheet, args, i, default=None):
+    if i >= len(args):
+        if default is None:
+            raise FormulaError("#VALUE!")
+        return default
+    return scalarValue(ev, args[i](ev, sheet))
+
+def rangeArgument(ev, sheet, args, i):
+    value = args[i](ev, sheet) if i < len(args) else None
+    if not isinstance(value, CellRange):
+        raise FormulaError("#VALUE!")
+    return value
+
+#Test built from a SUMIF/COUNTIF criterion (">5", "<>x", "x")
+def criterionTest(criterion):
+    if isinstance(criterion, str):
+        for op in ("<>", "<=", ">=", "=", "<", ">"):
+            if criterion.startswith(op):
+                target = criterion[len(op):]
+                try:
+                    target = castNumber(target)
+                except ValueError:
+                    pass
+                return criterionCompare(comparisonOps[op], target, op == "<>")
+    return criterionCompare(comparisonOps["="], criterion, False)
+
+#Criterion test comparing to a number or a text (only cells of the same kind can match, except for "<>")
+def criterionCompare(test, target, negated):
+    isNumber = lambda value: isinstance(value, (int, float)) and not isinstance(value, bool)
+    def matches(value):
+        if value is None or isNumber(value) != isNumber(target) or isinstance(value, bool) != isinstance(target, bool):
+            return negated
+        return test(compareValues(value, target))
+    return matches
+
+def functionIf(ev, sheet, args):
+    if boolValue(argument(ev, sheet, args, 0)):
+        return argument(ev, sheet, args, 1, True)
+    return argument(ev, sheet, args, 2, False)
+
+def functionIfError(ev, sheet, args, errors=formulaErrors):
+    try:
+        value = argument(ev, sheet, args, 0)
+    except FormulaError as e:
+        if str(e) in errors:
+            return argument(ev, sheet, args, 1)
+        raise
+    if isinstance(value, str) and value in errors:
+        return argument(ev, sheet, args, 1)
+    return value
+
+#Digits ROUND is limited to, further than any float has
+roundDigits = 308
+
+def functionRound(ev, sheet, args):
+    value = numberValue(argument(ev, sheet, args, 0))
+    digits = int(numberValue(argument(ev, sheet, args, 1, 0)))
+    scale = 10.0 ** max(-roundDigits, min(roundDigits, digits))
+    scaled = abs(value) * scale
+    #no digits left to round off at this scale
+    if not math.isfinite(scaled) or scaled >= 2 ** 53:
+        return value
+    rounded = math.floor(scaled + 0.5) / scale
+    return rounded if value >= 0 else -rounded
+
+#Row (or column) position of value in a line of cells, exact (folded text) or approximate (last not above value)
+def lookupPosition(ev, line, key, value, exact):
+    if exact:
+        positions = ev.lookupIndex(key, line)
+        found = positions.get(lookupKey(value))
+        if found is None:
+            raise FormulaError("#N/A")
+        return found
+    found = None
+    for i, cell in enumerate(line):
+        if cell is not None and compareValues(cell, value) <= 0:
+            found = i
+        elif cell is not None:
+            break
+    if found is None:
+        raise FormulaError("#N/A")
+    return found
+
+def lookupKey(value):
+    if isinstance(value, bool):
+        return ("b", value)
+    if isinstance(value, (int, float)):
+        return ("n", value)
+    return ("s", foldCase(textValue(value)))
+
+def functionVLookup(ev, sheet, args):
+    value = argument(ev, sheet, args, 0)
+    table = rangeArgument(ev, sheet, args, 1)
+    col = int(numberValue(argument(ev, sheet, args, 2)))
+    exact = not boolValue(argument(ev, sheet, args, 3, True))
+    if col < 1 or col > table.right - table.left + 1:
+        raise FormulaError("#REF!")
+    firstCol = CellRange(table.sheet, table.top, table.left, table.bottom, table.left)
+    row = lookupPosition(ev, firstCol.values(ev), firstCol.key(), value, exact)
+    return ev.cell(table.sheet, table.top + row, table.left + col - 1)
+
+def functionMatch(ev, sheet, args):
+    value = argument(ev, sheet, args, 0)
+    line = rangeArgument(ev, sheet, args, 1)
+    matchType = int(numberValue(argument(ev, sheet, args, 2, 1)))
+    if matchType == -1:
+        raise FormulaUnsupported("MATCH -1")
+    return lookupPosition(ev, line.values(ev), line.key(), value, matchType == 0) + 1
+
+def functionIndex(ev, sheet, args):
+    table = rangeArgument(ev, sheet, args, 0)
+    row = int(numberValue(argument(ev, sheet, args, 1)))
+    col = int(numberValue(argument(ev, sheet, args, 2, 1)))
+    if table.top == table.bottom and len(args) == 2:
+        row, col = 1, row
+    if row < 1 or col < 1 or row > table.bottom - table.top + 1 or col > table.right - table.left + 1:
+        raise FormulaError("#REF!")
+    return ev.cell(table.sheet, table.top + row - 1, table.left + col - 1)
+
+def functionSumIf(ev, sheet, args):
+    tested = rangeArgument(ev, sheet, args, 0)
+    test = criterionTest(argument(ev, sheet, args, 1))
+    summed = rangeArgument(ev, sheet, args, 2) if len(args) > 2 else tested
+    total = 0
+    for testValue, value in zip(tested.values(ev), summed.values(ev)):
+        if test(testValue) and isinstance(value, (int, float)) and not isinstance(value, bool):
+            total += value
+    return total
+
+def functionCountIf(ev, sheet, args):
+    test = criterionTest(argument(ev, sheet, args, 1))
+    return sum(1 for value in rangeArgument(ev, sheet, args, 0).values(ev) if test(value))
+
+def functionAverage(ev, sheet, args):
+    numbers = argumentNumbers(ev, sheet, args)
+    if not numbers:
+        raise FormulaError("#DIV/0!")
+    return sum(numbers) / len(numbers)
+
+def functionLeft(ev, sheet, args):
+    text = textValue(argument(ev, sheet, args, 0))
+    count = int(numberValue(argument(ev, sheet, args, 1, 1)))
+    if count < 0:
+        raise FormulaError("#VALUE!")
+    return text[:count]
+
+def functionRight(ev, sheet, args):
+    text = textValue(argument(ev, sheet, args, 0))
+    count = int(numberValue(argument(ev, sheet, args, 1, 1)))
+    if count < 0:
+        raise FormulaError("#VALUE!")
+    return text[max(0, len(text) - count):]
+
+def functionMid(ev, sheet, args):
+    text = textValue(argument(ev, sheet, args, 0))
+    start = int(numberValue(argument(ev, sheet, args, 1)))
+    length = int(numberValue(argument(ev, sheet, args, 2)))
+    if start < 1 or length < 0:
+        raise FormulaError("#VALUE!")
+    return text[start - 1:start - 1 + length]
+
+#Supported functions: name: function(evaluator, sheet, argument closures) -> value
+formulaFunctions = {
+    "SUM": lambda ev, sheet, args: sum(argumentNumbers(ev, sheet, args)),
+    "MIN": lambda ev, sheet, args: min(argumentNumbers(ev, sheet, args), default=0),
+    "MAX": lambda ev, sheet, args: max(argumentNumbers(ev, sheet, args), default=0),
+    "AVERAGE": functionAverage,
+    "COUNT": lambda ev, sheet, args: sum(1 for value in argumentValues(ev, sheet, args) if isinstance(value, (int, float)) and not isinstance(value, bool)),
+    "COUNTA": lambda ev, sheet, args: sum(1 for value in argumentValues(ev, sheet, args) if value is not None),
+    "SUMIF": functionSumIf,
+    "COUNTIF": functionCountIf,
+    "IF": functionIf,
+    "IFERROR": functionIfError,
+    "IFNA": lambda ev, sheet, args: functionIfError(ev, sheet, args, ("#N/A",)),
+    "AND": lambda ev, sheet, args: all([boolValue(value) for value in argumentValues(ev, sheet, args) if value is not None]),
+    "OR": lambda ev, sheet, args: any([boolValue(value) for value in argumentValues(ev, sheet, args) if value is not None]),
+    "NOT": lambda ev, sheet, args: not boolValue(argument(ev, sheet, args, 0)),
+    "ROUND": functionRound,
+    "INT": lambda ev, sheet, args: math.floor(numberValue(argument(ev, sheet, args, 0))),
+    "ABS": lambda ev, sheet, args: abs(numberValue(argument(ev, sheet, args, 0))),
+    "VLOOKUP": functionVLookup,
+    "MATCH": functionMatch,
+    "INDEX": functionIndex,
+    "CONCATENATE": lambda ev, sheet, args: "".join(textValue(argument(ev, sheet, args, i)) for i in range(len(args))),
+    "CONCAT": lambda ev, sheet, args: "".join(textValue(value) for value in argumentValues(ev, sheet, args)),
+    "UPPER": lambda ev, sheet, args: textValue(argument(ev, sheet, args, 0)).upper(),
+    "LOWER": lambda ev, sheet, args: textValue(argument(ev, sheet, args, 0)).lower(),
+    "TRIM": lambda ev, sheet, args: " ".join(textValue(argument(ev, sheet, args, 0)).split()),
+    "LEN": lambda ev, sheet, args: len(textValue(argument(ev, sheet, args, 0))),
+    "LEFT": functionLeft,
+    "RIGHT": functionRight,
+    "MID": functionMid,
+    "ISBLANK": lambda ev, sheet, args: argument(ev, sheet, args, 0, "") is None,
+    "ISNUMBER": lambda ev, sheet, args: isinstance(argument(ev, sheet, args, 0, ""), (int, float)) and not isinstance(argument(ev, sheet, args, 0, ""), bool),
+}
+
+#Evaluates the formulas without saved values of one workbook, read through a FastOrdersReader.
+#Worksheets, cell values and lookup indexes are kept for the life of the reader.
+class FormulaEvaluator:
+
+    def __init__(self, reader):
+        self.reader = reader
+        #sheet name: {(row, col): raw value}
+        self.sheets = {}
+        #sheet name: last row
+        self.lastRows = {}
+        #(sheet name, row, col): value of a formula cell
+        self.values = {}
+        #range key: {lookupKey: first position}
+        self.lookups = {}
+        #formula cells being evaluated, to stop circular references
+        self.active = set()
+        #formula cells being evaluated inside one another
+        self.depth = 0
+
+    #Name of a worksheet as the workbook has it (references are case insensitive)
+    def sheetName(self, name):
+        if name in self.reader.members:
+            return name
+        for member in self.reader.members:
+            if foldCase(member) == foldCase(name):
+                return member
+        raise FormulaError("#REF!")
+
+    def sheetCells(self, sheetName):
+        cells = self.sheets.get(sheetName)
+        if cells is None:
+            cells = {}
+            lastRow = 0
+            #formulas compute with the serial numbers of dates
+            for rowNumber, values in self.reader.rows(sheetName, None, minRow=1, dates=False):
+                for col, value in enumerate(values, 1):
+                    if value is not None:
+                        cells[(rowNumber, col)] = value
+                        lastRow = rowNumber
+            self.sheets[sheetName] = cells
+            self.lastRows[sheetName] = lastRow
+        return cells
+
+    def lastRow(self, sheetName):
+        self.sheetCells(sheetName)
+        return self.lastRows[sheetName]
+
+    #Value of a cell, formulas without a saved value are evaluated once
+    def cell(self, sheetName, row, col):
+        key = (sheetName, row, col)
+        if key in self.values:
+            return self.values[key]
+        raw = self.sheetCells(sheetName).get((row, col))
+        if not isinstance(raw, PendingFormula):
+            return raw
+        #circular reference, counted as 0
+        if key in self.active:
+            return 0
+        if self.depth == 0:
+            return self.resolve(key)
+        if self.depth >= formulaDepth:
+            raise FormulaDeferred(key)
+        return self.compute(key, raw.text)
+
+    def compute(self, key, text):
+        self.active.add(key)
+        self.depth += 1
+        try:
+            value = self.evaluate(text, key[0])
+        finally:
+            self.active.discard(key)
+            self.depth -= 1
+        self.values[key] = value
+        return value
+
+    #Value of a formula cell requested from outside any formula. Deep chains of references are evaluated
+    #from an explicit stack: a deferred cell is evaluated first, then the cells waiting on it are retried.
+    #Cells still on the stack depend on the one evaluated, so reaching one of them is a circular reference.
+    def resolve(self, key):
+        stack = [key]
+        try:
+            while stack:
+                target = stack[-1]
+                self.active = set(stack[:-1])
+                try:
+                    self.compute(target, self.sheetCells(target[0])[target[1:]].text)
+                except FormulaDeferred as e:
+                    stack.append(e.key)
+                    continue
+                stack.pop()
+        #too deeply nested formula text, the cell can't be evaluated and nothing partial is kept
+        except RecursionError:
+            return None
+        finally:
+            self.active = set()
+        return self.values[key]
+
+    #Value of a formula on a sheet: an error text for Excel errors (numbers out of range are #NUM!), None if it
+    #can't be evaluated
+    def evaluate(self, text, sheetName):
+        try:
+            value = scalarValue(self, compileFormula(text)(self, sheetName))
+        except FormulaError as e:
+            return str(e)
+        except ZeroDivisionError:
+            return "#DIV/0!"
+        except (ValueError, OverflowError):
+            return "#NUM!"
+        except FormulaUnsupported:
+            return None
+        if isinstance(value, complex) or (isinstance(value, float) and not math.isfinite(value)):
+            return "#NUM!"
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
+
+    #{lookupKey: first position} of the values of a range, built once per range
+    def lookupIndex(self, key, values):
+        positions = self.lookups.get(key)
+        if positions is None:
+            positions = {}
+            for i, value in enumerate(values):
+                if value is not None:
+                    positions.setdefault(lookupKey(value), i)
+            self.lookups[key] = positions
+        return positions
+
+## Reference sheet cache.
+# Opt-in (--cache-dir, or the TNVALIDATOR_CACHE_DIR environment variable) on-disk cache of the parsed Valid Goods,
+# Valid Activity and Valid Units sheets, which are nearly identical across clans and from turn to turn. Entries are
+# keyed by the sheet's content key and the column layout of its sheet version, stored as zlib compressed marshal
+# data, and the least recently used entries are removed once the directory grows past its size limit.
+
+referenceSheets = ("Valid Goods", "Valid Activity", "Valid Units")
+
+class ReferenceCache:
+    #bump when the cached data changes shape
+    formatVersion = 2
+
+    def __init__(self, directory, maxBytes=32*1024*1024):
+        self.directory = pathlib.Path(directory)
+        self.maxBytes = maxBytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def entryPath(self, sheetKey, gameVersion, specs):
+        key = repr((self.formatVersion, marshal.version, sys.version_info[:2], sheetKey, gameVersion, specs))
+        return self.directory / (hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest() + ".ref")
+
+    #Cached table data of a sheet (SheetTable.asData), None on a miss. A hit marks the entry as recently used.
+    def get(self, sheetKey, gameVersion, specs):
+        path = self.entryPath(sheetKey, gameVersion, specs)
+        try:
+            with open(path, "rb") as f:
+                sheetData = marshal.loads(zlib.decompress(f.read()))
+            os.utime(path)
+        except (OSError, ValueError, EOFError, TypeError, zlib.error):
+            return None
+        return sheetData
+
+    def put(self, sheetKey, gameVersion, specs, sheetData):
+        try:
+            blob = zlib.compress(marshal.dumps(sheetData))
+        except ValueError:
+            #cell values marshal can't store (e.g. dates), leave the sheet uncached
+            return
+        path = self.entryPath(sheetKey, gameVersion, specs)
+        temp = path.with_name(path.name + "." + str(os.getpid()) + ".tmp")
+        try:
+            with open(temp, "wb") as f:
+                f.write(blob)
+            os.replace(temp, path)
+        except OSError:
+            return
+        self.evict()
+
+    #Remove least recently used entries until the cache fits in maxBytes
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".ref"):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+#Cache from the TNVALIDATOR_CACHE_DIR environment variable, None when caching is not turned on
+def defaultCache():
+    directory = os.environ.get("TNVALIDATOR_CACHE_DIR")
+    if not directory:
+        return None
+    return ReferenceCache(directory)
+
+#Reference sheet cache kept in memory by a long running process (the validation service), least recently used
+#entries are dropped past maxEntries. Misses fall through to backing (a ReferenceCache) when given.
+class MemoryReferenceCache:
+
+    def __init__(self, maxEntries=64, backing=None):
+        self.maxEntries = maxEntries
+        self.backing = backing
+        self.entries = {}
+
+    def get(self, sheetKey, gameVersion, specs):
+        key = repr((sheetKey, gameVersion, specs))
+        sheetData = self.entries.pop(key, None)
+        if sheetData is None and self.backing is not None:
+            sheetData = self.backing.get(sheetKey, gameVersion, specs)
+        if sheetData is not None:
+            self.entries[key] = sheetData
+        return sheetData
+
+    def put(self, sheetKey, gameVersion, specs, sheetData):
+        self.entries[repr((sheetKey, gameVersion, specs))] = sheetData
+        while len(self.entries) > self.maxEntries:
+            del self.entries[next(iter(self.entries))]
+        if self.backing is not None:
+            self.backing.put(sheetKey, gameVersion, specs, sheetData)
+
+## Transfer ledger.
+# Post-transfer inventory of every unit: starts from the turn start counts on the Clan sheet and applies every row
+# of the Transfers sheet once. Units that are only on Valid Units (e.g. newly created) start out empty.
+# ledger = {folded unit: {folded good: count}}. Goods that are not counted on the Clan sheet start at 0, so for
+# those the ledger holds the net amount transferred this turn.
+
+#Goods counted on the Clan sheet at turn start: good: column of the clan table
+clanSheetGoods = {"WARRIORS": "warriors", "ACTIVES": "actives", "INACTIVES": "inactives", **clanStockGoods}
+
+#Goods that make up a unit's population
+populationGoods = ("WARRIORS", "ACTIVES", "INACTIVES")
+
+#Whole number in a sheet cell, None if the cell is blank or not a number
+def toCount(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def buildLedger(turn):
+    ledger = {}
+    for unit in turn["validUnits"].values("unit"):
+        ledger[foldCase(unit)] = {}
+
+    goodColumns = list(clanSheetGoods.values())
+    for row, unit, *counts in turn["clan"].project("unit", *goodColumns):
+        if unit is not None:
+            inventory = ledger.setdefault(foldCase(unit), {})
+            for good, count in zip(clanSheetGoods, counts):
+                inventory[good] = toCount(count) or 0
+
+    for row, fromUnit, toUnit, item, quantity in turn["transfers"].project("fromUnit", "toUnit", "item", "quantity"):
+        quantity = toCount(quantity)
+        if quantity is None:
+            continue
+        good = foldCase(item)
+        fromInventory = ledger.get(foldCase(fromUnit))
+        if fromInventory is not None:
+            fromInventory[good] = fromInventory.get(good, 0) - quantity
+        toInventory = ledger.get(foldCase(toUnit))
+        if toInventory is not None:
+            toInventory[good] = toInventory.get(good, 0) + quantity
+
+    return ledger
+
+#Post-transfer count of a good held by a unit, None if the unit is not in the ledger
+def ledgerCount(ledger, unit, good):
+    inventory = ledger.get(foldCase(unit))
+    if inventory is None:
+        return None
+    return inventory.get(foldCase(good), 0)
+
+#Post-transfer population of a unit, None if the unit is not in the ledger
+def ledgerPopulation(ledger, unit):
+    inventory = ledger.get(foldCase(unit))
+    if inventory is None:
+        return None
+    return sum(inventory.get(good, 0) for good in populationGoods)
+
+## Validation engine.
+# Every test is a named check in the checks registry. A check takes the turn data (a Turn: the sheet tables plus the
+# derived facts it declares it needs) and returns a list of Finding records. The GUI and batch mode only render
+# findings, so checks can be run, skipped or timed individually.
+
+#A single error or warning reported by a check. row is the order sheet row (None if the finding is not about one row),
+#rowKey the content key of that row (see keyFindings), suggestions the valid values closest to an invalid one.
+class Finding:
+    __slots__ = ("check", "category", "severity", "row", "unit", "message", "rowKey", "suggestions")
+
+    def __init__(self, severity, row, unit, message, suggestions=None):
+        self.check = None
+        self.category = None
+        self.severity = severity
+        self.row = row
+        self.unit = unit
+        self.message = message
+        self.rowKey = None
+        self.suggestions = suggestions
+
+    def __repr__(self):
+        return "Finding(" + repr(self.check) + ", " + repr(self.severity) + ", " + repr(self.row) + ", " + repr(self.unit) + ", " + repr(self.message) + ")"
+
+    def asDict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    #Finding from a batch report entry
+    @classmethod
+    def fromDict(cls, data):
+        finding = cls(data["severity"], data["row"], data["unit"], data["message"])
+        finding.check = data["check"]
+        finding.category = data["category"]
+        finding.rowKey = data.get("rowKey")
+        finding.suggestions = data.get("suggestions")
+        return finding
+
+    #Message as shown in reports, with the suggested valid values
+    def text(self):
+        if self.suggestions:
+            return str(self.message) + " (did you mean " + " or ".join(self.suggestions) + "?)"
+        return str(self.message)
+
+#Registry entry for a check. group is an optional heading shared by related checks in the report, reads lists the
+#tables the check depends on (None if unknown, the check is then rerun on every incremental validation), including
+#the tables behind the facts it needs. The first table read is the one the rows of the check's findings are in.
+class Check:
+    __slots__ = ("name", "category", "title", "passText", "group", "reads", "needs", "function")
+
+    def __init__(self, name, category, title, passText, group, reads, needs, function):
+        self.name = name
+        self.category = category
+        self.title = title
+        self.passText = passText
+        self.group = group
+        self.reads = reads
+        self.needs = needs
+        self.function = function
+
+#Registry entry for a derived fact (see Turn). function computes the fact from the turn, or a tuple of values when
+#the fact has several names. reads are the tables it uses directly, needs the other facts it uses.
+class Fact:
+    __slots__ = ("names", "reads", "needs", "function")
+
+    def __init__(self, names, reads, needs, function):
+        self.names = names
+        self.reads = reads
+        self.needs = needs
+        self.function = function
+
+#The tables of one order sheet and the facts derived from them. A fact is computed the first time it is looked up
+#(turn["ledger"]) and kept for the rest of the validation, so checks sharing a fact don't each rebuild it.
+#ruleSeconds holds the time each row rule took in its table's scan (see Row scans), charged to the rule's check.
+class Turn(dict):
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.ruleSeconds = {}
+
+    def __missing__(self, name):
+        f = facts.get(name)
+        if f is None:
+            raise KeyError(name)
+        values = f.function(self)
+        if len(f.names) == 1:
+            values = (values,)
+        for factName, value in zip(f.names, values):
+            self[factName] = value
+        return self[name]
+
+#Wall time of one phase of a validation (workbook load, a sheet, turn preparation, a check or report rendering) with
+#the rows it scanned and the findings it reported (None where that doesn't apply)
+class Phase:
+    __slots__ = ("phase", "name", "seconds", "rows", "findings")
+
+    def __init__(self, phase, name, seconds, rows=None, findings=None):
+        self.phase = phase
+        self.name = name
+        self.seconds = seconds
+        self.rows = rows
+        self.findings = findings
+
+    def asDict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    #one line description for the report
+    def describe(self):
+        text = self.phase + " " + self.name + ": " + format(self.seconds * 1000, ".2f") + " ms"
+        if self.rows is not None:
+            text += ", " + str(self.rows) + " rows"
+        if self.findings is not None:
+            text += ", " + str(self.findings) + " findings"
+        return text
+
+#Phases of one validation in the order they ran, filled in by the functions given it
+class Diagnostics:
+
+    def __init__(self):
+        self.phases = []
+
+    def add(self, phase, name, seconds, rows=None, findings=None):
+        self.phases.append(Phase(phase, name, seconds, rows, findings))
+
+    def totalSeconds(self):
+        return sum(phase.seconds for phase in self.phases)
+
+    def asList(self):
+        return [phase.asDict() for phase in self.phases]
+
+#Report categories in display order
+categoryOrder = ["Activity Orders", "Transfer Orders", "Movement and Scouting Orders", "Skill and Research Orders"]
+
+#name: Check, in the order the checks are displayed within their category
+checks = {}
+
+#name: Fact, every name of a fact with several names maps to it
+facts = {}
+
+#Held while rule files change the registries, and by the GUI worker while it validates: reloading rule files waits
+#for a cancelled validation to stop instead of changing checks it is still going through
+registryLock = threading.Lock()
+
+#Decorator registering a check function. needs lists the facts it uses.
+def check(name, category, title, passText, group=None, reads=None, needs=()):
+    def register(function):
+        checks[name] = Check(name, category, title, passText, group, None if reads is None else tableReads(reads, needs), tuple(needs), function)
+        return function
+    return register
+
+#Decorator registering a fact function under one or more names
+def fact(*names, reads=(), needs=()):
+    def register(function):
+        f = Fact(names, tuple(reads), tuple(needs), function)
+        for name in names:
+            facts[name] = f
+        return function
+    return register
+
+#reads plus the tables behind the needed facts, in first use order
+def tableReads(reads, needs):
+    tables = list(reads)
+    for name in needs:
+        for table in tableReads(facts[name].reads, facts[name].needs):
+            if table not in tables:
+                tables.append(table)
+    return tuple(tables)
+
+#Facts in the order they can be computed: each after the facts it needs. names defaults to every fact.
+def factOrder(names=None):
+    order = []
+    def visit(f):
+        if f not in order:
+            for need in f.needs:
+                visit(facts[need])
+            order.append(f)
+    for name in (facts if names is None else names):
+        visit(facts[name])
+    return order
+
+#Turn of the parsed order data, facts are derived as the checks ask for them
+def prepareTurn(orderData):
+    return Turn(orderData)
+
+#Compute the facts (all of them, or the named ones and what they need) that aren't in the turn yet, each once.
+#Their times are recorded in diagnostics when given, less the time of the row rules run by a scan (their checks'
+#time).
+def computeFacts(turn, names=None, diagnostics=None):
+    for f in factOrder(names):
+        if f.names[0] in turn:
+            continue
+        ruled = sum(turn.ruleSeconds.values())
+        start = time.perf_counter()
+        turn[f.names[0]]
+        if diagnostics is not None:
+            seconds = time.perf_counter() - start - (sum(turn.ruleSeconds.values()) - ruled)
+            diagnostics.add("fact", ", ".join(f.names), seconds, sum(len(turn[name]) for name in f.reads) if f.reads else None)
+    return turn
+
+#Run the registered checks (all of them, or only the named ones) and return {check name: [Finding]}
+#progress is called as progress("check", name) before each check runs, checkDone(name, findings) after it.
+#Each check's time (with its row rule's time in the scan), rows read and findings are recorded in diagnostics when
+#given. With keyRows the findings' row keys are set before checkDone (see keyFindings). Without keep the findings
+#are only handed to checkDone and then dropped, results stays empty: the lists are emptied, so the findings a table
+#scan collected for its rules go as soon as each rule's check is done.
+def runChecks(turn, names=None, progress=None, checkDone=None, diagnostics=None, keyRows=False, keep=True):
+    results = {}
+    run = [name for name in checks if names is None or name in names]
+    computeFacts(turn, [need for name in run for need in checks[name].needs], diagnostics)
+    tableKeys = {}
+    for name in run:
+        chk = checks[name]
+        if progress is not None:
+            progress("check", name)
+        start = time.perf_counter()
+        findings = chk.function(turn)
+        if diagnostics is not None:
+            diagnostics.add("check", name, time.perf_counter() - start + turn.ruleSeconds.get(name, 0.0), checkRows(turn, chk), len(findings))
+        for finding in findings:
+            finding.check = name
+            finding.category = chk.category
+        if keyRows:
+            keyCheckFindings(turn, name, findings, tableKeys)
+        if checkDone is not None:
+            checkDone(name, findings)
+        if keep:
+            results[name] = findings
+        else:
+            findings.clear()
+    return results
+
+#Rows of the tables a check reads, None if it doesn't declare them
+def checkRows(turn, chk):
+    if chk.reads is None:
+        return None
+    return sum(len(turn[name]) for name in chk.reads if name in turn)
+
+#Worst severity in a list of findings, "pass" if there are none
+def worstLevel(findings):
+    level = "pass"
+    for finding in findings:
+        if finding.severity == "error":
+            return "error"
+        level = "warning"
+    return level
+
+#Count error and warning findings in check results
+def findingCounts(results):
+    errors = 0
+    warnings = 0
+    for findings in results.values():
+        for finding in findings:
+            if finding.severity == "error":
+                errors += 1
+            else:
+                warnings += 1
+    return errors, warnings
+
+#Parse and validate an order sheet, returns (turn, results). checkDone, keyRows and keep are passed to runChecks.
+def validateOrders(path, cache=None, diagnostics=None, checkDone=None, keyRows=False, keep=True):
+    orderData = processOrdersXLSX(path, cache=cache, diagnostics=diagnostics)
+    turn = prepareTurn(orderData)
+    return turn, runChecks(turn, checkDone=checkDone, diagnostics=diagnostics, keyRows=keyRows, keep=keep)
+
+#Validates the same order sheet over and over (watch mode). Each worksheet's content key is kept between runs so
+#only the sheets that changed since the last run are parsed again, and only the checks that read their tables
+#are rerun. Findings of the other checks are reused (and passed to checkDone like the rerun ones).
+#If progress raises (e.g. ValidationCancelled) the validator keeps the state of its last completed run.
+class IncrementalValidator:
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.sheetKeys = {}
+        self.orderData = None
+        self.results = {}
+        #the Check each result came from, a check replaced since (a reloaded rule file) is rerun
+        self.checked = {}
+        #what the last validate() had to redo
+        self.parsedSheets = []
+        self.rerunChecks = []
+
+    #Validator starting from a batch report (see validateFile): only checks reading sheets that changed since the
+    #report was written are run on the next validate(), the report's findings are reused for the others
+    @classmethod
+    def fromReport(cls, report, cache=None):
+        validator = cls(cache)
+        validator.sheetKeys = dict(report.get("sheetKeys", {}))
+        results = {entry["name"]: [] for entry in report.get("checks", [])}
+        for data in report.get("findings", []):
+            if data["check"] in results:
+                results[data["check"]].append(Finding.fromDict(data))
+        validator.results = results
+        return validator
+
+    #With keyRows the findings passed to checkDone have their row keys (see keyFindings), reused ones included
+    def validate(self, path, progress=None, checkDone=None, diagnostics=None, keyRows=False):
+        start = time.perf_counter()
+        sheetKeys = orderSheetKeys(path)
+        if diagnostics is not None:
+            diagnostics.add("load", "sheet content keys", time.perf_counter() - start, None)
+        changed = set(name for name, key in sheetKeys.items() if self.sheetKeys.get(name) != key)
+
+        #a new sheet version changes every layout, start over
+        if self.orderData is None or "Instructions" in changed:
+            orderData = processOrdersXLSX(path, cache=self.cache, sheetKeys=sheetKeys, progress=progress, diagnostics=diagnostics)
+            parsedSheets = layoutSheets(orderData["gameVersion"])
+        else:
+            parsedSheets = [name for name in layoutSheets(self.orderData["gameVersion"]) if name in changed]
+            orderData = dict(self.orderData)
+            if parsedSheets:
+                orderData.update(processOrdersXLSX(path, sheets=parsedSheets, cache=self.cache, sheetKeys=sheetKeys, progress=progress, diagnostics=diagnostics))
+        previousResults = {} if "Instructions" in changed else self.results
+
+        layout = sheetLayouts[orderData["gameVersion"]]
+        changedLists = set(name for name, (sheetName, columns, upper) in layout.items() if sheetName in changed)
+        rerun = [name for name, chk in checks.items()
+                 if name not in previousResults or chk.reads is None or changedLists.intersection(chk.reads)
+                 or self.checked.get(name, chk) is not chk]
+
+        turn = prepareTurn(orderData)
+        tableKeys = {}
+        for name in checks:
+            if name not in rerun:
+                #their rows are on unchanged sheets, the new turn's keys are theirs
+                if keyRows:
+                    keyCheckFindings(turn, name, previousResults[name], tableKeys)
+                if checkDone is not None:
+                    checkDone(name, previousResults[name])
+                if diagnostics is not None:
+                    diagnostics.add("check", name + " (reused)", 0.0, 0, len(previousResults[name]))
+        newResults = runChecks(turn, rerun, progress, checkDone, diagnostics, keyRows)
+        results = {name: newResults[name] if name in newResults else previousResults[name] for name in checks}
+
+        self.sheetKeys = sheetKeys
+        self.orderData = orderData
+        self.results = results
+        self.checked = dict(checks)
+        self.parsedSheets = parsedSheets
+        self.rerunChecks = rerun
+        return turn, results
+
+## Turn-over-turn diff.
+# Compares the findings of an order sheet with those of an earlier run: a batch report (which keeps the sheet content
+# keys and findings) or an earlier copy of the workbook. Findings are matched by the content key of their row, so rows
+# inserted or removed above them don't make them look new. Other findings are matched by unit. Findings sharing a row
+# or unit are paired by their text first, so one of them going away doesn't make the others look changed. Findings of
+# checks whose tables didn't change are reused by the IncrementalValidator without running the check, and can't differ.
+
+#Set the rowKey of every finding that is about a row, from the rows of the first table its check reads
+def keyFindings(turn, results):
+    tableKeys = {}
+    for name, findings in results.items():
+        keyCheckFindings(turn, name, findings, tableKeys)
+
+#Set the rowKey of one check's findings. tableKeys holds the row keys of the tables already keyed.
+def keyCheckFindings(turn, name, findings, tableKeys):
+    reads = checks[name].reads if name in checks else None
+    if not reads or reads[0] not in turn:
+        return
+    for finding in findings:
+        if finding.row is None:
+            continue
+        if reads[0] not in tableKeys:
+            tableKeys[reads[0]] = turn[reads[0]].rowKeys()
+        finding.rowKey = tableKeys[reads[0]].get(finding.row)
+
+rowNumberPattern = re.compile(r"\b([Rr]ow) \d+")
+
+#{match key: [Finding]} of a check's findings, in order. Findings about a row are matched by the row's content key
+#(its row number without byRowKey), others by unit.
+def matchKeys(findings, byRowKey=True):
+    keyed = {}
+    for finding in findings:
+        if byRowKey and finding.rowKey is not None:
+            key = ("row", finding.rowKey)
+        elif not byRowKey and finding.row is not None:
+            key = ("rowNumber", finding.row)
+        else:
+            key = ("unit", foldCase(finding.unit))
+        keyed.setdefault(key, []).append(finding)
+    return keyed
+
+#Severity and message of a finding with row numbers left out, a finding only moved to another row is unchanged
+def findingText(finding):
+    return (finding.severity, rowNumberPattern.sub(r"\1 #", str(finding.message)))
+
+#Pair the findings of one match key before and after into diff: findings with the same text first, the others in
+#order as changed, what is left over is new or resolved. A unit's findings then stay paired when one of them goes.
+def diffMatched(before, after, diff):
+    #text: indexes into before, last first so the first is popped first
+    byText = {}
+    for i in range(len(before) - 1, -1, -1):
+        byText.setdefault(findingText(before[i]), []).append(i)
+    matched = set()
+    added = []
+    for finding in after:
+        same = byText.get(findingText(finding))
+        if same:
+            matched.add(same.pop())
+        else:
+            added.append(finding)
+    removed = [finding for i, finding in enumerate(before) if i not in matched]
+    diff["changed"].extend(zip(removed, added))
+    diff["new"].extend(added[len(removed):])
+    diff["resolved"].extend(removed[len(added):])
+
+#Difference between two runs' check results, only for the named checks (the ones that were run again):
+#{"new": [Finding], "resolved": [Finding], "changed": [(old Finding, new Finding)]}
+def diffResults(previousResults, results, names):
+    diff = {"new": [], "resolved": [], "changed": []}
+    for name in names:
+        previous = previousResults.get(name, [])
+        #a report written without --diff or watch mode has no row keys, its findings can only be matched by row number
+        byRowKey = all(finding.rowKey is not None for finding in previous if finding.row is not None)
+        before = matchKeys(previous, byRowKey)
+        after = matchKeys(results.get(name, []), byRowKey)
+        for key, findings in after.items():
+            diffMatched(before.get(key, []), findings, diff)
+        for key, findings in before.items():
+            if key not in after:
+                diff["resolved"].extend(findings)
+    return diff
+
+#IncrementalValidator holding an earlier run, previous is a batch report (dict) or the path of an earlier copy of the
+#workbook. Validating the current sheet with it then reruns only the checks whose tables differ.
+def previousValidator(previous, cache=None):
+    if isinstance(previous, dict):
+        return IncrementalValidator.fromReport(previous, cache)
+    validator = IncrementalValidator(cache)
+    turn, results = validator.validate(previous)
+    keyFindings(turn, results)
+    return validator
+
+## Row scans.
+# Checks that look at the rows of one table one at a time are row rules. All the rules of a table are run by one
+# scan that visits each row once and gives it to every rule; the findings of all of them are kept as the table's
+# scan fact ("activitiesScan") and each rule's check returns its own, in row order. A rule function is registered
+# with @rowRule (like @check, plus the table and the columns it is given) and returns (step, finish): step(row,
+# values of the columns, foldCase keys of the folded columns) returns a Finding or None, finish() (may be None) the
+# findings left once every row is seen. Folded columns are folded once per scan and shared by the rules. The time
+# of each rule's start, steps and finish is kept in turn.ruleSeconds so Diagnostics charge it to the rule's check.
+# A rule keeps its own reads and needs, so it is only rerun when they change (the scan then reruns the table's other
+# rules as well, they are cheap next to reading the table again).
+
+#table: [RowRule] in registration order
+rowRules = {}
+
+class RowRule:
+    __slots__ = ("name", "columns", "folded", "needs", "start")
+
+    def __init__(self, name, columns, folded, needs, start):
+        self.name = name
+        self.columns = columns
+        self.folded = folded
+        self.needs = needs
+        self.start = start
+
+def scanFactName(table):
+    return table + "Scan"
+
+#The table's scan fact needs the facts of all of its rules. As the scan runs every rule of the table, each rule's
+#check reads the tables behind all of them.
+def updateScanNeeds(table):
+    scanFact = facts[scanFactName(table)]
+    scanFact.needs = tuple(dict.fromkeys(need for rule in rowRules[table] for need in rule.needs))
+    reads = tableReads((table,), scanFact.needs)
+    for rule in rowRules[table]:
+        checks[rule.name].reads = reads
+
+#Decorator registering a row rule and its check, the table's scan fact is registered with its first rule
+def rowRule(name, category, title, passText, table, columns, folded=(), group=None, needs=()):
+    def register(start):
+        scanName = scanFactName(table)
+        if table not in rowRules:
+            rowRules[table] = []
+            fact(scanName, reads=(table,))(lambda turn: scanTable(turn, table))
+        rowRules[table].append(RowRule(name, tuple(columns), tuple(folded), tuple(needs), start))
+        checks[name] = Check(name, category, title, passText, group, None, tuple(needs) + (scanName,), lambda turn: turn[scanName][name])
+        updateScanNeeds(table)
+        return start
+    return register
+
+#Unregister a row rule and its check (custom rules being reloaded), the scan fact goes with the table's last rule
+def removeRowRule(table, name):
+    rowRules[table] = [rule for rule in rowRules[table] if rule.name != name]
+    checks.pop(name, None)
+    if rowRules[table]:
+        updateScanNeeds(table)
+    else:
+        del rowRules[table]
+        del facts[scanFactName(table)]
+
+#Rows of a table the rules step through together
+scanChunk = 256
+
+#{rule name: [Finding]} of every row rule of a table, in one pass over its rows. Each rule's time is added to
+#turn.ruleSeconds.
+def scanTable(turn, table):
+    data = turn[table]
+    rules = rowRules[table]
+    #the row numbers, the columns and the folded columns the rules ask for, side by side
+    names = [None]
+    sources = [data.rows]
+    keys = {}
+    for rule in rules:
+        for name in rule.columns:
+            if name not in names:
+                names.append(name)
+                sources.append(data.column(name))
+        for name in rule.folded:
+            if ("folded", name) not in names:
+                names.append(("folded", name))
+                sources.append([keys[value] if value in keys else keys.setdefault(value, foldCase(value)) for value in data.column(name)])
+    findings = {}
+    #(step, getter of its arguments from a row, emit) of every rule (every rule has a column, so getters return tuples)
+    calls = []
+    finishes = []
+    clock = time.perf_counter
+    #seconds of each rule, in rules order
+    seconds = []
+    for i, rule in enumerate(rules):
+        start = clock()
+        step, finish = rule.start(turn)
+        ruleFindings = findings[rule.name] = []
+        positions = operator.itemgetter(0, *[names.index(name) for name in rule.columns] + [names.index(("folded", name)) for name in rule.folded])
+        calls.append((step, positions, ruleFindings.append))
+        if finish is not None:
+            finishes.append((i, finish, ruleFindings.extend))
+        seconds.append(clock() - start)
+    #the rows are taken scanChunk at a time and every rule steps through a chunk in turn while it is at hand, so a
+    #rule's time is read off the clock once per chunk rather than once per row
+    rows = zip(*sources)
+    chunk = list(itertools.islice(rows, scanChunk))
+    while chunk:
+        last = clock()
+        for i, (step, positions, emit) in enumerate(calls):
+            for row in chunk:
+                finding = step(*positions(row))
+                if finding is not None:
+                    emit(finding)
+            now = clock()
+            seconds[i] += now - last
+            last = now
+        chunk = list(itertools.islice(rows, scanChunk))
+    for i, finish, emit in finishes:
+        start = clock()
+        emit(finish())
+        seconds[i] += clock() - start
+    for rule, ruleTime in zip(rules, seconds):
+        turn.ruleSeconds[rule.name] = ruleTime
+    return findings
+
+## Derived facts.
+# Data several checks share, computed once per validation when first needed.
+
+#Clan number and the unit lists derived from Valid Units
+@fact("clanNumber", "validClanUnits", "validGMUnits", "validClanTribes", reads=("validUnits", "clan"))
+def clanUnitLists(turn):
+    validUnits = turn["validUnits"].values("unit")
+
+    #Separate GM and Clan units from Valid Units
+    clanNumber = str(turn["clan"].values("unit")[0][1:4])
+    validClanUnits = []
+    validGMUnits = []
+    for i in range(len(validUnits)):
+        if validUnits[i][1:4] == clanNumber:
+            validClanUnits.append(validUnits[i])
+        else:
+            validGMUnits.append(validUnits[i])
+
+    #Select Tribe units from Valid Clan Units
+    validClanTribes = []
+    for i in range(len(validClanUnits)):
+        if len(validClanUnits[i]) == 4:
+            validClanTribes.append(validClanUnits[i])
+
+    return clanNumber, validClanUnits, validGMUnits, validClanTribes
+
+fact("index", reads=("validUnits", "clan"), needs=("validClanUnits",))(buildIndex)
+
+fact("referenceIndex", reads=("validGoods", "validActivities"))(buildReferenceIndex)
+
+fact("ledger", reads=("validUnits", "clan", "transfers"))(buildLedger)
+
+#Post-transfer population of every unit in the ledger: folded unit: population
+@fact("populations", needs=("ledger",))
+def unitPopulations(turn):
+    ledger = turn["ledger"]
+    return {unit: ledgerPopulation(ledger, unit) for unit in ledger}
+
+#Folded units with no people left after transfers (typically absorbed or disbanded)
+@fact("emptyUnits", needs=("populations",))
+def emptyUnits(turn):
+    return frozenset(unit for unit, population in turn["populations"].items() if population == 0)
+
+## Checks.
+
+### Movement and Scouting Tests
+
+#Check for Invalid Units Assigned Movement Orders 
+@check("movementUnits", "Movement and Scouting Orders", "Movement Unit Errors", "No Invalid Units Assigned Movement Orders", reads=("movement",), needs=("index",))
+def checkMovementUnits(turn):
+    index = turn["index"]
+    vErrors = checkValidList(turn["movement"].cells("unit"), index["clanUnits"])
+    return [Finding("error", row, unit, "Invalid Unit " + str(unit) + " assigned movement order on Row " + str(row), suggestValues(unit, index["clanUnits"], index["unitNames"])) for row, unit in vErrors]
+
+#Check for Invalid Units Assigned Scouting Orders
+@check("scoutingUnits", "Movement and Scouting Orders", "Scouting Unit Errors", "No Invalid Units Assigned Scouting Orders", reads=("scouting",), needs=("index",))
+def checkScoutingUnits(turn):
+    index = turn["index"]
+    vErrors = checkValidList(turn["scouting"].cells("unit"), index["clanUnits"])
+    return [Finding("error", row, unit, "Invalid Unit " + str(unit) + " assigned scouting order on Row " + str(row), suggestValues(unit, index["clanUnits"], index["unitNames"])) for row, unit in vErrors]
+
+#Check for scouting missions assigned to unit that is empty after transfers (likely absorbed or disbanded)
+@check("emptyUnitScouting", "Movement and Scouting Orders", "Empty Unit Scouting Errors", "No Scouting Missions Assigned to Empty Units", reads=("scouting",), needs=("emptyUnits",))
+def checkEmptyUnitScouting(turn):
+    emptyUnits = turn["emptyUnits"]
+    vErrors = []
+    for row, unit, *mission in turn["scouting"].project("unit", "scouts", "mission", "missionMore"):
+        if any(x is not None for x in mission):
+            if foldCase(unit) in emptyUnits:
+                errorData = (row, unit)
+                vErrors.append(errorData)
+    
+    return [Finding("error", row, unit, "Likely Error: Unit " + str(unit) + " is empty after transfers and is assigned a scouting mission on row " + str(row)) for row, unit in vErrors]
+
+# Check for Scouting Missions that exceed available warriors post-transfer
+@check("insufficientWarriorsScouting", "Movement and Scouting Orders", "Insufficient Warriors Scouting Errors", "No Scouting Missions Exceed Available Warriors", reads=("scouting",), needs=("ledger",))
+def checkInsufficientWarriorsScouting(turn):
+    ledger = turn["ledger"]
+
+    #total scouts sent by each unit (case folded): [unit as first spelled, total, row the total first exceeded its warriors]
+    scoutingUnits = {}
+    for row, currentUnit, scouts in turn["scouting"].project("unit", "scouts"):
+        scouts = toCount(scouts)
+        if scouts is not None:
+            key = foldCase(currentUnit)
+            if key not in scoutingUnits:
+                scoutingUnits[key] = [currentUnit, 0, None]
+            total = scoutingUnits[key]
+            total[1] += scouts
+            if total[2] is None:
+                warriors = ledgerCount(ledger, currentUnit, "WARRIORS")
+                if warriors is not None and total[1] > warriors:
+                    total[2] = row
+
+    vErrors = []
+    for unit, value, row in scoutingUnits.values():
+        if row is not None:
+            warriors = ledgerCount(ledger, unit, "WARRIORS")
+            vErrors.append(Finding("error", row, unit, "Unit " + str(unit) + " assigned " + str(value) + " scouts but has " + str(warriors) + " warriors after transfers"))
+
+    return vErrors
+
+### Skill and Research Tests
+
+#Check for Invalid Units Assigned Skill Attempts
+@check("skillUnits", "Skill and Research Orders", "Skill Attempt Unit Errors", "No Invalid Units Assigned Skill Attempts", reads=("skills",), needs=("index",))
+def checkSkillUnits(turn):
+    index = turn["index"]
+    vErrors = checkValidList(turn["skills"].cells("unit"), index["tribes"])
+    return [Finding("error", row, unit, "Invalid Unit " + str(unit) + " assigned skill attempt on Row " + str(row), suggestValues(unit, index["tribes"], index["unitNames"])) for row, unit in vErrors]
+
+#check for Tribes assigned more than three skill attempts
+@check("excessSkillAttempts", "Skill and Research Orders", "Tribes Assigned Excess Skill Attempts Errors", "No Tribe Assigned More Than Three Skill Attempts", reads=("skills",))
+def checkExcessSkillAttempts(turn):
+    skillAttemptTrack = {}
+    vErrors = {}
+    for i in turn["skills"].values("unit"):
+        if i in skillAttemptTrack:
+            skillAttemptTrack[i] += 1
+        else:
+            skillAttemptTrack[i] = 1
+
+    for key, value in skillAttemptTrack.items():
+        if value > 3:
+            vErrors[key] = value
+
+    return [Finding("error", None, key, "Tribe " + str(key) + " assigned " + str(value) + " skill attempts") for key, value in vErrors.items()]
+    
+#check for duplicate Tribe/Skill attempts
+@check("duplicateSkillAttempts", "Skill and Research Orders", "Duplicate Tribe/Skill Attempts Errors", "No Tribe Attempting Duplicate Skills", reads=("skills",))
+def checkDuplicateSkillAttempts(turn):
+    skillAttemptTrack = []
+    vErrors = []
+    for row, unit, topic in turn["skills"].project("unit", "topic"):
+        checkAttempt = [unit, str(topic).upper()]
+        if checkAttempt in skillAttemptTrack:
+            vErrors.append((row, checkAttempt))
+        else:
+            skillAttemptTrack.append(checkAttempt)
+    return [Finding("error", row, attempt[0], "Tribe " + str(attempt[0]) + " duplicate attempts for skill " + str(attempt[1])) for row, attempt in vErrors]
+
+#check for skill attempts with same priority for Tribe
+@check("duplicateSkillPriority", "Skill and Research Orders", "Duplicate Skill Attempt Priority Errors", "No Tribe Attempting Skills At Same Priority", reads=("skills",))
+def checkDuplicateSkillPriority(turn):
+    skillAttemptTrack = []
+    vErrors = []
+    for row, unit, order in turn["skills"].project("unit", "order"):
+        checkAttempt = [unit, order]
+        if checkAttempt in skillAttemptTrack:
+            vErrors.append((row, checkAttempt))
+        else:
+            skillAttemptTrack.append(checkAttempt)
+    return [Finding("error", row, attempt[0], "Tribe " + str(attempt[0]) + " attempting multiple skills at priority " + str(attempt[1])) for row, attempt in vErrors]
+        
+#Check for Invalid Units Assigned Research Attempts
+@check("researchUnits", "Skill and Research Orders", "Research Attempt Unit Errors", "No Invalid Units Assigned Research Attempts", reads=("research",), needs=("index",))
+def checkResearchUnits(turn):
+    index = turn["index"]
+    vErrors = checkValidList(turn["research"].cells("unit"), index["tribes"])
+    return [Finding("error", row, unit, "Invalid Unit " + str(unit) + " assigned research attempt on Row " + str(row), suggestValues(unit, index["tribes"], index["unitNames"])) for row, unit in vErrors]
+
+### Activity Tests
+# Activity and transfer checks are row rules (see Row scans): the Tribes_Activities and Transfers sheets are each
+# scanned once for all of them.
+
+#Check for Invalid Units Assigned Activities
+#Check clan tab first because new units ordinariliy should not perform activities. If unit is on valid list, give warning (converted unit, scouting orders). If not on valid list, give error.
+@rowRule("activityInvalidUnits", "Activity Orders", "Invalid Unit Assigned Activity [Error]", "No Invalid Units Assigned Activity Orders", "activities", ("unit",), ("unit",), group="Activity Orders Unit Issue", needs=("index",))
+def checkActivityInvalidUnits(turn):
+    index = turn["index"]
+    turnStartUnits = index["turnStartUnits"]
+    clanUnits = index["clanUnits"]
+
+    def step(row, unit, unitKey):
+        if unit is not None and unitKey not in turnStartUnits and unitKey not in clanUnits:
+            return Finding("error", row, unit, "Invalid Unit " + str(unit) + " assigned activity order on Row " + str(row), suggestValues(unit, clanUnits, index["unitNames"]))
+    return step, None
+
+@rowRule("activityNewUnits", "Activity Orders", "New Unit Assigned Activity [Warning/Informational]", "No New Units Assigned Activity Orders", "activities", ("unit",), ("unit",), group="Activity Orders Unit Issue", needs=("index",))
+def checkActivityNewUnits(turn):
+    turnStartUnits = turn["index"]["turnStartUnits"]
+    clanUnits = turn["index"]["clanUnits"]
+
+    def step(row, unit, unitKey):
+        if unit is not None and unitKey not in turnStartUnits and unitKey in clanUnits:
+            return Finding("warning", row, unit, "New Unit " + str(unit) + " assigned activity order on Row " + str(row))
+    return step, None
+   
+#Check for invalid Activities
+@rowRule("activityItems", "Activity Orders", "Activity Orders Item/Distinction Errors", "No Activity Item/Distinction Errors Found", "activities", ("unit", "activity", "item", "distinction"), ("activity", "item", "distinction"), needs=("referenceIndex",))
+def checkActivityItems(turn):
+    referenceIndex = turn["referenceIndex"]
+    validActivities = referenceIndex["activities"]
+
+    def step(row, unit, activity, item, distinction, activityKey, itemKey, distinctionKey):
+        casedActivity = (activityKey, itemKey, distinctionKey)
+        
+        if casedActivity not in validActivities:     
+            return Finding("error", row, unit, "Invalid Item/Distinction on Row " + str(row) + ", Activity " + str(activity) + ": " + str(item) + " / " + str(distinction),
+                           suggestActivities(activity, item, distinction, referenceIndex))
+    return step, None
+
+#check for Activity Discontinuity
+@rowRule("activityDiscontinuity", "Activity Orders", "Activity Order Discontinuity Errors", "No Activity Order Discontinuity Detected", "activities", ("unit",))
+def checkActivityDiscontinuity(turn):
+    actAssignedUnits = set()
+    curUnit = None
+
+    #a unit's run of activity rows (rows without a unit don't end it) is a discontinuity if the unit had an earlier run
+    def step(row, unit):
+        nonlocal curUnit
+        if unit is None or unit == curUnit:
+            return None
+        curUnit = unit
+        if unit in actAssignedUnits:
+            return Finding("error", row, unit, "Unit " + str(unit) + " assigned non-contiguous activity order on Row " + str(row))
+        actAssignedUnits.add(unit)
+    return step, None
+
+#check for Activities assigned no workers
+@rowRule("activityNullWorkers", "Activity Orders", "Activity Null Worker Errors", "No Activities With Fewer than 1 Worker Assigned", "activities", ("unit", "activity", "people", "slaves", "specialists"))
+def checkActivityNullWorkers(turn):
+
+    #blank worker cells count as 0 (most slaves and specialists cells are blank, skipped without raising)
+    def step(row, unit, activity, people, slaves, specialists):
+        peopleCount = 0
+        for workers in (people, slaves, specialists):
+            if workers is not None:
+                try:
+                    peopleCount += int(workers)
+                except:
+                    peopleCount += 0
+    
+        if peopleCount <= 0:
+            return Finding("error", row, unit, "Fewer than 1 Worker Assigned to Unit " + str(unit).lower() + " Activity " + str(activity) + " on Row " + str(row))
+    return step, None
+
+#check for Activities assigned more workers than the unit has people after transfers
+@rowRule("activityWorkers", "Activity Orders", "Activity Worker Errors", "No Unit Assigned More Workers Than Its Population", "activities", ("unit", "people"), ("unit",), needs=("populations",))
+def checkActivityWorkers(turn):
+    populations = turn["populations"]
+
+    #total workers (first worker column, slaves/specialists are not part of the population) assigned by each unit
+    #(case folded): [unit as first spelled, total, row the total first exceeded the unit's population]
+    unitWorkers = {}
+
+    def step(row, currentUnit, workers, unitKey):
+        workers = toCount(workers)
+        if workers is not None:
+            if unitKey not in unitWorkers:
+                unitWorkers[unitKey] = [currentUnit, 0, None]
+            total = unitWorkers[unitKey]
+            total[1] += workers
+            if total[2] is None:
+                population = populations.get(unitKey)
+                if population is not None and population > 0 and total[1] > population:
+                    total[2] = row
+
+    def finish():
+        vErrors = []
+        for key, (unit, value, row) in unitWorkers.items():
+            if row is not None:
+                vErrors.append(Finding("error", row, unit, "Unit " + str(unit) + " assigned " + str(value) + " workers to activities but has a population of " + str(populations[key]) + " after transfers"))
+        return vErrors
+
+    return step, finish
+
+#check for Activities assigned to Unit that is Empty after transfers (likely absorbed our disbanded but persisting)
+#New units are left to activityNewUnits
+@rowRule("emptyUnitActivity", "Activity Orders", "Empty Unit Activity Errors", "No Activities Assigned to Empty Units", "activities", ("unit", "activity"), ("unit",), needs=("emptyUnits", "index"))
+def checkEmptyUnitActivity(turn):
+    emptyUnits = turn["emptyUnits"]
+    turnStartUnits = turn["index"]["turnStartUnits"]
+
+    def step(row, unit, activity, unitKey):
+        if unitKey in emptyUnits and unitKey in turnStartUnits:
+            return Finding("error", row, unit, "Likely Error: Unit " + str(unit) + " is empty after transfers and is assigned activity " + str(activity) + " on row " + str(row))
+    return step, None
+
+### Transfer Tests
+
+#check for at least one Clan unit in each transfer
+@rowRule("transferUnits", "Transfer Orders", "Invalid Transfer Unit Errors", "No Transfer Orders Without Clan Unit", "transfers", ("fromUnit",), ("fromUnit", "toUnit"), needs=("index",))
+def checkTransferUnits(turn):
+    clanUnits = turn["index"]["clanUnits"]
+
+    def step(row, fromUnit, fromKey, toKey):
+        if fromKey not in clanUnits and toKey not in clanUnits:
+            return Finding("error", row, fromUnit, "Transfer order on Row " + str(row) + " has no valid Clan unit")
+    return step, None
+
+#check for transfers from non-Clan/GM Units (not a valid transfer order, error)
+@rowRule("transfersFromNonClan", "Transfer Orders", "Transfers From Non-Clan/GM Units [Error]", "No Transfers From Non-Clan/GM Units", "transfers", ("fromUnit", "toUnit"), ("fromUnit",), needs=("index",))
+def checkTransfersFromNonClan(turn):
+    index = turn["index"]
+    validUnits = index["validUnits"]
+
+    def step(row, fromUnit, toUnit, fromKey):
+        if fromKey not in validUnits:
+            return Finding("error", row, fromUnit, "Transfer From Non-Clan/GM Unit " + str(fromUnit) + " to Unit " + str(toUnit) + " on Row " + str(row), suggestValues(fromUnit, validUnits, index["unitNames"]))
+    return step, None
+
+#check for transfers to non-Clan Units (valid but worth reviewing for mistakes, warning)
+@rowRule("transfersToNonClan", "Transfer Orders", "Transfers to Non-Clan/GM Units [Warning/Informational]", "No Transfers To Non-Clan/GM Units", "transfers", ("fromUnit", "toUnit"), ("toUnit",), needs=("index",))
+def checkTransfersToNonClan(turn):
+    index = turn["index"]
+    validUnits = index["validUnits"]
+
+    def step(row, fromUnit, toUnit, toKey):
+        if toKey not in validUnits:
+            return Finding("warning", row, toUnit, "Transfer To Non-Clan/GM Unit " + str(toUnit) + " from Unit " + str(fromUnit) + " on Row " + str(row), suggestValues(toUnit, validUnits, index["unitNames"]))
+    return step, None
+
+#check for invalid goods in transfers
+@rowRule("transferGoods", "Transfer Orders", "Invalid Transfer Goods Errors", "No Invalid Goods in Transfer Orders", "transfers", ("fromUnit", "item"), ("item",), needs=("referenceIndex",))
+def checkTransferGoods(turn):
+    referenceIndex = turn["referenceIndex"]
+    validGoods = referenceIndex["goods"]
+
+    def step(row, fromUnit, item, itemKey):
+        if itemKey not in validGoods:
+            return Finding("error", row, fromUnit, "Invalid Good " + str(item) + " on Row " + str(row), suggestValues(item, validGoods, referenceIndex["goodNames"]))
+    return step, None
+
+## Custom rule files.
+# Alliance specific rules are loaded from JSON rule files (--rules FILE, or TNVALIDATOR_RULES with the files
+# separated by os.pathsep) instead of being written into the script. Every rule is a row rule (see Row scans) of
+# its table, run in the same scan of the sheet as the built-in checks. A rule file is {"rules": [rule, ...]}:
+#   name, title, table, message   required. table is a Sheet layouts table ("transfers", "skills", ...).
+#   passText, group, category     report texts as for @check, category defaults to "Custom Rules"
+#   severity                      "error" (default) or "warning"
+#   unit                          column reported as the findings' unit (default the table's unit or fromUnit column)
+#   where                         [condition, ...] that must all hold for a row to be looked at (default every row)
+#   count                         {"by": column(s), "min": n, "max": n, "over": list}: the rows of every group are
+#                                 counted and groups outside min..max reported, groups of the over list without rows
+#                                 count as 0
+#   unique                        [column, ...]: rows repeating an earlier row's values in these columns are reported
+# Rules without count or unique report every row the conditions hold for. A condition is {"column": column,
+# test: value} with one of the tests "equals", "oneOf" (a list), "in" (a list of ruleSets), "blank" (true or
+# false), "matches" (a regular expression) or "<", "<=", ">", ">=" (numbers), plus "not": true to negate it, or
+# {"any": [condition, ...]}. Text is compared case insensitively. message is filled in with the row's columns
+# ("{unit}", "{row}"), count messages with the group's columns and "{count}".
+# A file is parsed and compiled into closures once for each content (cached by its hash), loading it again is free
+# unless it was edited.
+
+class RuleFileError(Exception):
+    pass
+
+#Category of the rules that don't give one
+customCategory = "Custom Rules"
+
+#Unit and good lists conditions and counts can use: name: (fact, key of the list in the fact, None for the fact)
+ruleSets = {
+    "validUnits": ("index", "validUnits"),
+    "clanUnits": ("index", "clanUnits"),
+    "gmUnits": ("index", "gmUnits"),
+    "tribes": ("index", "tribes"),
+    "turnStartUnits": ("index", "turnStartUnits"),
+    "emptyUnits": ("emptyUnits", None),
+    "goods": ("referenceIndex", "goods"),
+}
+
+ruleTests = ("equals", "oneOf", "in", "blank", "matches", "<", "<=", ">", ">=")
+
+#Folded keys of a ruleSets list
+def ruleSet(turn, name):
+    factName, key = ruleSets[name]
+    return turn[factName] if key is None else turn[factName][key]
+
+#Number in a cell for the comparison tests, None if it isn't one
+def ruleNumber(value):
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(str(value).strip())
+    except ValueError:
+        return None
+
+#A compiled rule, registered with rowRule: start(turn) returns its (step, finish)
+class CustomRule:
+    __slots__ = ("name", "category", "title", "passText", "group", "table", "columns", "needs", "start")
+
+    def __init__(self, name, category, title, passText, group, table, columns, needs, start):
+        self.name = name
+        self.category = category
+        self.title = title
+        self.passText = passText
+        self.group = group
+        self.table = table
+        self.columns = columns
+        self.needs = needs
+        self.start = start
+
+#Position of a column among the columns a rule is given, adding it the first time
+def ruleColumn(columns, tableColumns, column, where):
+    if column not in tableColumns:
+        raise RuleFileError(where + ": unknown column " + repr(column) + ", use " + ", ".join(tableColumns))
+    if column not in columns:
+        columns.append(column)
+    return columns.index(column)
+
+#(needs, bind) of one test: bind(turn, cell, key) returns test(values), cell and key being the positions of the
+#tested cell and its folded key in a row's values
+def compileTest(test, value, where):
+    if test == "equals":
+        target = foldCase(value)
+        return (), lambda turn, cell, key: lambda values: values[key] == target
+    if test == "oneOf":
+        if not isinstance(value, list):
+            raise RuleFileError(where + ": oneOf needs a list")
+        targets = frozenset(foldCase(x) for x in value)
+        return (), lambda turn, cell, key: lambda values: values[key] in targets
+    if test == "in":
+        if value not in ruleSets:
+            raise RuleFileError(where + ": unknown list " + repr(value) + ", use " + ", ".join(ruleSets))
+        def bind(turn, cell, key):
+            members = ruleSet(turn, value)
+            return lambda values: values[key] in members
+        return (ruleSets[value][0],), bind
+    if test == "blank":
+        blank = bool(value)
+        return (), lambda turn, cell, key: lambda values: (values[cell] is None) == blank
+    if test == "matches":
+        try:
+            pattern = re.compile(str(value), re.I)
+        except re.error as e:
+            raise RuleFileError(where + ": bad regular expression " + repr(value) + ": " + str(e))
+        return (), lambda turn, cell, key: lambda values: values[cell] is not None and pattern.fullmatch(str(values[cell])) is not None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RuleFileError(where + ": " + test + " needs a number")
+    compare = comparisonOps[test]
+    def bindCompare(turn, cell, key):
+        def test(values):
+            number = ruleNumber(values[cell])
+            return number is not None and compare((number > value) - (number < value))
+        return test
+    return (), bindCompare
+
+#(needs, bind) of a condition: bind(turn, width) returns test(values), values being a row's cells followed by their
+#folded keys (width cells each)
+def compileCondition(condition, columns, tableColumns, where):
+    if not isinstance(condition, dict):
+        raise RuleFileError(where + ": a condition must be an object")
+    if "any" in condition:
+        if not isinstance(condition["any"], list):
+            raise RuleFileError(where + ": any needs a list of conditions")
+        parts = [compileCondition(part, columns, tableColumns, where) for part in condition["any"]]
+        def bindAny(turn, width):
+            tests = [bind(turn, width) for needs, bind in parts]
+            return lambda values: any(test(values) for test in tests)
+        return tuple(need for needs, bind in parts for need in needs), bindAny
+    tests = [test for test in ruleTests if test in condition]
+    if len(tests) != 1:
+        raise RuleFileError(where + ": a condition needs one of " + ", ".join(ruleTests))
+    position = ruleColumn(columns, tableColumns, condition.get("column"), where)
+    needs, bindTest = compileTest(tests[0], condition[tests[0]], where)
+    if not condition.get("not", False):
+        return needs, lambda turn, width: bindTest(turn, position, width + position)
+    def bindNot(turn, width):
+        test = bindTest(turn, position, width + position)
+        return lambda values: not test(values)
+    return needs, bindNot
+
+#Columns a message is filled in with
+def messageFields(message, allowed, where):
+    fields = []
+    try:
+        for text, field, spec, conversion in string.Formatter().parse(message):
+            if field is not None and field not in fields:
+                fields.append(field)
+    except ValueError as e:
+        raise RuleFileError(where + ": bad message: " + str(e))
+    for field in fields:
+        if field not in allowed:
+            raise RuleFileError(where + ": message field {" + field + "} isn't one of " + ", ".join(allowed))
+    return fields
+
+#List of column names given as a name or a list
+def ruleColumnList(value, key, where):
+    value = [value] if isinstance(value, str) else value
+    if not isinstance(value, list) or not value:
+        raise RuleFileError(where + ": " + key + " needs a column or a list of columns")
+    return value
+
+def compileRule(spec, where):
+    if not isinstance(spec, dict):
+        raise RuleFileError(where + ": a rule must be an object")
+    for key in ("name", "title", "table", "message"):
+        if not isinstance(spec.get(key), str):
+            raise RuleFileError(where + ": " + key + " is required")
+    name = spec["name"]
+    where += " (" + name + ")"
+    table = spec["table"]
+    tableColumns = []
+    for layout in sheetLayouts.values():
+        if table in layout:
+            tableColumns.extend(column for column in layout[table][1] if column not in tableColumns)
+    if not tableColumns:
+        raise RuleFileError(where + ": unknown table " + repr(table) + ", use " + ", ".join(sheetLayouts["TN3"]))
+    severity = spec.get("severity", "error")
+    if severity not in ("error", "warning"):
+        raise RuleFileError(where + ": severity must be error or warning")
+    conditions = spec.get("where", [])
+    if not isinstance(conditions, list):
+        raise RuleFileError(where + ": where needs a list of conditions")
+    message = spec["message"]
+
+    columns = []
+    needs = []
+    binds = []
+    for condition in conditions:
+        conditionNeeds, bind = compileCondition(condition, columns, tableColumns, where)
+        needs.extend(need for need in conditionNeeds if need not in needs)
+        binds.append(bind)
+    unitColumn = spec.get("unit", "unit" if "unit" in tableColumns else tableColumns[0])
+    unitPosition = ruleColumn(columns, tableColumns, unitColumn, where)
+
+    #the where conditions bound to a turn, a row is looked at when all of them hold
+    def rowTests(turn):
+        width = len(columns)
+        return [bind(turn, width) for bind in binds]
+
+    if "count" in spec:
+        count = spec["count"]
+        if not isinstance(count, dict):
+            raise RuleFileError(where + ": count must be an object")
+        by = ruleColumnList(count.get("by"), "count by", where)
+        byPositions = [ruleColumn(columns, tableColumns, column, where) for column in by]
+        minimum = count.get("min")
+        maximum = count.get("max")
+        if minimum is None and maximum is None:
+            raise RuleFileError(where + ": count needs min or max")
+        over = count.get("over")
+        if over is not None:
+            if over not in ruleSets or len(by) != 1:
+                raise RuleFileError(where + ": count over needs one by column and one of " + ", ".join(ruleSets))
+            needs.extend(need for need in (ruleSets[over][0],) if need not in needs)
+        messageFields(message, by + ["count"], where)
+
+        def start(turn):
+            tests = rowTests(turn)
+            width = len(columns)
+            counts = {}
+            groups = {}
+
+            def step(row, *values):
+                for test in tests:
+                    if not test(values):
+                        return None
+                if any(values[p] is None for p in byPositions):
+                    return None
+                key = tuple(values[width + p] for p in byPositions)
+                if key in counts:
+                    counts[key] += 1
+                else:
+                    counts[key] = 1
+                    groups[key] = {column: values[p] for column, p in zip(by, byPositions)}
+
+            def finish():
+                if over is not None:
+                    for key in sorted(ruleSet(turn, over)):
+                        if (key,) not in counts:
+                            counts[(key,)] = 0
+                            groups[(key,)] = {by[0]: key}
+                findings = []
+                for key, n in counts.items():
+                    if (minimum is not None and n < minimum) or (maximum is not None and n > maximum):
+                        fields = dict(groups[key], count=n)
+                        findings.append(Finding(severity, None, fields.get(unitColumn), message.format_map(fields)))
+                return findings
+            return step, finish
+
+    elif "unique" in spec:
+        unique = ruleColumnList(spec["unique"], "unique", where)
+        uniquePositions = [ruleColumn(columns, tableColumns, column, where) for column in unique]
+        fields = messageFields(message, tableColumns + ["row"], where)
+        fieldPositions = [(field, ruleColumn(columns, tableColumns, field, where)) for field in fields if field != "row"]
+
+        def start(turn):
+            tests = rowTests(turn)
+            width = len(columns)
+            seen = set()
+
+            def step(row, *values):
+                for test in tests:
+                    if not test(values):
+                        return None
+                if any(values[p] is None for p in uniquePositions):
+                    return None
+                key = tuple(values[width + p] for p in uniquePositions)
+                if key not in seen:
+                    seen.add(key)
+                    return None
+                return Finding(severity, row, values[unitPosition], message.format_map(dict(((field, values[p]) for field, p in fieldPositions), row=row)))
+            return step, None
+
+    else:
+        fields = messageFields(message, tableColumns + ["row"], where)
+        fieldPositions = [(field, ruleColumn(columns, tableColumns, field, where)) for field in fields if field != "row"]
+
+        def start(turn):
+            tests = rowTests(turn)
+
+            def step(row, *values):
+                for test in tests:
+                    if not test(values):
+                        return None
+                return Finding(severity, row, values[unitPosition], message.format_map(dict(((field, values[p]) for field, p in fieldPositions), row=row)))
+            return step, None
+
+    return CustomRule(name, spec.get("category", customCategory), spec["title"], spec.get("passText"), spec.get("group"), table, tuple(columns), tuple(needs), start)
+
+#Compiled rules of rule file contents: content hash: [CustomRule]
+ruleFileCache = {}
+
+#(path, content hash) of the rule files whose rules are registered, (table, name) of those rules and the report
+#categories added for them
+loadedRuleFiles = ()
+customRules = []
+customCategories = []
+
+#Rule files to load, from --rules or TNVALIDATOR_RULES (worker processes get them from the environment)
+def ruleFilePaths():
+    return [path for path in os.environ.get("TNVALIDATOR_RULES", "").split(os.pathsep) if path]
+
+#(content hash, [CustomRule]) of a rule file's contents, compiled the first time they are seen
+def compileRuleFile(path, data):
+    key = hashlib.blake2b(data, digest_size=16).hexdigest()
+    if key not in ruleFileCache:
+        try:
+            spec = json.loads(data.decode("utf-8-sig"))
+        except ValueError as e:
+            raise RuleFileError(str(path) + ": not a JSON rule file: " + str(e))
+        if not isinstance(spec, dict) or not isinstance(spec.get("rules"), list):
+            raise RuleFileError(str(path) + ": a rule file is {\"rules\": [rule, ...]}")
+        ruleFileCache[key] = [compileRule(rule, str(path) + ": rule " + str(i)) for i, rule in enumerate(spec["rules"], 1)]
+    return key, ruleFileCache[key]
+
+#Register the rules of the rule files in place of the ones loaded before, nothing is done when the files are the
+#same as last time
+def loadRuleFiles(paths):
+    global loadedRuleFiles
+    files = []
+    rules = []
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            raise RuleFileError("Could not read rule file " + str(path) + ": " + str(e))
+        key, fileRules = compileRuleFile(path, data)
+        files.append((str(path), key))
+        rules.extend(fileRules)
+    if tuple(files) == loadedRuleFiles:
+        return
+
+    names = set()
+    for rule in rules:
+        if rule.name in names or (rule.name in checks and not any(name == rule.name for table, name in customRules)):
+            raise RuleFileError("Rule " + repr(rule.name) + " is defined twice or is the name of a built-in check")
+        names.add(rule.name)
+
+    with registryLock:
+        for table, name in customRules:
+            removeRowRule(table, name)
+        for category in customCategories:
+            categoryOrder.remove(category)
+        customRules.clear()
+        customCategories.clear()
+        for rule in rules:
+            if rule.category not in categoryOrder:
+                categoryOrder.append(rule.category)
+                customCategories.append(rule.category)
+            rowRule(rule.name, rule.category, rule.title, rule.passText, rule.table, rule.columns, rule.columns, rule.group, rule.needs)(rule.start)
+            customRules.append((rule.table, rule.name))
+        loadedRuleFiles = tuple(files)
+
+## GUI.
+
+#Fill the report tree from the check results
+def showReport(treeview, turn, results):
+    showUnits(treeview, turn)
+    for category in categoryOrder:
+        showCategory(treeview, category, results)
+
+#Valid Units branch, always the first node of the report
+def showUnits(treeview, turn):
+    vuRoot = treeview.insert("",0,text="Valid Units")
+    for title, units in (("Valid Clan Units", turn["validClanUnits"]), ("Valid Clan Tribes", turn["validClanTribes"]), ("Valid GM Units", turn["validGMUnits"])):
+        unitRoot = treeview.insert(vuRoot,tk.END,text=title)
+        if units:
+            rows = [(str(unit), ()) for unit in units]
+            lazyNode(treeview, unitRoot, lambda treeview, iid, rows=rows: showRows(treeview, iid, rows))
+
+#Category title colored by its worst finding, failed check titles colored by level, pass messages in blue.
+#results needs the findings of the category's checks only, index places the category node (default last).
+def showCategory(treeview, category, results, index=None):
+    catChecks = [chk for chk in checks.values() if chk.category == category and chk.name in results]
+    catRoot = treeview.insert("",tk.END if index is None else index,text=category)
+    catLevel = worstLevel([finding for chk in catChecks for finding in results[chk.name]])
+    if catLevel != "pass":
+        treeview.item(catRoot, tags=catLevel)
+    if catChecks:
+        lazyNode(treeview, catRoot, lambda treeview, iid: showChecks(treeview, iid, catChecks, results))
+
+#Check titles (open) with their findings under an opened category node
+def showChecks(treeview, catRoot, catChecks, results):
+    groupRoots = {}
+    for chk in catChecks:
+        findings = results[chk.name]
+        parent = catRoot
+        if chk.group is not None:
+            if chk.group not in groupRoots:
+                groupRoots[chk.group] = treeview.insert(catRoot,tk.END,text=chk.group, open=True)
+            parent = groupRoots[chk.group]
+        errRoot = treeview.insert(parent,tk.END,text=chk.title, open=True)
+        level = worstLevel(findings)
+        if level != "pass":
+            treeview.item(errRoot, tags=level)
+        if len(findings) == 0:
+            if chk.passText is not None:
+                treeview.insert(errRoot, tk.END, text=chk.passText, tags="pass")
+        else:
+            showRows(treeview, errRoot, [(finding.text(), ()) for finding in findings])
+
+#Diagnostics branch at the end of the report: total time, then every phase in the order it ran
+def showDiagnostics(treeview, diagnostics):
+    diagRoot = treeview.insert("",tk.END,text="Diagnostics")
+    rows = [("Total: " + format(diagnostics.totalSeconds() * 1000, ".2f") + " ms", ())]
+    rows.extend((phase.describe(), ()) for phase in diagnostics.phases)
+    lazyNode(treeview, diagRoot, lambda treeview, iid: showRows(treeview, iid, rows))
+
+## GUI report tree.
+# Reports can have thousands of units and findings, so the tree is filled lazily: a node's children are inserted
+# the first time it is opened (it has an empty placeholder child until then so it can be opened), and long lists
+# are inserted pageSize rows at a time with a "Show next" node that inserts the next page when selected. Opening a
+# report or a node inserts a bounded number of rows however many findings there are.
+
+pageSize = 200
+#iid of a node whose children haven't been inserted yet: function(treeview, iid) inserting them
+lazyNodes = {}
+#iid of a "Show next" node: (parent, rows, start of the next page)
+moreNodes = {}
+
+#Insert a node's children with fill(treeview, iid) when it is first opened
+def lazyNode(treeview, iid, fill):
+    lazyNodes[iid] = fill
+    treeview.insert(iid, tk.END, text="")
+
+def fillNode(treeview, iid):
+    fill = lazyNodes.pop(iid, None)
+    if fill is not None:
+        treeview.delete(*treeview.get_children(iid))
+        fill(treeview, iid)
+
+#Insert one page of (text, tags) rows under parent, followed by a "Show next" node if there are more
+def showRows(treeview, parent, rows, start=0):
+    for text, tags in rows[start:start+pageSize]:
+        treeview.insert(parent, tk.END, text=text, tags=tags)
+    remaining = len(rows) - start - pageSize
+    if remaining > 0:
+        more = treeview.insert(parent, tk.END, text="Show next " + str(min(pageSize, remaining)) + " (" + str(remaining) + " more)", tags="more")
+        moreNodes[more] = (parent, rows, start + pageSize)
+
+def showMore(treeview, iid):
+    parent, rows, start = moreNodes.pop(iid)
+    treeview.delete(iid)
+    showRows(treeview, parent, rows, start)
+
+#Forget the lazy nodes of a cleared tree
+def resetLazyNodes():
+    lazyNodes.clear()
+    moreNodes.clear()
+
+#tree node opened
+def tree_open(event):
+    treeview = event.widget
+    fillNode(treeview, treeview.focus())
+
+#tree node selected (clicked or reached with the arrow keys)
+def tree_select(event):
+    treeview = event.widget
+    for iid in treeview.selection():
+        if iid in moreNodes:
+            showMore(treeview, iid)
+
+#(order sheet path, turn, results) of the report shown, for "Save Report"
+shownReport = None
+
+#Remember the finished report and let it be saved
+def reportDone(path, turn, results):
+    global shownReport
+    shownReport = (path, turn, results)
+    saveButton.config(state="normal")
+
+#save report button: the shown report as HTML, CSV, JSON Lines or SARIF by the extension chosen
+def save_report():
+    if shownReport is None:
+        return
+    path, turn, results = shownReport
+    savePath = fd.asksaveasfilename(
+        title="Save Report",
+        initialfile=path.stem + ".html",
+        defaultextension=".html",
+        filetypes=[("HTML Report", "*.html"), ("CSV", "*.csv"), ("JSON Lines", "*.jsonl"), ("SARIF", "*.sarif")])
+    if not savePath:
+        return
+    try:
+        exportResults(exporterFor(savePath), path, turn, results)
+    except OSError as e:
+        showerror("Save Report", "Could not save the report: " + str(e))
+
+#main loop called when an order sheet is selected
+def select_file():
+
+    filetypes = [('TN3 XLSX Turnsheet', '*.xlsx')]
+    
+    #For when XLS support is added
+    #filetypes = (
+    #   ('TN3 XLSX Turnsheet', '*.xlsx'),
+    #    ('TN3 XLS Turnsheet', '*.xls')
+    #)
+
+    ordersPath = fd.askopenfilename(
+        title='Select TN3 Order File',
+        filetypes=filetypes)
+    
+    #If no file is selected, bug out
+    if ordersPath == "":
+        return None
+    
+    openReport(pathlib.Path(ordersPath))
+
+#destroy any existing results frame
+def clearReport():
+    for widget in root.winfo_children():
+        if isinstance(widget, tk.Frame):
+            widget.destroy()
+            root.geometry('600x200')
+            root.update()
+
+#Build the results window for an order sheet and start validating it, the report fills in as checks finish
+def openReport(path):
+    global reportTree
+    global versionLabel
+    global statusLabel
+    global progressRow
+    global progressBar
+    global cancelButton
+    global saveButton
+    global watcher
+    global shownReport
+
+    #destroy any existing frame if this is a second run
+    stopWatch()
+    cancelValidation()
+    watcher = None
+    shownReport = None
+    clearReport()
+
+    if path.suffix != ".xlsx":
+        return None
+
+    #build results window
+
+    results = tk.Frame(root)
+    results.pack(fill = "both", expand = True)
+
+    style = ttk.Style()
+    style.configure("Treeview", font=("Arial", fontsize), rowheight=int(fontsize*2.2))
+    
+    treeview = ttk.Treeview(results, show="tree")
+    treeview.column("#0", width=550, stretch=True)
+    treescroll=ttk.Scrollbar(results, orient="vertical", command=treeview.yview)
+    treeview.configure(yscrollcommand=treescroll.set)
+    treeview.tag_configure("error", foreground="red")
+    treeview.tag_configure("warning", foreground="orange")
+    treeview.tag_configure("pass", foreground="blue")
+    treeview.tag_configure("old", font=("Arial", 12))
+    treeview.tag_configure("more", foreground="gray")
+    treeview.bind("<<TreeviewOpen>>", tree_open)
+    treeview.bind("<<TreeviewSelect>>", tree_select)
+    resetLazyNodes()
+    root.geometry('600x750')
+    titleMessage= "Validating File: " + path.name
+    tk.Label(results, text=titleMessage, font=("Arial", 12, "bold")).pack()
+    versionLabel = tk.Label(results, text="", font=("Arial", 12, "bold"))
+    versionLabel.pack()
+    statusLabel = tk.Label(results, text="")
+    statusLabel.pack()
+    saveButton = tk.Button(results, text="Save Report", command=save_report, state="disabled")
+    saveButton.pack()
+
+    #progress bar and cancel button, only shown while a validation is running
+    progressRow = tk.Frame(results)
+    progressBar = ttk.Progressbar(progressRow, orient="horizontal", mode="determinate", maximum=validationSteps())
+    progressBar.pack(side="left", fill="x", expand=True)
+    cancelButton = tk.Button(progressRow, text="Cancel", command=cancel_validation)
+    cancelButton.pack(side="left")
+
+    treeview.pack(side="left", fill="both", expand=True)
+    treescroll.pack(side="left",fill="y")
+
+    reportTree = treeview
+    startValidation(OrdersWatcher(path, IncrementalValidator(defaultCache())), False)
+
+## GUI validation worker.
+# Order sheets are validated on a worker thread so the window keeps responding. The worker posts messages to a
+# queue that the Tk loop drains every drainInterval ms:
+#   ("progress", text, step)        a sheet is being read or a check is about to run
+#   ("category", category, results) every check of the category has finished
+#   ("done", turn, results), ("error", message), ("ruleError", message) or ("cancelled",) as the last message
+# Cancelling takes effect at the next sheet or check.
+
+validationJob = None
+validationRefresh = False
+#cProfile.Profile of every validation thread when running with --profile, None otherwise
+threadProfiles = None
+drainJob = None
+drainInterval = 50
+
+class ValidationJob:
+
+    def __init__(self, validator, path):
+        self.validator = validator
+        self.path = path
+        self.messages = queue.Queue()
+        self.cancelled = threading.Event()
+        self.results = {}
+        self.steps = 0
+        self.diagnostics = Diagnostics()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(self):
+        if threadProfiles is not None:
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                #newer Pythons profile every thread from the main profiler
+                return self.validate()
+            try:
+                return self.validate()
+            finally:
+                profiler.disable()
+                threadProfiles.append(profiler)
+        self.validate()
+
+    #Rule files edited since the last validation are compiled again first. That waits for a cancelled validation
+    #to let go of registryLock, so it is done here and not on the Tk thread. The checks can't be reloaded while
+    #this runs.
+    def validate(self):
+        try:
+            loadRuleFiles(ruleFilePaths())
+        except RuleFileError as e:
+            self.messages.put(("ruleError", str(e)))
+            return
+        with registryLock:
+            try:
+                turn, results = self.validator.validate(self.path, self.progress, self.checkDone, self.diagnostics)
+            except ValidationCancelled:
+                self.messages.put(("cancelled",))
+            except OrdersFileError as e:
+                self.messages.put(("error", str(e)))
+            except Exception as e:
+                traceback.print_exc()
+                self.messages.put(("error", "Unexpected error validating the order sheet: " + repr(e)))
+            else:
+                self.messages.put(("done", turn, results, self.diagnostics))
+
+    def progress(self, stage, name):
+        if self.cancelled.is_set():
+            raise ValidationCancelled()
+        self.steps += 1
+        if stage == "sheet":
+            text = "Reading " + name
+        else:
+            text = "Checking " + checks[name].title
+        self.messages.put(("progress", text, self.steps))
+
+    def checkDone(self, name, findings):
+        self.results[name] = findings
+        category = checks[name].category
+        catNames = [n for n, chk in checks.items() if chk.category == category]
+        if all(n in self.results for n in catNames):
+            self.messages.put(("category", category, {n: self.results[n] for n in catNames}))
+
+#Progress steps of a full validation: every sheet read plus every check
+def validationSteps():
+    return max(len(layout) for layout in sheetLayouts.values()) + len(checks)
+
+#Validate the watcher's sheet in the background. A refresh redraws the report in place once it is done, otherwise
+#categories are added to the (empty) report as they finish.
+def startValidation(newWatcher, refresh):
+    global validationJob
+    global validationRefresh
+    global drainJob
+
+    validationJob = ValidationJob(newWatcher.validator, newWatcher.path)
+    validationJob.watcher = newWatcher
+    validationJob.shownCategories = []
+    validationJob.renderSeconds = 0.0
+    validationRefresh = refresh
+
+    progressBar.config(value=0)
+    cancelButton.config(state="normal")
+    progressRow.pack(fill="x", before=reportTree)
+    statusLabel.config(text="Validating...", fg="black")
+
+    validationJob.start()
+    drainJob = root.after(drainInterval, drainValidation)
+
+def cancelValidation():
+    global validationJob
+    global drainJob
+    if validationJob is not None:
+        validationJob.cancel()
+        validationJob = None
+    if drainJob is not None:
+        root.after_cancel(drainJob)
+        drainJob = None
+
+#cancel button
+def cancel_validation():
+    if validationJob is not None:
+        validationJob.cancel()
+        cancelButton.config(state="disabled")
+        statusLabel.config(text="Cancelling...", fg="black")
+
+def drainValidation():
+    global drainJob
+    drainJob = None
+    job = validationJob
+    if job is None:
+        return
+    while True:
+        try:
+            message = job.messages.get_nowait()
+        except queue.Empty:
+            break
+        if message[0] == "progress":
+            #reloaded rule files may have changed the number of checks
+            statusLabel.config(text=message[1] + "...", fg="black")
+            progressBar.config(maximum=validationSteps(), value=min(message[2], validationSteps()))
+        elif message[0] == "category":
+            if not validationRefresh:
+                category = message[1]
+                index = len([c for c in job.shownCategories if categoryOrder.index(c) < categoryOrder.index(category)])
+                start = time.perf_counter()
+                showCategory(reportTree, category, message[2], index)
+                job.renderSeconds += time.perf_counter() - start
+                job.shownCategories.append(category)
+        else:
+            finishValidation(job, message)
+            return
+    drainJob = root.after(drainInterval, drainValidation)
+
+#Last message of a validation job
+def finishValidation(job, message):
+    global validationJob
+    global watcher
+
+    validationJob = None
+    progressRow.pack_forget()
+
+    if not validationRefresh:
+        if message[0] == "done":
+            turn = message[1]
+            start = time.perf_counter()
+            showUnits(reportTree, turn)
+            diagnostics = message[3]
+            diagnostics.add("render", "report tree", job.renderSeconds + time.perf_counter() - start)
+            if diagVar.get():
+                showDiagnostics(reportTree, diagnostics)
+            versionLabel.config(text=turn["gameVersion"] + " Orders for Clan " + turn["clanNumber"])
+            statusLabel.config(text="")
+            reportDone(job.path, turn, message[2])
+            watcher = job.watcher
+            watcher.validated()
+            startWatch()
+        else:
+            #Bail out if the file could not be opened or was invalid.
+            clearReport()
+            if message[0] == "error":
+                showerror("File Input Error", message[1])
+            elif message[0] == "ruleError":
+                showerror("Rule File Error", message[1])
+        return
+
+    if message[0] == "done":
+        refreshReport(message[1], message[2], message[3])
+        job.watcher.validated()
+    elif message[0] in ("error", "ruleError"):
+        statusLabel.config(text="Could not re-validate (" + message[1] + "), will retry", fg="red")
+        job.watcher.failed()
+    else:
+        #skip this save, the next one is validated again
+        statusLabel.config(text="Re-validation cancelled at " + time.strftime("%H:%M:%S"), fg="black")
+        job.watcher.validated()
+
+## GUI watch mode.
+# While "Watch File" is checked the open order sheet is re-validated whenever it is saved and closed, and the
+# report is refreshed in place keeping the expanded/collapsed state of its nodes.
+
+watcher = None
+watchJob = None
+watchInterval = 1000
+
+#Text path of every tree node with children: open state
+def treeOpenState(treeview, parent="", prefix=()):
+    state = {}
+    for iid in treeview.get_children(parent):
+        key = prefix + (treeview.item(iid, option="text"),)
+        if treeview.get_children(iid):
+            state[key] = bool(treeview.item(iid, option="open"))
+            state.update(treeOpenState(treeview, iid, key))
+    return state
+
+def restoreTreeOpenState(treeview, state, parent="", prefix=()):
+    for iid in treeview.get_children(parent):
+        key = prefix + (treeview.item(iid, option="text"),)
+        if key in state:
+            if state[key]:
+                fillNode(treeview, iid)
+            treeview.item(iid, open=state[key])
+            restoreTreeOpenState(treeview, state, iid, key)
+
+#Redraw the report in place with the results of a re-validation
+def refreshReport(turn, checkResults, diagnostics):
+    start = time.perf_counter()
+    openState = treeOpenState(reportTree)
+    scrollTop = reportTree.yview()[0]
+    reportTree.delete(*reportTree.get_children())
+    resetLazyNodes()
+    showReport(reportTree, turn, checkResults)
+    diagnostics.add("render", "report tree", time.perf_counter() - start)
+    if diagVar.get():
+        showDiagnostics(reportTree, diagnostics)
+    restoreTreeOpenState(reportTree, openState)
+    reportTree.yview_moveto(scrollTop)
+
+    versionLabel.config(text=turn["gameVersion"] + " Orders for Clan " + turn["clanNumber"])
+    reportDone(watcher.path, turn, checkResults)
+    statusLabel.config(text="Re-validated after save at " + time.strftime("%H:%M:%S") + " (" + str(len(watcher.validator.parsedSheets))
+                       + " sheets re-read, " + str(len(watcher.validator.rerunChecks)) + " checks rerun)", fg="black")
+
+#Start a background re-validation when the sheet has been saved, unless one is already running
+def pollWatch():
+    global watchJob
+    watchJob = None
+    if watcher is None or not watchVar.get():
+        return
+    if validationJob is None and watcher.poll():
+        startValidation(watcher, True)
+    watchJob = root.after(watchInterval, pollWatch)
+
+def startWatch():
+    global watchJob
+    if watchJob is None and watcher is not None and watchVar.get():
+        watchJob = root.after(watchInterval, pollWatch)
+
+def stopWatch():
+    global watchJob
+    if watchJob is not None:
+        root.after_cancel(watchJob)
+        watchJob = None
+
+#watch checkbox toggled
+def watch_toggle():
+    if watchVar.get():
+        startWatch()
+    else:
+        stopWatch()
+
+fontsize = 10
+
+#fontchange
+def font_resize():
+    global fontsize
+    fontsize = checkVar.get()
+
+#create main window
+def runGui():
+    global root
+    global checkVar
+    global watchVar
+    global diagVar
+
+    root = tk.Tk()
+    root.title('TNValidator')
+    root.resizable(True, True)
+    root.geometry('600x200')
+
+    tk.Label(text="TN Order Validator by Clan 293", font=("Arial", 12, "bold")).pack()
+    tk.Label(text="Release R3.1, 2026-04-22", font=("Arial", 10, "bold")).pack()
+
+    #Font doodling
+    checkVar = tk.IntVar()
+    fontcheck = tk.Checkbutton(root, text="Check for Larger Font", variable = checkVar, onvalue = 12, offvalue = 10, command=font_resize)
+
+    diagVar = tk.IntVar()
+    diagcheck = tk.Checkbutton(root, text="Show Diagnostics (time spent on each sheet and check)", variable = diagVar, onvalue = 1, offvalue = 0)
+
+    watchVar = tk.IntVar()
+    watchcheck = tk.Checkbutton(root, text="Watch File (re-validate when saved)", variable = watchVar, onvalue = 1, offvalue = 0, command=watch_toggle)
+
+    tk.Label(text="Please select your TN Auto Order Sheet to Validate").pack()
+
+    # open button
+    open_button = tk.Button(
+        root,
+        text='Select File',
+        command=select_file
+    )
+
+    open_button.pack()
+
+    tk.Label(text="Add New Units to Column A of Valid Units Sheet to Reduce False Positives").pack()
+    fontcheck.pack()
+    fontcheck.deselect()
+    watchcheck.pack()
+    watchcheck.deselect()
+    diagcheck.pack()
+    diagcheck.deselect()
+
+    root.mainloop()
+
+## Watching order sheets.
+# An order sheet is re-validated once it has been saved and closed: its modification time or size has changed since
+# the last validation, Excel no longer has it open and it did not change between two polls.
+
+#Modification time and size of a file, None if it does not exist
+def fileSignature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+#Excel keeps a "~$" owner file next to a workbook while it is open (long names lose their first two characters)
+def excelIsOpen(path):
+    path = pathlib.Path(path)
+    for name in ("~$" + path.name, "~$" + path.name[2:]):
+        if (path.parent / name).exists():
+            return True
+    return False
+
+class OrdersWatcher:
+    #times a changed file that could not be read is retried before waiting for the next save
+    maxRetries = 5
+
+    def __init__(self, path, validator=None):
+        self.path = pathlib.Path(path)
+        self.validator = validator if validator is not None else IncrementalValidator()
+        self.validatedSignature = None
+        self.pendingSignature = fileSignature(self.path)
+        self.retries = 0
+
+    #True when the file has been saved and closed since it was last validated
+    def poll(self):
+        signature = fileSignature(self.path)
+        if signature is None or signature == self.validatedSignature or excelIsOpen(self.path):
+            return False
+        if signature != self.pendingSignature:
+            self.pendingSignature = signature
+            self.retries = 0
+            return False
+        return self.retries < self.maxRetries
+
+    #The file as of the last poll has been validated
+    def validated(self):
+        self.validatedSignature = self.pendingSignature
+        self.retries = 0
+
+    #The file as of the last poll could not be read (e.g. still being written), retry on the next poll
+    def failed(self):
+        self.retries += 1
+
+## Alliance transfer reconciliation.
+# A single order sheet can only warn about transfers to units outside the clan. When the sheets of a whole alliance
+# are validated together (--reconcile), each worker also returns its clan's units (Clan sheet and own Valid Units)
+# and its transfers to units outside the clan. One index of every loaded clan's units is built from these and every
+# outside transfer is looked up in it once, so the pass is linear in the number of rows however many sheets there are.
+# A transfer to a clan whose sheet is loaded but which has no such unit is an error. A transfer to a clan that isn't
+# loaded is a warning unless the target is on the sender's Valid Units (GM units, units listed by the player).
+# The pass runs in the batch's parent process once every sheet is validated, so it isn't a registered check (a sheet
+# on its own has nothing to reconcile). Its findings are added to the JSON reports and summary.json only: each sheet's
+# --export files and --history turn are written by its worker before the pass and never contain them.
+
+#Check the reconciliation findings are reported under, not in checks
+reconcileCheck = Check("transferReconciliation", "Transfer Orders", "Transfers to Unknown Units (all loaded sheets)", "All Transfers Outside the Clan Go to Known Units", None, ("transfers", "validUnits", "clan"), (), None)
+
+#The clan's units: every unit on the Clan sheet and on Valid Units with the clan's number
+def clanUnitList(turn):
+    units = list(turn["validClanUnits"])
+    units.extend(unit for unit in turn["clan"].values("unit") if foldCase(unit) not in turn["index"]["clanUnits"])
+    return [str(unit) for unit in units]
+
+#[row, from unit, to unit, target on Valid Units] of the transfers to units outside the clan
+def outsideTransfers(turn):
+    ownUnits = foldedSet(clanUnitList(turn))
+    validUnits = turn["index"]["validUnits"]
+    return [[row, fromUnit, toUnit, foldCase(toUnit) in validUnits]
+            for row, fromUnit, toUnit in turn["transfers"].project("fromUnit", "toUnit")
+            if toUnit is not None and foldCase(toUnit) not in ownUnits]
+
+#Match the outside transfers of every validated sheet (results of validateFile(..., reconcile=True)) against the
+#units of all of them. The findings are added to each sheet's result as the transferReconciliation check.
+def reconcileTransfers(results):
+    unitClans = {}
+    for result in results:
+        for unit in result.get("clanUnits", []):
+            unitClans.setdefault(foldCase(unit), result["clanNumber"])
+    loadedClans = set(result["clanNumber"] for result in results if "clanUnits" in result)
+
+    for result in results:
+        if "outsideTransfers" not in result:
+            continue
+        findings = []
+        for row, fromUnit, toUnit, declared in result.pop("outsideTransfers"):
+            if foldCase(toUnit) in unitClans:
+                continue
+            clanNumber = str(toUnit)[1:4]
+            if clanNumber in loadedClans:
+                findings.append(Finding("error", row, toUnit, "Transfer from Unit " + str(fromUnit) + " to Unit " + str(toUnit) + " on Row " + str(row) + ": clan " + clanNumber + " has no such unit"))
+            elif not declared:
+                findings.append(Finding("warning", row, toUnit, "Transfer from Unit " + str(fromUnit) + " to Unit " + str(toUnit) + " on Row " + str(row) + ": not a unit of any loaded clan"))
+        del result["clanUnits"]
+
+        for finding in findings:
+            finding.check = reconcileCheck.name
+            finding.category = reconcileCheck.category
+        result["checks"].append({"name": reconcileCheck.name, "category": reconcileCheck.category, "title": reconcileCheck.title,
+                                 "status": worstLevel(findings), "findings": len(findings)})
+        result["findings"].extend(finding.asDict() for finding in findings)
+        errors = sum(1 for finding in findings if finding.severity == "error")
+        result["errors"] += errors
+        result["warnings"] += len(findings) - errors
+        result["status"] = "error" if result["errors"] else "warning" if result["warnings"] else "pass"
+
+## Pre-submit check.
+# python tnvalidator.py --quick [--severity warning] [--categories activity,transfer,...] FILE_OR_DIR ...
+# Pass/fail answer for a pre-save hook: only the worksheets the selected checks read are opened, the checks run in
+# report order and validation stops at the first finding at or above the severity threshold. Nothing is written.
+# Exit code is 0 when every sheet passes, 1 at the first failure, 2 when a sheet could not be validated.
+
+#Command line category names
+categoryNames = {"activity": "Activity Orders", "transfer": "Transfer Orders", "movement": "Movement and Scouting Orders", "skill": "Skill and Research Orders", "custom": customCategory}
+
+#--categories value: comma separated categoryNames keys, returns the set of report categories
+def categoryList(text):
+    categories = set()
+    for name in text.split(","):
+        name = name.strip().lower()
+        if name not in categoryNames:
+            raise argparse.ArgumentTypeError("unknown category " + repr(name) + ", use " + ", ".join(categoryNames))
+        categories.add(categoryNames[name])
+    return categories
+
+#Severities at or above a threshold
+severityLevels = {"error": ("error",), "warning": ("error", "warning")}
+
+#Validate an order sheet until the first failing finding of the checks in categories (all if None).
+#Returns {"file", "status": "pass", "fail", "invalid" or "failed" (see validateFile), "finding" (the failing
+#finding), "message"}
+def quickValidate(path, categories=None, severity="error"):
+    result = {"file": str(path)}
+    names = [name for name, chk in checks.items() if categories is None or chk.category in categories]
+    names.sort(key=lambda name: categoryOrder.index(checks[name].category))
+    tables = set()
+    for name in names:
+        tables.update(checks[name].reads or [table for layout in sheetLayouts.values() for table in layout])
+    failing = severityLevels[severity]
+    try:
+        turn = prepareTurn(processOrdersXLSX(path, tables=tables))
+        for name in names:
+            for finding in runChecks(turn, [name])[name]:
+                if finding.severity in failing:
+                    result["status"] = "fail"
+                    result["finding"] = finding.asDict()
+                    result["message"] = checks[name].title + ": " + finding.text()
+                    return result
+    except OrdersFileError as e:
+        result["status"] = "invalid"
+        result["message"] = str(e)
+        return result
+    except Exception as e:
+        result["status"] = "failed"
+        result["message"] = type(e).__name__ + ": " + str(e)
+        return result
+    result["status"] = "pass"
+    return result
+
+def runQuick(paths, categories=None, severity="error"):
+    for f in findOrderFiles(paths):
+        result = quickValidate(f, categories, severity)
+        if result["status"] == "pass":
+            print("PASS " + result["file"])
+            continue
+        print("FAIL " + result["file"] + ": " + result["message"])
+        return 1 if result["status"] == "fail" else 2
+    return 0
+
+## Report export.
+# Reports can be saved as JSON Lines, CSV, SARIF (for editors and CI to show the findings as row annotations) or one
+# self-contained HTML page that looks like the report tree. An exporter is given each check's findings as soon as
+# the check is done (checkDone) and writes them out straight away, keeping only the counts, so exporting adds
+# little memory of its own. A validation normally still keeps every finding for the GUI and the JSON report. In batch
+# mode --stream drops each check's findings once they are exported (the JSON report then only counts them), so memory
+# no longer grows with the number of findings. The HTML page needs a category's checks together and only holds on to
+# the category's findings until its last check is done. Categories are then placed in report order by the page's CSS.
+# Findings are exported with their row keys (see keyFindings), so exported findings can be matched across turns.
+
+#Worksheet the findings of a check are on: its first table, worksheets have the same names in every layout
+def checkSheet(chk):
+    if chk.reads:
+        for layout in sheetLayouts.values():
+            if chk.reads[0] in layout:
+                return layout[chk.reads[0]][0]
+    return None
+
+#Writes the report of one order sheet to path: begin(sheet path), checkDone for every check, then end
+class ReportExporter:
+    extension = None
+
+    def __init__(self, path):
+        self.path = path
+        self.f = None
+        self.file = None
+        self.errors = 0
+        self.warnings = 0
+
+    def begin(self, ordersPath):
+        self.file = str(ordersPath)
+        self.f = open(self.path, "w", encoding="utf-8", newline="")
+        self.writeHeader()
+
+    def checkDone(self, name, findings):
+        for finding in findings:
+            if finding.severity == "error":
+                self.errors += 1
+            else:
+                self.warnings += 1
+        self.writeCheck(checks[name], findings)
+
+    def writeHeader(self):
+        pass
+
+    def writeCheck(self, chk, findings):
+        for finding in findings:
+            self.writeFinding(chk, finding)
+
+    def writeFinding(self, chk, finding):
+        pass
+
+    #turn is None if the sheet could not be validated, status and message (as in a batch report) then say why
+    def end(self, turn, status=None, message=None):
+        try:
+            self.writeFooter(turn, status or self.status(), message)
+        finally:
+            self.f.close()
+
+    def writeFooter(self, turn, status, message):
+        pass
+
+    def status(self):
+        if self.errors:
+            return "error"
+        if self.warnings:
+            return "warning"
+        return "pass"
+
+#One JSON object per line: a "finding" record per finding, then a "summary" record
+class JsonLinesExporter(ReportExporter):
+    extension = ".jsonl"
+
+    def writeFinding(self, chk, finding):
+        record = {"type": "finding", "file": self.file, "title": chk.title, "sheet": checkSheet(chk)}
+        record.update(finding.asDict())
+        self.f.write(json.dumps(record, default=str) + "\n")
+
+    def writeFooter(self, turn, status, message):
+        record = {"type": "summary", "file": self.file, "status": status}
+        if turn is None:
+            record["message"] = message
+        else:
+            record.update({"errors": self.errors, "warnings": self.warnings, "gameVersion": turn["gameVersion"], "clanNumber": turn["clanNumber"]})
+        self.f.write(json.dumps(record, default=str) + "\n")
+
+#A row per finding
+class CsvExporter(ReportExporter):
+    extension = ".csv"
+    columns = ("file", "category", "check", "title", "severity", "sheet", "row", "unit", "message", "suggestions")
+
+    def writeHeader(self):
+        self.writer = csv.writer(self.f)
+        self.writer.writerow(self.columns)
+
+    def writeFinding(self, chk, finding):
+        self.writer.writerow((self.file, finding.category, finding.check, chk.title, finding.severity, checkSheet(chk), finding.row, finding.unit, finding.message, "; ".join(finding.suggestions or ())))
+
+#SARIF 2.1.0 log with one run: a rule per check, a result per finding located at its worksheet row
+class SarifExporter(ReportExporter):
+    extension = ".sarif"
+
+    def writeHeader(self):
+        path = pathlib.Path(self.file)
+        self.uri = path.as_uri() if path.is_absolute() else path.as_posix()
+        self.ruleIndex = {name: i for i, name in enumerate(checks)}
+        rules = [{"id": chk.name, "shortDescription": {"text": chk.title}, "properties": {"category": chk.category}} for chk in checks.values()]
+        run = {"tool": {"driver": {"name": "TNValidator", "informationUri": "https://github.com/nmarigoni/tnvalidator", "rules": rules}},
+               "artifacts": [{"location": {"uri": self.uri}}]}
+        #the results array is written as findings come in, the run object is left open for it
+        self.f.write('{"version": "2.1.0", "$schema": "https://json.schemastore.org/sarif-2.1.0.json", "runs": [' + json.dumps(run)[:-1] + ', "results": [\n')
+        self.first = True
+
+    def writeFinding(self, chk, finding):
+        location = {"physicalLocation": {"artifactLocation": {"uri": self.uri, "index": 0}}}
+        if finding.row is not None:
+            location["physicalLocation"]["region"] = {"startLine": finding.row}
+        sheet = checkSheet(chk)
+        if sheet is not None:
+            location["logicalLocations"] = [{"name": sheet, "kind": "worksheet"}]
+        result = {"ruleId": chk.name, "ruleIndex": self.ruleIndex[chk.name], "level": finding.severity,
+                  "message": {"text": finding.text()}, "locations": [location],
+                  "properties": {"category": finding.category, "unit": finding.unit}}
+        self.f.write(("" if self.first else ",\n") + json.dumps(result, default=str))
+        self.first = False
+
+    def writeFooter(self, turn, status, message):
+        invocation = {"executionSuccessful": turn is not None}
+        if turn is None:
+            invocation["toolExecutionNotifications"] = [{"level": "error", "message": {"text": message}}]
+        self.f.write('\n], "invocations": [' + json.dumps(invocation) + ']}]}\n')
+
+htmlReportStyle = """
+body {font-family: Arial, sans-serif; font-size: 10pt; max-width: 60em; margin: auto}
+h1, .version {font-size: 12pt; font-weight: bold; text-align: center; margin: 0.3em}
+.report {display: flex; flex-direction: column}
+details details {margin-left: 1.5em}
+ul {margin: 0; padding-left: 3em; list-style: none}
+summary {cursor: pointer}
+.error {color: red}
+.warning {color: orange}
+.pass {color: blue}
+"""
+
+#The report tree as a page of nested <details>: categories colored by their worst finding, failed check titles by
+#level, pass messages in blue, categories closed and checks open as in the tree
+class HtmlExporter(ReportExporter):
+    extension = ".html"
+
+    def writeHeader(self):
+        #category: {check name: findings} until the category's checks are all done
+        self.pending = {}
+        title = html.escape(pathlib.Path(self.file).name)
+        self.f.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>TNValidator: ' + title + '</title><style>' + htmlReportStyle + '</style></head>\n<body>\n<h1>Validating File: ' + title + '</h1>\n<div class="report">\n')
+
+    def writeCheck(self, chk, findings):
+        catResults = self.pending.setdefault(chk.category, {})
+        catResults[chk.name] = findings
+        if all(name in catResults for name, other in checks.items() if other.category == chk.category):
+            self.writeCategory(chk.category, self.pending.pop(chk.category))
+
+    def writeCategory(self, category, results):
+        catChecks = [chk for chk in checks.values() if chk.name in results]
+        order = categoryOrder.index(category) + 1 if category in categoryOrder else len(categoryOrder) + 1
+        self.f.write('<details style="order: ' + str(order) + '"><summary' + self.levelClass(worstLevel([finding for findings in results.values() for finding in findings])) + '>' + html.escape(category) + '</summary>\n')
+        #a group is shown where its first check is, with all of its checks
+        sections = []
+        groupSections = {}
+        for chk in catChecks:
+            if chk.group is None:
+                sections.append((None, [chk]))
+            elif chk.group in groupSections:
+                groupSections[chk.group].append(chk)
+            else:
+                groupSections[chk.group] = [chk]
+                sections.append((chk.group, groupSections[chk.group]))
+        for group, groupChecks in sections:
+            if group is not None:
+                self.f.write('<details open><summary>' + html.escape(group) + '</summary>\n')
+            for chk in groupChecks:
+                findings = results[chk.name]
+                self.f.write('<details open><summary' + self.levelClass(worstLevel(findings)) + '>' + html.escape(chk.title) + '</summary><ul>\n')
+                if not findings and chk.passText is not None:
+                    self.f.write('<li class="pass">' + html.escape(chk.passText) + '</li>\n')
+                for finding in findings:
+                    self.f.write('<li>' + html.escape(finding.text()) + '</li>\n')
+                self.f.write('</ul></details>\n')
+            if group is not None:
+                self.f.write('</details>\n')
+        self.f.write('</details>\n')
+
+    def levelClass(self, level):
+        return ' class="' + level + '"' if level != "pass" else ""
+
+    def writeFooter(self, turn, status, message):
+        for category, results in list(self.pending.items()):
+            self.writeCategory(category, results)
+        if turn is None:
+            self.f.write('<p class="error" style="order: -2">' + html.escape(str(message)) + '</p>\n')
+        else:
+            self.f.write('<p class="version" style="order: -2">' + html.escape(turn["gameVersion"] + " Orders for Clan " + str(turn["clanNumber"])) + '</p>\n')
+            self.f.write('<details style="order: 0"><summary>Valid Units</summary>\n')
+            for title, units in (("Valid Clan Units", turn["validClanUnits"]), ("Valid Clan Tribes", turn["validClanTribes"]), ("Valid GM Units", turn["validGMUnits"])):
+                self.f.write('<details><summary>' + title + '</summary><ul>\n' + "".join('<li>' + html.escape(str(unit)) + '</li>\n' for unit in units) + '</ul></details>\n')
+            self.f.write('</details>\n')
+        self.f.write('</div>\n</body></html>\n')
+
+exportFormats = {"jsonl": JsonLinesExporter, "csv": CsvExporter, "sarif": SarifExporter, "html": HtmlExporter}
+
+#--export value: comma separated formats
+def exportList(text):
+    formats = [name.strip().lower() for name in text.split(",") if name.strip()]
+    for name in formats:
+        if name not in exportFormats:
+            raise argparse.ArgumentTypeError("unknown format " + repr(name) + ", use " + ", ".join(exportFormats))
+    return formats
+
+#Exporter for a file by its extension (HTML if it has none of theirs)
+def exporterFor(path):
+    suffix = pathlib.Path(path).suffix.lower()
+    for exporterClass in exportFormats.values():
+        if exporterClass.extension == suffix:
+            return exporterClass(path)
+    return HtmlExporter(path)
+
+#checkDone passing findings on to exporters and, when tally is given, setting tally[check name] to the check's
+#(worst level, errors, warnings). None without either.
+def exportCheckDone(exporters, tally=None):
+    if not exporters and tally is None:
+        return None
+    def checkDone(name, findings):
+        for exporter in exporters:
+            exporter.checkDone(name, findings)
+        if tally is not None:
+            tally[name] = (worstLevel(findings),) + findingCounts({name: findings})
+    return checkDone
+
+#Write a finished validation with an exporter
+def exportResults(exporter, ordersPath, turn, results):
+    keyFindings(turn, results)
+    exporter.begin(ordersPath)
+    for name, findings in results.items():
+        exporter.checkDone(name, findings)
+    exporter.end(turn)
+
+## Turn history.
+# Opt-in (--history FILE) SQLite database of validated turns, so questions across many turns are answered with an
+# indexed query instead of reading old order sheets again. Each validation stores the sheet's Clan,
+# Tribes_Activities and Transfers rows and its findings under the clan number, game version and turn (--turn,
+# default the date the sheet was saved), replacing whatever was stored for that turn before. Rows are inserted in
+# one transaction per sheet and indexed by unit and check name. --query reads it back on the command line,
+# TurnHistory.query and counts from Python.
+
+#Order sheet tables kept in the history: their unit columns (indexed, stored as text and matched ignoring case)
+historyTables = {"clan": ("unit",), "activities": ("unit",), "transfers": ("fromUnit", "toUnit")}
+
+#Columns of a history table, the order sheet table's (the same in every layout)
+def historyColumns(table):
+    return list(sheetLayouts["TN3"][table][1])
+
+def historySchema():
+    statements = [
+        "CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, clan TEXT, gameVersion TEXT, turn TEXT, file TEXT, validated TEXT, errors INTEGER, warnings INTEGER, UNIQUE (clan, gameVersion, turn))",
+        "CREATE TABLE IF NOT EXISTS findings (run INTEGER, checkName TEXT, category TEXT, severity TEXT, row INTEGER, unit TEXT COLLATE NOCASE, message TEXT)",
+        "CREATE INDEX IF NOT EXISTS findingsRun ON findings (run)",
+        "CREATE INDEX IF NOT EXISTS findingsCheck ON findings (checkName)",
+        "CREATE INDEX IF NOT EXISTS findingsUnit ON findings (unit)",
+    ]
+    for table, unitColumns in historyTables.items():
+        columns = [column + (" TEXT COLLATE NOCASE" if column in unitColumns else "") for column in historyColumns(table)]
+        statements.append("CREATE TABLE IF NOT EXISTS " + table + " (run INTEGER, row INTEGER, " + ", ".join(columns) + ")")
+        statements.append("CREATE INDEX IF NOT EXISTS " + table + "Run ON " + table + " (run)")
+        for column in unitColumns:
+            statements.append("CREATE INDEX IF NOT EXISTS " + table + column[0].upper() + column[1:] + " ON " + table + " (" + column + ")")
+    return statements
+
+#Cell value as SQLite stores it (dates and anything else unusual as text)
+def historyValue(value):
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return str(value)
+
+#Turn name used when none is given: the date the order sheet was last saved
+def defaultTurnName(path):
+    return time.strftime("%Y-%m-%d", time.localtime(os.path.getmtime(path)))
+
+#Sort key of a turn name: its numbers (year and month, or a date) zero-padded, so "899-12" comes before "900-01"
+#and "900-2" before "900-10"
+def turnOrder(name):
+    return "-".join("%012d" % int(number) for number in re.findall(r"\d+", name or ""))
+
+#ORDER BY terms putting a table's runs newest turn first
+def turnOrderSql(runs):
+    return "turnOrder(" + runs + ".turn) DESC, " + runs + ".turn DESC"
+
+class TurnHistory:
+
+    def __init__(self, path):
+        #batch workers write to the same database, wait for each other's transactions
+        self.db = sqlite3.connect(str(path), timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.create_function("turnOrder", 1, turnOrder, deterministic=True)
+        with self.db:
+            for statement in historySchema():
+                self.db.execute(statement)
+
+    def close(self):
+        self.db.close()
+
+    #Store a validated turn, replacing the one stored for the same clan, game version and turn name
+    def store(self, turn, results, turnName, file):
+        clan = turn["clanNumber"]
+        gameVersion = turn["gameVersion"]
+        errors, warnings = findingCounts(results)
+        with self.db:
+            for (runId,) in self.db.execute("SELECT id FROM runs WHERE clan = ? AND gameVersion = ? AND turn = ?", (clan, gameVersion, turnName)).fetchall():
+                for table in ["findings"] + list(historyTables):
+                    self.db.execute("DELETE FROM " + table + " WHERE run = ?", (runId,))
+                self.db.execute("DELETE FROM runs WHERE id = ?", (runId,))
+            runId = self.db.execute("INSERT INTO runs (clan, gameVersion, turn, file, validated, errors, warnings) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                    (clan, gameVersion, turnName, str(file), time.strftime("%Y-%m-%dT%H:%M:%S"), errors, warnings)).lastrowid
+            for table, unitColumns in historyTables.items():
+                columns = historyColumns(table)
+                textColumns = [column in unitColumns for column in columns]
+                self.db.executemany("INSERT INTO " + table + " VALUES (" + ", ".join("?" * (len(columns) + 2)) + ")",
+                                    ((runId, row) + tuple(str(value) if text and value is not None else historyValue(value) for value, text in zip(values, textColumns))
+                                     for row, *values in turn[table].project(*columns)))
+            self.db.executemany("INSERT INTO findings VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                ((runId, finding.check, finding.category, finding.severity, finding.row, None if finding.unit is None else str(finding.unit), str(finding.message))
+                                 for findings in results.values() for finding in findings))
+
+    #([condition], [parameter]) of the query filters on runs and on the table's own rows, see query
+    def filters(self, table, clan=None, turn=None, unit=None, check=None, categories=None, last=None):
+        runs = ([], [])
+        rows = ([], [])
+        def condition(conditions, sql, *params):
+            conditions[0].append(sql)
+            conditions[1].extend(params)
+        if clan is not None:
+            condition(runs, "runs.clan = ?", str(clan))
+        if turn is not None:
+            condition(runs, "runs.turn = ?", turn)
+        if last is not None:
+            condition(runs, "runs.id IN (SELECT id FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY clan, gameVersion ORDER BY " + turnOrderSql("runs") + ", id DESC) AS n FROM runs) WHERE n <= ?)", last)
+        if unit is not None:
+            unitColumns = historyTables.get(table, ("unit",) if table == "findings" else ())
+            if not unitColumns:
+                raise ValueError("the " + table + " table has no unit")
+            condition(rows, "(" + " OR ".join(table + "." + column + " = ?" for column in unitColumns) + ")", *[str(unit)] * len(unitColumns))
+        if check is not None or categories:
+            if table != "findings":
+                raise ValueError("only findings have a check and category")
+            if check is not None:
+                condition(rows, "findings.checkName = ?", check)
+            if categories:
+                condition(rows, "findings.category IN (" + ", ".join("?" * len(categories)) + ")", *sorted(categories))
+        return runs, rows
+
+    #Rows (dicts) of a history table ("runs", "findings" or one of historyTables) with their run's clan, game version
+    #and turn, newest turn first. Filters: clan, turn, unit (any of the table's unit columns), check and categories
+    #(findings only), last (only the last turns of each clan and game version).
+    def query(self, table, **filters):
+        runs, rows = self.filters(table, **filters)
+        conditions = runs[0] + rows[0]
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        if table == "runs":
+            sql = "SELECT * FROM runs" + where + " ORDER BY " + turnOrderSql("runs") + ", runs.clan"
+        else:
+            sql = ("SELECT runs.clan, runs.gameVersion, runs.turn, " + table + ".* FROM " + table + " JOIN runs ON runs.id = " + table + ".run"
+                   + where + " ORDER BY " + turnOrderSql("runs") + ", runs.clan, " + table + ".row")
+        cursor = self.db.execute(sql, runs[1] + rows[1])
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, values)) for values in cursor]
+
+    #Number of rows of a history table for each stored turn matching the filters (as query). The filters on the
+    #table's rows are part of the join, so turns without a matching row are counted as 0.
+    def counts(self, table, **filters):
+        if table == "runs":
+            raise ValueError("runs can't be counted per turn")
+        runs, rows = self.filters(table, **filters)
+        where = " WHERE " + " AND ".join(runs[0]) if runs[0] else ""
+        sql = ("SELECT runs.clan, runs.gameVersion, runs.turn, COUNT(" + table + ".run) AS rows FROM runs LEFT JOIN " + table
+               + " ON " + " AND ".join(["runs.id = " + table + ".run"] + rows[0]) + where + " GROUP BY runs.id ORDER BY " + turnOrderSql("runs") + ", runs.clan")
+        cursor = self.db.execute(sql, rows[1] + runs[1])
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, values)) for values in cursor]
+
+#Print a history query as tab separated columns, returns the exit code
+def runQuery(historyPath, table, count=False, **filters):
+    if not os.path.exists(historyPath):
+        print(historyPath + ": no history stored")
+        return 2
+    history = TurnHistory(historyPath)
+    try:
+        if count:
+            rows = history.counts(table, **filters)
+        else:
+            rows = history.query(table, **filters)
+    finally:
+        history.close()
+    if rows:
+        print("\t".join(rows[0]))
+    for row in rows:
+        print("\t".join("" if value is None else str(value) for value in row.values()))
+    return 0
+
+## Batch mode.
+# python tnvalidator.py [-o OUTDIR] [-j JOBS] [--watch] FILE_OR_DIR [FILE_OR_DIR ...]
+# Validates every order sheet without the GUI, writes a JSON report per file plus summary.json to OUTDIR.
+# Exit code is 0 when no errors were found, 1 when any sheet has errors, 2 when any sheet could not be validated.
+# With --watch the sheets are re-validated (and their reports rewritten) whenever they are saved, until Ctrl+C.
+
+#Validate one order sheet, runs in a worker process. Returns a plain dict so it can be sent back to the parent.
+#An IncrementalValidator can be given when the same sheet is validated repeatedly.
+#The timing of every phase is included as "diagnostics". When validated with an IncrementalValidator (watch mode,
+#or with previous) the sheet content keys and the findings' row keys are included, so later runs comparing with the
+#report only rerun the checks of changed sheets and match findings by row contents. Plain runs skip computing them.
+#previous is an earlier report (.json) or copy of the workbook to compare with, the differences are added as "diff".
+#With reconcile the clan's units and outside transfers are added for reconcileTransfers.
+#exports lists the exporters (see Report export) the findings are also written with as the checks finish.
+#history is (database, turn name or None) to store the turn in (see Turn history).
+#Without keep (plain runs only: no validator, previous or history) the findings are dropped as soon as they are
+#exported, the result only counts them.
+def validateFile(path, validator=None, cache=None, previous=None, reconcile=False, exports=(), history=None, keep=True):
+    result = {"file": str(path)}
+    diagnostics = Diagnostics()
+    diff = None
+    exporters = []
+    #{check name: (worst level, errors, warnings)}
+    tally = {}
+    try:
+        loadRuleFiles(ruleFilePaths())
+        for exporter in exports:
+            exporter.begin(path)
+            exporters.append(exporter)
+        if previous is not None:
+            if str(previous).lower().endswith(".json"):
+                with open(previous, encoding="utf-8") as f:
+                    validator = previousValidator(json.load(f), cache)
+            else:
+                validator = previousValidator(previous, cache)
+            previousResults = validator.results
+        checkDone = exportCheckDone(exporters, tally)
+        if validator is None:
+            turn, results = validateOrders(path, cache, diagnostics, checkDone, keyRows=bool(exporters), keep=keep)
+        else:
+            turn, results = validator.validate(path, checkDone=checkDone, diagnostics=diagnostics, keyRows=True)
+        if previous is not None:
+            diff = diffResults(previousResults, results, validator.rerunChecks)
+    except OrdersFileError as e:
+        result["status"] = "invalid"
+        result["message"] = str(e)
+        result["diagnostics"] = diagnostics.asList()
+        for exporter in exporters:
+            exporter.end(None, result["status"], result["message"])
+        return result
+    except Exception as e:
+        result["status"] = "failed"
+        result["message"] = type(e).__name__ + ": " + str(e)
+        result["diagnostics"] = diagnostics.asList()
+        for exporter in exporters:
+            exporter.end(None, result["status"], result["message"])
+        return result
+    for exporter in exporters:
+        exporter.end(turn)
+    errors = sum(counts[1] for counts in tally.values())
+    warnings = sum(counts[2] for counts in tally.values())
+    if errors:
+        result["status"] = "error"
+    elif warnings:
+        result["status"] = "warning"
+    else:
+        result["status"] = "pass"
+    result["errors"] = errors
+    result["warnings"] = warnings
+    result["gameVersion"] = turn["gameVersion"]
+    result["clanNumber"] = turn["clanNumber"]
+    if validator is not None:
+        result["sheetKeys"] = validator.sheetKeys
+    if reconcile:
+        result["clanUnits"] = clanUnitList(turn)
+        result["outsideTransfers"] = outsideTransfers(turn)
+    result["checks"] = [{"name": name, "category": checks[name].category, "title": checks[name].title,
+                         "status": tally[name][0], "findings": tally[name][1] + tally[name][2]} for name in checks if name in tally]
+    if keep:
+        result["findings"] = [finding.asDict() for findings in results.values() for finding in findings]
+    if diff is not None:
+        result["diff"] = {"against": str(previous),
+                          "new": [finding.asDict() for finding in diff["new"]],
+                          "resolved": [finding.asDict() for finding in diff["resolved"]],
+                          "changed": [{"old": old.asDict(), "new": new.asDict()} for old, new in diff["changed"]]}
+    if history is not None:
+        historyPath, turnName = history
+        result["turn"] = turnName or defaultTurnName(path)
+        try:
+            store = TurnHistory(historyPath)
+            try:
+                store.store(turn, results, result["turn"], path)
+            finally:
+                store.close()
+        except sqlite3.Error as e:
+            result["historyError"] = str(e)
+    result["seconds"] = diagnostics.totalSeconds()
+    result["diagnostics"] = diagnostics.asList()
+    return result
+
+#Expand the command line paths into order sheets, directories contribute their *.xlsx files (skipping Excel lock files)
+def findOrderFiles(paths):
+    orderFiles = []
+    for p in paths:
+        p = pathlib.Path(p)
+        if p.is_dir():
+            orderFiles.extend(sorted(f for f in p.glob("*.xlsx") if not f.name.startswith("~$")))
+        else:
+            orderFiles.append(p)
+    return orderFiles
+
+#Report file name for an order sheet, numbered if two sheets in different folders share a name
+def reportName(path, usedNames):
+    name = path.stem + ".json"
+    n = 1
+    while name in usedNames:
+        n += 1
+        name = path.stem + "-" + str(n) + ".json"
+    usedNames.add(name)
+    return name
+
+def writeReport(result, outDir, name):
+    with open(pathlib.Path(outDir) / name, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, default=str)
+
+#Print the one line summary of a result (and its diff when compared with an earlier run), returns its exit code
+def printResult(result, prefix=""):
+    if result["status"] in ("invalid", "failed"):
+        print(prefix + result["file"] + ": " + result["message"])
+        return 2
+    print(prefix + result["file"] + ": " + str(result["errors"]) + " errors, " + str(result["warnings"]) + " warnings")
+    if "diff" in result:
+        printDiff(result["diff"])
+    if "historyError" in result:
+        print("  not stored in the history: " + result["historyError"])
+    if result["status"] == "error":
+        return 1
+    return 0
+
+def printDiff(diff):
+    print("  since " + diff["against"] + ": " + str(len(diff["new"])) + " new, " + str(len(diff["resolved"])) + " resolved, " + str(len(diff["changed"])) + " changed")
+    for finding in diff["new"]:
+        print("  + " + finding["severity"] + ": " + str(finding["message"]))
+    for finding in diff["resolved"]:
+        print("  - " + finding["severity"] + ": " + str(finding["message"]))
+    for change in diff["changed"]:
+        print("  ~ " + change["new"]["severity"] + ": " + str(change["new"]["message"]) + " (was " + change["old"]["severity"] + ": " + str(change["old"]["message"]) + ")")
+
+#Earlier run to compare each order sheet with: the report of the same name in a directory of reports (None if there
+#isn't one), otherwise previous itself, which then applies to a single order sheet
+def previousRuns(orderFiles, previous):
+    if previous is None:
+        return [None] * len(orderFiles)
+    previous = pathlib.Path(previous)
+    if not previous.is_dir():
+        if len(orderFiles) != 1:
+            raise OrdersFileError("--diff needs a directory of reports to compare more than one order sheet")
+        return [previous]
+    usedNames = set()
+    runs = []
+    for f in orderFiles:
+        report = previous / reportName(f, usedNames)
+        runs.append(report if report.is_file() else None)
+    return runs
+
+#Exporters writing a sheet's report in each format next to its JSON report
+def reportExporters(outDir, name, formats):
+    return [exportFormats[fmt](pathlib.Path(outDir) / (name[:-len(".json")] + exportFormats[fmt].extension)) for fmt in formats or ()]
+
+def runBatch(paths, outDir, jobs=None, cache=None, diff=None, reconcile=False, formats=None, history=None, keep=True):
+    orderFiles = findOrderFiles(paths)
+    previous = previousRuns(orderFiles, diff)
+    outDir = pathlib.Path(outDir)
+    outDir.mkdir(parents=True, exist_ok=True)
+    usedNames = set()
+    names = [reportName(f, usedNames) for f in orderFiles]
+    exports = [reportExporters(outDir, name, formats) for name in names]
+    #with --diff, sheets without an earlier report get the keys in their report to be compared with next time
+    validators = [IncrementalValidator(cache) if diff is not None and p is None else None for p in previous]
+
+    if len(orderFiles) == 1 or jobs == 1:
+        results = [validateFile(f, v, cache, p, reconcile, e, history, keep) for f, v, p, e in zip(orderFiles, validators, previous, exports)]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(validateFile, orderFiles, validators, [cache] * len(orderFiles), previous, [reconcile] * len(orderFiles), exports, [history] * len(orderFiles), [keep] * len(orderFiles)))
+
+    if reconcile:
+        reconcileTransfers(results)
+
+    summary = []
+    exitCode = 0
+    for result, name in zip(results, names):
+        writeReport(result, outDir, name)
+        entry = {key: value for key, value in result.items() if key not in ("checks", "findings", "diagnostics", "sheetKeys", "diff")}
+        if "diff" in result:
+            entry["diff"] = {key: len(value) if isinstance(value, list) else value for key, value in result["diff"].items()}
+        entry["reportFile"] = name
+        summary.append(entry)
+        exitCode = max(exitCode, printResult(result))
+
+    with open(outDir / "summary.json", "w", encoding="utf-8") as f:
+        json.dump({"files": summary}, f, indent=2, default=str)
+
+    return exitCode
+
+def runWatch(paths, outDir, interval=1.0, cache=None, formats=None, history=None):
+    orderFiles = findOrderFiles(paths)
+    outDir = pathlib.Path(outDir)
+    outDir.mkdir(parents=True, exist_ok=True)
+
+    usedNames = set()
+    watched = [(OrdersWatcher(f, IncrementalValidator(cache)), reportName(f, usedNames)) for f in orderFiles]
+    print("Watching " + str(len(watched)) + " order sheet(s), press Ctrl+C to stop")
+    try:
+        while True:
+            for watcher, name in watched:
+                if watcher.poll():
+                    result = validateFile(watcher.path, watcher.validator, exports=reportExporters(outDir, name, formats), history=history)
+                    if result["status"] == "invalid":
+                        watcher.failed()
+                    else:
+                        watcher.validated()
+                    writeReport(result, outDir, name)
+                    printResult(result, time.strftime("[%H:%M:%S] "))
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+## Validation service.
+# python tnvalidator.py --serve [HOST:]PORT | unix:PATH [-j JOBS] [--cache-dir DIR]
+# Long running HTTP service for bots and other tools that validate many uploaded sheets. The worker processes are
+# started once, import openpyxl once and keep parsed reference sheets in memory (MemoryReferenceCache, on top of
+# --cache-dir when given), so a request only pays for reading and checking its own sheet.
+#   POST /validate?name=FILE   body: the .xlsx file. Returns its batch report (see validateFile) as JSON, "status" is
+#                              "invalid" or "failed" when the sheet couldn't be validated.
+#   GET /health                {"status": "ok", "workers": N, "pending": N}
+# When more than maxPending sheets are queued or being validated, requests are refused with 503 instead of queued.
+# The port listens on localhost unless another host is given.
+
+#Reference cache of a service worker process, set up by serviceWorkerInit
+serviceCache = None
+
+def serviceWorkerInit(backing):
+    global serviceCache
+    serviceCache = MemoryReferenceCache(backing=backing)
+    try:
+        import openpyxl
+    except ImportError:
+        pass
+
+#Validate an uploaded order sheet in a service worker process
+def validateUpload(name, data):
+    result = validateFile(io.BytesIO(data), None, serviceCache)
+    result["file"] = name
+    return result
+
+httpReasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 411: "Length Required",
+               413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+class ValidationService:
+
+    def __init__(self, jobs=None, cache=None, maxPending=None, maxUpload=32*1024*1024):
+        self.workers = jobs or os.cpu_count() or 1
+        #Workers are started on demand while connections are open: a forked worker would keep the open sockets,
+        #so clients reading the answer to the end would wait forever. They come from a fork server where there is one.
+        context = multiprocessing.get_context("forkserver") if "forkserver" in multiprocessing.get_all_start_methods() else None
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=serviceWorkerInit, initargs=(cache,))
+        self.maxPending = maxPending or self.workers * 4
+        self.maxUpload = maxUpload
+        self.pending = 0
+
+    #One request per connection
+    async def handle(self, reader, writer):
+        try:
+            status, body = await self.respond(reader, writer)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, UnicodeDecodeError, ValueError):
+            status, body = 400, {"error": "malformed request"}
+        except ConnectionError:
+            writer.close()
+            return
+        data = json.dumps(body, default=str).encode("utf-8")
+        head = ("HTTP/1.1 " + str(status) + " " + httpReasons[status] + "\r\n"
+                "Content-Type: application/json\r\n"
+                "Content-Length: " + str(len(data)) + "\r\n"
+                "Connection: close\r\n\r\n")
+        try:
+            writer.write(head.encode("latin-1") + data)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    #(status, JSON body) for a request
+    async def respond(self, reader, writer):
+        method, target, version = (await reader.readline()).decode("latin-1").split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, sep, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        url = urllib.parse.urlsplit(target)
+
+        if url.path == "/health":
+            if method != "GET":
+                return 405, {"error": "use GET"}
+            return 200, {"status": "ok", "workers": self.workers, "pending": self.pending}
+
+        if url.path != "/validate":
+            return 404, {"error": "unknown path, use POST /validate or GET /health"}
+        if method != "POST":
+            return 405, {"error": "use POST with the order sheet as the body"}
+        if "content-length" not in headers:
+            return 411, {"error": "Content-Length required"}
+        length = int(headers["content-length"])
+        if length < 0:
+            return 400, {"error": "malformed request"}
+        if length > self.maxUpload:
+            return 413, {"error": "order sheet larger than " + str(self.maxUpload) + " bytes"}
+        if self.pending >= self.maxPending:
+            return 503, {"error": "busy, try again later"}
+        #the upload counts as pending from before its body is read, so bodies being received are bounded as well
+        self.pending += 1
+        try:
+            if headers.get("expect", "").lower() == "100-continue":
+                writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                await writer.drain()
+            data = await reader.readexactly(length)
+
+            name = urllib.parse.parse_qs(url.query).get("name", ["upload.xlsx"])[0]
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(self.pool, validateUpload, name, data)
+            except Exception as e:
+                return 500, {"error": type(e).__name__ + ": " + str(e)}
+        finally:
+            self.pending -= 1
+        return 200, result
+
+    async def serve(self, address):
+        if address.startswith("unix:"):
+            server = await asyncio.start_unix_server(self.handle, address[5:])
+        else:
+            host, sep, port = address.rpartition(":")
+            server = await asyncio.start_server(self.handle, host or "127.0.0.1", int(port))
+        for sock in server.sockets:
+            print("Serving on " + str(sock.getsockname()) + " with " + str(self.workers) + " worker(s), press Ctrl+C to stop", flush=True)
+        async with server:
+            await server.serve_forever()
+
+def runServe(address, jobs=None, cache=None):
+    service = ValidationService(jobs, cache)
+    try:
+        asyncio.run(service.serve(address))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.pool.shutdown(cancel_futures=True)
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TN Order Validator. Opens the GUI when no order sheets are given.")
+    parser.add_argument("paths", nargs="*", help="order sheets (.xlsx) or directories of order sheets to validate without the GUI")
+    parser.add_argument("-o", "--output", default="tnvalidator-reports", help="directory for the JSON reports (default: %(default)s)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes (default: one per CPU)")
+    parser.add_argument("--watch", action="store_true", help="keep running and re-validate sheets whenever they are saved")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between checks for saved sheets in watch mode (default: %(default)s)")
+    parser.add_argument("--cache-dir", default=os.environ.get("TNVALIDATOR_CACHE_DIR"), help="cache parsed Valid Goods/Activity/Units sheets in this directory (default: $TNVALIDATOR_CACHE_DIR, off if unset)")
+    parser.add_argument("--reader", choices=("fast", "openpyxl"), default=os.environ.get("TNVALIDATOR_READER", "fast"), help="read order sheets with the fast XML reader (openpyxl as fallback) or always with openpyxl (default: $TNVALIDATOR_READER, else fast)")
+    parser.add_argument("--cache-size", type=float, default=32, help="size limit of the reference cache in MB (default: %(default)s)")
+    parser.add_argument("--export", type=exportList, metavar="FORMATS", help="also write each sheet's report to the output directory in these comma separated formats: " + ", ".join(exportFormats))
+    parser.add_argument("--stream", action="store_true", help="with --export, drop each check's findings once they are exported: the JSON reports only count them and memory doesn't grow with the number of findings (not with --watch, --diff, --reconcile or --history, turns aren't stored in $TNVALIDATOR_HISTORY)")
+    parser.add_argument("--diff", metavar="PREVIOUS", help="list the findings that are new, resolved or changed since PREVIOUS: a report directory (-o) of an earlier run, or an earlier report or copy of a single order sheet")
+    parser.add_argument("--reconcile", action="store_true", help="also check transfers between the given clans' sheets: transfers to units no loaded clan has are reported (in the JSON reports, not in --export files or the --history)")
+    parser.add_argument("--quick", action="store_true", help="pass/fail check for a pre-save hook: reads only the sheets needed and stops at the first failing finding, writes nothing")
+    parser.add_argument("--severity", choices=tuple(severityLevels), default="error", help="with --quick, the lowest severity that fails (default: %(default)s)")
+    parser.add_argument("--categories", type=categoryList, metavar="LIST", help="with --quick, only run the checks of these comma separated categories (with --query findings, only their findings): " + ", ".join(categoryNames) + " (default: all)")
+    parser.add_argument("--serve", metavar="ADDRESS", help="run as a validation service on [HOST:]PORT (localhost unless HOST is given) or unix:PATH, see the README")
+    parser.add_argument("--history", metavar="FILE", help="store every validated turn in this SQLite database, and read it with --query (default: $TNVALIDATOR_HISTORY in batch and watch mode and with --query, off if unset)")
+    parser.add_argument("--turn", help="turn the sheets are stored under in the history (default: the date each sheet was saved)")
+    parser.add_argument("--query", choices=("runs", "findings") + tuple(historyTables), help="print the stored runs, findings or rows of a sheet table from the history instead of validating, newest turn first")
+    parser.add_argument("--clan", help="with --query, only this clan number")
+    parser.add_argument("--unit", help="with --query, only this unit (in any of a table's unit columns)")
+    parser.add_argument("--check", metavar="CHECK", help="with --query findings, only this check's findings (a built-in check or a rule of the loaded rule files)")
+    parser.add_argument("--last", type=int, metavar="N", help="with --query, only each clan's last N turns")
+    parser.add_argument("--count", action="store_true", help="with --query, print the number of rows per turn instead of the rows")
+    parser.add_argument("--rules", action="append", metavar="FILE", help="also run the rules of this JSON rule file, can be given more than once (default: $TNVALIDATOR_RULES, files separated by " + repr(os.pathsep) + ")")
+    parser.add_argument("--profile", metavar="FILE", help="write a cProfile of the whole run to FILE (view with python -m pstats FILE), batch mode then runs in one process")
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        global threadProfiles
+        import cProfile
+        import pstats
+        threadProfiles = []
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return run(parser, args, 1)
+        finally:
+            profiler.disable()
+            stats = pstats.Stats(profiler)
+            for threadProfile in threadProfiles:
+                stats.add(threadProfile)
+            stats.dump_stats(args.profile)
+    return run(parser, args, args.jobs)
+
+#Run the GUI or batch mode for the parsed command line
+def run(parser, args, jobs):
+
+    #worker processes pick the reader and rule files up from the environment
+    os.environ["TNVALIDATOR_READER"] = args.reader
+    if args.rules:
+        os.environ["TNVALIDATOR_RULES"] = os.pathsep.join(args.rules)
+    try:
+        loadRuleFiles(ruleFilePaths())
+    except RuleFileError as e:
+        parser.error(str(e))
+    #custom rules are only known once their files are loaded
+    if args.check is not None and args.check not in checks:
+        parser.error("argument --check: unknown check " + repr(args.check) + ", use " + ", ".join(checks))
+
+    cache = None
+    if args.cache_dir:
+        cache = ReferenceCache(args.cache_dir, int(args.cache_size * 1024 * 1024))
+
+    #$TNVALIDATOR_HISTORY applies where --history could be given, an explicit --history elsewhere is an error
+    historyPath = args.history or os.environ.get("TNVALIDATOR_HISTORY")
+
+    if args.query:
+        if not historyPath:
+            parser.error("--query needs --history")
+        try:
+            return runQuery(historyPath, args.query, args.count, clan=args.clan, turn=args.turn, unit=args.unit, check=args.check, categories=args.categories, last=args.last)
+        except ValueError as e:
+            parser.error(str(e))
+
+    history = (historyPath, args.turn) if historyPath else None
+
+    if args.serve:
+        if args.paths or args.watch or args.diff or args.reconcile or args.export or args.stream or args.quick or args.history:
+            parser.error("--serve takes no order sheets, --watch, --diff, --reconcile, --export, --stream, --quick or --history")
+        return runServe(args.serve, jobs, cache)
+
+    if not args.paths:
+        if tk is None:
+            parser.error("tkinter is not available, give order sheets to validate in batch mode")
+        runGui()
+        return 0
+
+    if args.stream:
+        if not args.export:
+            parser.error("--stream needs --export")
+        if args.watch or args.diff or args.reconcile or args.history or args.quick:
+            parser.error("--stream can't be used with --watch, --diff, --reconcile, --history or --quick")
+        #the findings aren't kept to be stored
+        history = None
+
+    if args.quick:
+        if args.watch or args.diff or args.reconcile or args.export:
+            parser.error("--quick can't be used with --watch, --diff, --reconcile or --export")
+        return runQuick(args.paths, args.categories, args.severity)
+
+    if args.watch:
+        if args.diff or args.reconcile:
+            parser.error("--diff and --reconcile can't be used with --watch")
+        return runWatch(args.paths, args.output, args.interval, cache, args.export, history)
+
+    try:
+        return runBatch(args.paths, args.output, jobs, cache, args.diff, args.reconcile, args.export, history, not args.stream)
+    except OrdersFileError as e:
+        parser.error(str(e))
 
-root.mainloop()
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())